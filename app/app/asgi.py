@@ -13,4 +13,15 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after Django is set up, the event stream needs the models
+from shoes.streams import EVENTS_PATH, sse_application  # noqa: E402
+
+
+async def application(scope, receive, send):
+    """Serve the event stream natively and everything else through Django"""
+    if scope['type'] == 'http' and scope['path'] == EVENTS_PATH:
+        await sse_application(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
@@ -45,15 +45,47 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    'core.middleware.CompressionMiddleware',
+    'core.middleware.ReplicaRoutingMiddleware',
+    'core.middleware.RateLimitHeadersMiddleware',
+    'core.middleware.ApiExemptSessionMiddleware',
     'django.middleware.common.CommonMiddleware',
-    'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
-    'django.contrib.messages.middleware.MessageMiddleware',
-    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.ApiExemptCsrfViewMiddleware',
+    'core.middleware.ApiExemptAuthenticationMiddleware',
+    'core.middleware.ApiExemptMessageMiddleware',
+    'core.middleware.ApiExemptXFrameOptionsMiddleware',
+    'core.middleware.SlowQueryViewMiddleware',
 ]
 
+# API-only nodes (API_ONLY=1) serve no browser traffic: the admin,
+# sessions and messages apps and their middleware are left out, which
+# trims worker boot time and per-request work. /admin/ is not mounted.
+API_ONLY = os.environ.get('API_ONLY', '') == '1'
+
+if API_ONLY:
+    BROWSER_APPS = (
+        'django.contrib.admin',
+        'django.contrib.sessions',
+        'django.contrib.messages',
+    )
+    BROWSER_MIDDLEWARE = (
+        'core.middleware.ApiExemptSessionMiddleware',
+        'core.middleware.ApiExemptAuthenticationMiddleware',
+        'core.middleware.ApiExemptMessageMiddleware',
+    )
+    INSTALLED_APPS = [
+        app for app in INSTALLED_APPS if app not in BROWSER_APPS
+    ]
+    MIDDLEWARE = [
+        mw for mw in MIDDLEWARE if mw not in BROWSER_MIDDLEWARE
+    ]
+
+# Token-authenticated paths; the ApiExempt* middleware above skip
+# sessions, CSRF, auth, messages and frame options for them.
+API_PATH_PREFIXES = ('/api/', '/media/')
+
 ROOT_URLCONF = 'app.urls'
 
 TEMPLATES = [
@@ -88,6 +120,27 @@ DATABASES = {
     }
 }
 
+# Read replicas, e.g. DB_REPLICA_HOSTS=replica1,replica2. Safe-method
+# requests read from them; see core.middleware.ReplicaRoutingMiddleware.
+DATABASE_REPLICAS = []
+for index, host in enumerate(filter(None,
+                             os.environ.get('DB_REPLICA_HOSTS', '').split(','))):
+    alias = f'replica_{index}'
+    DATABASES[alias] = dict(
+        DATABASES['default'],
+        HOST=host.strip(),
+        TEST={'MIRROR': 'default'},
+    )
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+
+# How long a client reads from the primary after writing
+REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', 5))
+
+# How long an unreachable replica is skipped before being retried
+REPLICA_RETRY_SECONDS = int(os.environ.get('REPLICA_RETRY_SECONDS', 30))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.0/ref/settings/#auth-password-validators
@@ -131,4 +184,144 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = '/vol/web/media'
 STATIC_ROOT = '/vol/web/static'
 
-AUTH_USER_MODEL = 'core.User'
\ No newline at end of file
+# Uploads are stored under a hash of their content, see core.storage
+DEFAULT_FILE_STORAGE = os.environ.get(
+    'DEFAULT_FILE_STORAGE',
+    'core.storage.ContentAddressedStorage'
+)
+
+# S3-compatible object storage, used with
+# DEFAULT_FILE_STORAGE=core.storage.ContentAddressedS3Storage and
+# RENDITION_STORAGE=core.s3.S3Storage
+S3_ENDPOINT_URL = os.environ.get('S3_ENDPOINT_URL', 'https://s3.amazonaws.com')
+S3_BUCKET = os.environ.get('S3_BUCKET', '')
+S3_REGION = os.environ.get('S3_REGION', 'us-east-1')
+S3_ACCESS_KEY_ID = os.environ.get('S3_ACCESS_KEY_ID', '')
+S3_SECRET_ACCESS_KEY = os.environ.get('S3_SECRET_ACCESS_KEY', '')
+S3_TIMEOUT = 30
+# Lifetime of presigned URLs handed out by S3Storage.url()
+S3_URL_EXPIRES = 3600
+# Files this large are uploaded in parts of this size
+S3_MULTIPART_SIZE = 8 * 1024 * 1024
+# Per-process LRU of object metadata (HEAD results)
+S3_METADATA_CACHE_SIZE = 1024
+S3_METADATA_CACHE_TTL = 60
+
+# How uploaded media is served:
+#   static            django.views.static, unauthenticated (DEBUG only)
+#   fileresponse      authorized FileResponse with Range support
+#   x-accel-redirect  authorized, transfer handed to nginx
+#   x-sendfile        authorized, transfer handed to Apache/lighttpd
+MEDIA_SERVE_MODE = os.environ.get('MEDIA_SERVE_MODE', 'fileresponse')
+
+# nginx `internal` location aliased to MEDIA_ROOT
+MEDIA_ACCEL_REDIRECT_PREFIX = os.environ.get(
+    'MEDIA_ACCEL_REDIRECT_PREFIX',
+    '/protected-media/'
+)
+
+AUTH_USER_MODEL = 'core.User'
+
+REST_FRAMEWORK = {
+    # Reverse proxies in front of the app whose X-Forwarded-For entries are
+    # trusted for anonymous throttling; 0 uses the peer address
+    'NUM_PROXIES': int(os.environ.get('NUM_PROXIES', 0)),
+    'DEFAULT_THROTTLE_CLASSES': (
+        'core.throttling.TokenBucketThrottle',
+    ),
+    # Bucket size per period; refilled continuously over the period
+    'DEFAULT_THROTTLE_RATES': {
+        'login': os.environ.get('THROTTLE_LOGIN', '20/min'),
+        'write': os.environ.get('THROTTLE_WRITE', '120/min'),
+        'read': os.environ.get('THROTTLE_READ', '600/min'),
+        'upload-image': os.environ.get('THROTTLE_UPLOAD_IMAGE', '30/min'),
+    },
+}
+
+# 'memory' for a single node, 'cache' to share buckets through the
+# default cache between nodes
+TOKEN_BUCKET_STORE = os.environ.get('TOKEN_BUCKET_STORE', 'memory')
+
+# Keep Characteristic.shoe_count updated incrementally too instead of
+# aggregating the M2M tables on every request (Tag.shoe_count always is).
+# Run sync_shoe_counts after turning this on.
+SHOES_DENORMALIZED_COUNTS = bool(
+    int(os.environ.get('SHOES_DENORMALIZED_COUNTS', 0))
+)
+
+# Delta sync (api/shoes/sync/). Cursors are moved back by the lag so rows
+# saved by transactions still in flight are sent again on the next sync.
+SYNC_CURSOR_LAG_SECONDS = 2
+
+# Clients whose cursor predates the oldest kept tombstone get a full sync
+SYNC_TOMBSTONE_RETENTION_DAYS = 30
+
+# Server-sent catalog events (api/shoes/events/, ASGI only). Events only
+# reach clients connected to the process that made the change.
+EVENTS_QUEUE_SIZE = 100
+EVENTS_HEARTBEAT_SECONDS = 15
+
+# Response compression (core.middleware.CompressionMiddleware). brotli is
+# used when the optional `brotli` package is installed.
+COMPRESSION_MIN_SIZE = 1024
+COMPRESSION_GZIP_LEVEL = 6
+COMPRESSION_BROTLI_QUALITY = 5
+# Compressed bodies kept in memory per process, keyed by content digest
+COMPRESSION_CACHE_ENTRIES = 256
+
+# "Similar shoes" indexes (core.similarity) are built per user in each
+# worker and rebuilt after this many seconds to see other workers' writes
+SIMILAR_SHOES_INDEX_TTL = int(os.environ.get('SIMILAR_SHOES_INDEX_TTL', 300))
+SIMILAR_SHOES_MAX_INDEXES = 100
+SIMILAR_SHOES_MAX_LIMIT = 50
+
+# Downscaled copies of shoe images (core.renditions), rendered in the
+# background after uploads. Renditions are stored under their original's
+# name, so their storage must not rename files.
+SHOES_RENDITION_SIZES = (320, 800)
+RENDITION_STORAGE = os.environ.get(
+    'RENDITION_STORAGE',
+    'core.storage.OverwriteStorage'
+)
+# Most files accepted by one batched image upload request
+SHOES_UPLOAD_BATCH_MAX = 200
+
+# Direct uploads: clients PUT images to a presigned bucket URL or, on the
+# filesystem storage, to core.upload_service running at this URL
+UPLOAD_SERVICE_URL = os.environ.get(
+    'UPLOAD_SERVICE_URL',
+    'http://localhost:8001/'
+)
+UPLOAD_URL_EXPIRES = 15 * 60
+# How long after an upload URL is issued the upload can be confirmed
+UPLOAD_CONFIRM_EXPIRES = 60 * 60
+UPLOAD_MAX_BYTES = 20 * 1024 * 1024
+
+
+# Sampled stack profiles of live requests (core.middleware.
+# ProfilingMiddleware), for requests sent with a signed X-Profile header
+# or picked at PROFILING_SAMPLE_RATE. Off unless PROFILING_ENABLED=1.
+PROFILING_ENABLED = bool(int(os.environ.get('PROFILING_ENABLED', 0)))
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', 0))
+PROFILING_INTERVAL = 0.005
+PROFILING_DIR = os.environ.get('PROFILING_DIR', '/vol/web/profiles')
+PROFILING_TOKEN_MAX_AGE = 24 * 60 * 60
+
+# Queries slower than SLOW_QUERY_MS milliseconds are appended to
+# SLOW_QUERY_LOG as JSON lines with the view that ran them; summarize them
+# with the slow_queries command. 0 leaves the log off.
+SLOW_QUERY_MS = int(os.environ.get('SLOW_QUERY_MS', 0))
+SLOW_QUERY_LOG = os.environ.get(
+    'SLOW_QUERY_LOG',
+    '/vol/web/logs/slow_queries.jsonl'
+)
+# Share of slow SELECTs run again under EXPLAIN (ANALYZE, BUFFERS)
+SLOW_QUERY_EXPLAIN_RATE = float(
+    os.environ.get('SLOW_QUERY_EXPLAIN_RATE', 0.1)
+)
+
+# Hash partition core_shoes by user and its tag/characteristic tables by
+# shoe into this many partitions each (PostgreSQL 11+). Applied by the
+# 0012 migration on new databases; use the partition_shoes command to
+# change an existing one. 0 keeps plain tables.
+SHOES_PARTITIONS = int(os.environ.get('SHOES_PARTITIONS', 0))
@@ -13,13 +13,29 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
-from django.contrib import admin
+from django.apps import apps
 from django.urls import path, include
 from django.conf.urls.static import static
 from django.conf import settings
 
+from core.media import MediaView
+
 urlpatterns = [
-    path('admin/', admin.site.urls),
     path('api/user/', include('user.urls')),
     path('api/shoes/', include('shoes.urls')),
-] + static(settings.MEDIA_URL, document_route=settings.MEDIA_ROOT)
+]
+
+#API-only nodes leave the admin out of INSTALLED_APPS; don't import it there
+if apps.is_installed('django.contrib.admin'):
+    from django.contrib import admin
+
+    urlpatterns.insert(0, path('admin/', admin.site.urls))
+
+if settings.MEDIA_SERVE_MODE == 'static':
+    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+else:
+    urlpatterns += [
+        path(f'{settings.MEDIA_URL.lstrip("/")}<path:path>',
+             MediaView.as_view(), name='media'),
+    ]
+
@@ -0,0 +1,98 @@
+"""Measure worker boot time for the full and API-only settings profiles
+
+Run from the app directory:
+
+    python benchmarks/bench_boot.py [--runs N] [--top N]
+
+Each run starts a fresh interpreter that imports app.wsgi and loads the
+URLconf, which is what a worker does before serving its first request.
+The slowest imports come from `python -X importtime`.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BOOT = (
+    'import sys\n'
+    'import app.wsgi\n'
+    'from django.urls import get_resolver\n'
+    'get_resolver().url_patterns\n'
+    'print("\\n".join(sys.modules))\n'
+)
+
+#modules that should stay out of an API-only worker. DRF imports parts of
+#django.contrib.admin on its own, so watch our registrations instead
+WATCHED = (
+    'PIL.Image',
+    'core.admin',
+    'django.contrib.sessions.models',
+    'django.contrib.messages.apps',
+)
+
+PROFILES = {
+    'full': {'API_ONLY': ''},
+    'api': {'API_ONLY': '1'},
+}
+
+
+def boot(profile, *args):
+    """Boot a worker and return (seconds, loaded module names, stderr)"""
+    env = dict(os.environ, **PROFILES[profile])
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, *args, '-c', BOOT],
+        cwd=APP_DIR,
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        check=True,
+    )
+    elapsed = time.perf_counter() - started
+
+    return elapsed, set(result.stdout.split()), result.stderr
+
+
+def slowest_imports(stderr, top):
+    """Return the `top` imports with the highest self time in microseconds"""
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        imports.append((int(self_us), name.strip()))
+
+    return sorted(imports, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--top', type=int, default=10)
+    options = parser.parse_args()
+
+    for profile in PROFILES:
+        times = [boot(profile)[0] for _ in range(options.runs)]
+        _, imported, stderr = boot(profile, '-X', 'importtime')
+
+        print('%s: median %.0f ms, min %.0f ms, %d modules' % (
+            profile,
+            statistics.median(times) * 1000,
+            min(times) * 1000,
+            len(imported),
+        ))
+        for name in WATCHED:
+            print('  %-36s %s' % (
+                name, 'imported' if name in imported else '-'
+            ))
+        for self_us, name in slowest_imports(stderr, options.top):
+            print('  %8.1f ms  %s' % (self_us / 1000, name))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""Measure per-request middleware overhead of the full and lean stacks
+
+Run from the app directory:
+
+    python benchmarks/bench_middleware.py [--requests N]
+
+Requests go through Django's handler with a URLconf whose views return a
+fixed response, so the numbers only cover middleware work.
+"""
+import argparse
+import os
+import sys
+import timeit
+import types
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.core.handlers.base import BaseHandler  # noqa: E402
+from django.http import HttpResponse  # noqa: E402
+from django.test import RequestFactory, override_settings  # noqa: E402
+from django.urls import path  # noqa: E402
+
+FULL_MIDDLEWARE = [
+    'django.middleware.security.SecurityMiddleware',
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+]
+
+LEAN_MIDDLEWARE = [
+    'django.middleware.security.SecurityMiddleware',
+    'core.middleware.ApiExemptSessionMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'core.middleware.ApiExemptCsrfViewMiddleware',
+    'core.middleware.ApiExemptAuthenticationMiddleware',
+    'core.middleware.ApiExemptMessageMiddleware',
+    'core.middleware.ApiExemptXFrameOptionsMiddleware',
+]
+
+
+def view(request):
+    return HttpResponse(b'{}', content_type='application/json')
+
+
+urlconf = types.ModuleType('bench_urls')
+urlconf.urlpatterns = [
+    path('api/shoes/tags/', view),
+    path('admin/', view),
+]
+
+
+def per_request_us(middleware, url, requests):
+    """Return the mean microseconds spent handling one request"""
+    with override_settings(MIDDLEWARE=middleware, ROOT_URLCONF=urlconf,
+                           ALLOWED_HOSTS=['testserver']):
+        handler = BaseHandler()
+        handler.load_middleware()
+        factory = RequestFactory()
+
+        def run():
+            handler.get_response(
+                factory.get(url, HTTP_AUTHORIZATION='Token x')
+            )
+
+        run()
+        best = min(timeit.repeat(run, number=requests, repeat=5))
+
+    return best / requests * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=5000)
+    options = parser.parse_args()
+
+    for url in ('/api/shoes/tags/', '/admin/'):
+        full = per_request_us(FULL_MIDDLEWARE, url, options.requests)
+        lean = per_request_us(LEAN_MIDDLEWARE, url, options.requests)
+        print('%-18s full %7.1f us  lean %7.1f us  saved %6.1f us' % (
+            url, full, lean, full - lean
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+"""Compare per-user shoe queries on plain and hash partitioned tables
+
+Run from the app directory against a PostgreSQL database:
+
+    python benchmarks/bench_partitioning.py [--users N] [--shoes N]
+        [--partitions N] [--queries N]
+
+Everything happens in one transaction that is rolled back at the end: a
+synthetic catalog is seeded, the list and tag filter queries ShoeViewSet
+runs are timed for random users, then the tables are partitioned and the
+same queries timed again.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.contrib.auth.hashers import make_password  # noqa: E402
+from django.db import connection, transaction  # noqa: E402
+
+from core import partitioning  # noqa: E402
+from core.models import Characteristic, Shoes, Tag  # noqa: E402
+
+BRANDS = ('Nike', 'Adidas', 'New Balance', 'Asics', 'Vans')
+
+
+def seed(users, shoes_per_user):
+    """Create users with tagged shoes and return [(user id, tag ids)]"""
+    User = get_user_model()
+    password = make_password('benchpass')
+    accounts = User.objects.bulk_create(
+        User(email=f'bench-partitioning-{number}@example.com',
+             password=password)
+        for number in range(users)
+    )
+
+    catalog = []
+    for user in accounts:
+        tags = Tag.objects.bulk_create(
+            Tag(user=user, name=f'tag {index}') for index in range(20)
+        )
+        characteristics = Characteristic.objects.bulk_create(
+            Characteristic(user=user, name=f'characteristic {index}')
+            for index in range(10)
+        )
+        shoes = Shoes.objects.bulk_create(
+            Shoes(user=user, title=f'Shoe {index}',
+                  brand=random.choice(BRANDS), price=random.randint(40, 250))
+            for index in range(shoes_per_user)
+        )
+        Shoes.tags.through.objects.bulk_create(
+            Shoes.tags.through(shoes_id=shoe.id, tag_id=tag.id)
+            for shoe in shoes for tag in random.sample(tags, 3)
+        )
+        Shoes.characteristics.through.objects.bulk_create(
+            Shoes.characteristics.through(shoes_id=shoe.id,
+                                          characteristic_id=feature.id)
+            for shoe in shoes for feature in random.sample(characteristics, 2)
+        )
+        catalog.append((user.id, [tag.id for tag in tags]))
+
+    return catalog
+
+
+def list_shoes(user_id, tag_ids):
+    """The queries of GET /api/shoes/shoes/"""
+    return list(
+        Shoes.objects.filter(user_id=user_id).order_by('id')
+                     .prefetch_related('tags', 'characteristics')
+    )
+
+
+def filter_shoes(user_id, tag_ids):
+    """The queries of GET /api/shoes/shoes/?tags=a,b"""
+    return list(
+        Shoes.objects.filter(user_id=user_id, tags__id__in=tag_ids[:2])
+                     .distinct().order_by('id')
+                     .prefetch_related('tags', 'characteristics')
+    )
+
+
+def median_ms(query, catalog, queries):
+    """Return median (total, database) milliseconds of `query`
+
+    The database time is spent in cursor.execute(), the rest building
+    model instances.
+    """
+    database = []
+
+    def time_query(execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            database[-1] += time.perf_counter() - start
+
+    timings = []
+    with connection.execute_wrapper(time_query):
+        for _ in range(queries):
+            user_id, tag_ids = random.choice(catalog)
+            database.append(0.0)
+            start = time.perf_counter()
+            query(user_id, tag_ids)
+            timings.append(time.perf_counter() - start)
+
+    return statistics.median(timings) * 1000, \
+        statistics.median(database) * 1000
+
+
+def index_sizes():
+    """Return (total, largest partition) index bytes of core_shoes"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT relname, pg_indexes_size(oid) FROM pg_class "
+            "WHERE relkind = 'r' AND relname ~ '^core_shoes(_p[0-9]+)?$'"
+        )
+        sizes = dict(cursor.fetchall())
+
+    return sum(sizes.values()), max(sizes.values())
+
+
+def measure(label, catalog, queries):
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE core_shoes, core_shoes_tags, '
+                       'core_shoes_characteristics')
+    for query in (list_shoes, filter_shoes):
+        median_ms(query, catalog, 10)
+
+    total, largest = index_sizes()
+    print('%-9s list %7.2f ms (db %6.2f)  filter %7.2f ms (db %6.2f)  '
+          'indexes %6.1f MB, largest table\'s %6.1f MB' % (
+              label,
+              *median_ms(list_shoes, catalog, queries),
+              *median_ms(filter_shoes, catalog, queries),
+              total / 2 ** 20, largest / 2 ** 20
+          ))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--shoes', type=int, default=250,
+                        help='shoes per user')
+    parser.add_argument('--partitions', type=int, default=16)
+    parser.add_argument('--queries', type=int, default=300)
+    options = parser.parse_args()
+
+    random.seed(0)
+    with transaction.atomic():
+        partitioning.unpartition_tables(connection)
+        print(f'Seeding {options.users} users x {options.shoes} shoes...')
+        catalog = seed(options.users, options.shoes)
+        with connection.cursor() as cursor:
+            cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+        measure('plain', catalog, options.queries)
+        partitioning.partition_tables(connection, options.partitions)
+        measure(f'{options.partitions} parts', catalog, options.queries)
+
+        transaction.set_rollback(True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,439 @@
+"""Generate synthetic API traffic against a running server
+
+Start a worker the way production does, e.g.
+
+    THROTTLE_READ=100000/min THROTTLE_WRITE=100000/min \\
+    THROTTLE_LOGIN=100000/min THROTTLE_UPLOAD_IMAGE=100000/min \\
+        gunicorn app.wsgi -w 1 -b 127.0.0.1:8000
+
+then run from the app directory:
+
+    python benchmarks/loadgen.py --url http://127.0.0.1:8000 \\
+        [--ramp 1,2,4,8,16,32] [--step-seconds 10] [--users 8] [--json FILE]
+
+Each ramp step runs that many concurrent virtual users for step-seconds,
+then prints throughput, error rate and latency percentiles for the step.
+Virtual users sign in as one of --users accounts (created on first use)
+and loop over the scenarios below, picked by weight. Raise all four
+throttle rates on the server or 429s will dominate the numbers: the login
+scope (20/min per address by default) covers the login scenario and
+account setup, which fails on a throttled re-run, and the upload-image
+scope (30/min) covers upload_image. 429s are counted separately from
+errors.
+
+Only the standard library is used, so this can run from any machine.
+"""
+import argparse
+import asyncio
+import json
+import random
+import struct
+import sys
+import time
+import uuid
+import zlib
+from collections import defaultdict
+from urllib.parse import urlencode, urlsplit
+
+USER_PASSWORD = 'loadgen-password'
+BRANDS = ('Nike', 'Adidas', 'New Balance', 'Asics', 'Vans')
+SEED_TAGS = 20
+SEED_CHARACTERISTICS = 10
+SEED_SHOES = 50
+
+
+def png(width=64, height=64):
+    """Return a small PNG image, built without an imaging library"""
+    def chunk(kind, data):
+        body = kind + data
+        return struct.pack('>I', len(data)) + body + \
+            struct.pack('>I', zlib.crc32(body))
+
+    row = b'\x00' + bytes(random.randrange(256) for _ in range(width * 3))
+    return b''.join((
+        b'\x89PNG\r\n\x1a\n',
+        chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)),
+        chunk(b'IDAT', zlib.compress(row * height)),
+        chunk(b'IEND', b''),
+    ))
+
+
+def multipart(field, filename, content, content_type):
+    """Return (body, content type) of a single file form upload"""
+    boundary = uuid.uuid4().hex
+    body = b''.join((
+        f'--{boundary}\r\n'.encode(),
+        f'Content-Disposition: form-data; name="{field}"; '
+        f'filename="{filename}"\r\n'.encode(),
+        f'Content-Type: {content_type}\r\n\r\n'.encode(),
+        content,
+        f'\r\n--{boundary}--\r\n'.encode(),
+    ))
+    return body, f'multipart/form-data; boundary={boundary}'
+
+
+class Response:
+
+    def __init__(self, status, headers, body):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    def json(self):
+        return json.loads(self.body)
+
+
+class Connection:
+    """A keep-alive HTTP/1.1 connection, reopened when the server drops it"""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = self.writer = None
+
+    async def request(self, method, path, body=b'', headers=None):
+        for attempt in (1, 2):
+            if self.writer is None:
+                self.reader, self.writer = await asyncio.open_connection(
+                    self.host, self.port
+                )
+            try:
+                return await self._exchange(method, path, body, headers or {})
+            except (ConnectionError, asyncio.IncompleteReadError):
+                self.close()
+                if attempt == 2:
+                    raise
+
+    async def _exchange(self, method, path, body, headers):
+        lines = [f'{method} {path} HTTP/1.1', f'Host: {self.host}',
+                 f'Content-Length: {len(body)}']
+        lines.extend(f'{name}: {value}' for name, value in headers.items())
+        self.writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode() + body)
+        await self.writer.drain()
+
+        status_line = await self.reader.readuntil(b'\r\n')
+        if not status_line.strip():
+            raise ConnectionError('Connection closed by the server')
+        status = int(status_line.split()[1])
+
+        response_headers = {}
+        while True:
+            line = await self.reader.readuntil(b'\r\n')
+            if line == b'\r\n':
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            response_headers[name.strip().lower()] = value.strip()
+
+        if response_headers.get('transfer-encoding') == 'chunked':
+            chunks = []
+            while True:
+                size = int((await self.reader.readuntil(b'\r\n')).split(b';')[0],
+                           16)
+                chunks.append(await self.reader.readexactly(size + 2))
+                if not size:
+                    break
+            data = b''.join(chunk[:-2] for chunk in chunks)
+        elif 'content-length' in response_headers:
+            data = await self.reader.readexactly(
+                int(response_headers['content-length'])
+            )
+        else:
+            data = await self.reader.read()
+            self.close()
+
+        if response_headers.get('connection', '').lower() == 'close':
+            self.close()
+
+        return Response(status, response_headers, data)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+class Stats:
+    """Latencies and outcomes of the requests made during one ramp step"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(int)
+        self.errors = 0
+        self.throttled = 0
+
+    def add(self, name, status, seconds):
+        self.latencies[name].append(seconds)
+        self.statuses[status] += 1
+        if status == 429:
+            self.throttled += 1
+        elif status is None or status >= 400:
+            self.errors += 1
+
+    def summary(self, concurrency, seconds):
+        latencies = sorted(
+            value for values in self.latencies.values() for value in values
+        )
+        total = len(latencies)
+        return {
+            'concurrency': concurrency,
+            'requests': total,
+            'rps': round(total / seconds, 1),
+            'error_rate': round(self.errors / total, 4) if total else 0.0,
+            'throttled': self.throttled,
+            'latency_ms': percentiles(latencies),
+            'scenarios': {
+                name: dict(requests=len(values), **percentiles(sorted(values)))
+                for name, values in sorted(self.latencies.items())
+            },
+            'statuses': {
+                str(status): count
+                for status, count in sorted(self.statuses.items(),
+                                            key=lambda item: str(item[0]))
+            },
+        }
+
+
+def percentiles(latencies):
+    """Return nearest-rank p50/p90/p99/max of sorted latencies in ms"""
+    if not latencies:
+        return {}
+
+    def rank(fraction):
+        index = min(len(latencies) - 1, int(fraction * len(latencies)))
+        return round(latencies[index] * 1000, 2)
+
+    return {'p50': rank(0.5), 'p90': rank(0.9), 'p99': rank(0.99),
+            'max': round(latencies[-1] * 1000, 2)}
+
+
+class VirtualUser:
+    """One simulated client with its own connection and account"""
+
+    def __init__(self, target, account):
+        self.connection = Connection(target.hostname, target.port or 80)
+        self.email = account['email']
+        self.token = account['token']
+        self.shoes = account['shoes']
+        self.tags = account['tags']
+        self.characteristics = account['characteristics']
+        self.stats = None
+
+    async def call(self, name, method, path, payload=None, body=None,
+                   content_type=None, auth=True):
+        headers = {}
+        if auth:
+            headers['Authorization'] = f'Token {self.token}'
+        if payload is not None:
+            body = json.dumps(payload).encode()
+            content_type = 'application/json'
+        if content_type:
+            headers['Content-Type'] = content_type
+
+        start = time.perf_counter()
+        try:
+            response = await self.connection.request(method, path,
+                                                     body or b'', headers)
+        except (OSError, asyncio.IncompleteReadError):
+            self.stats.add(name, None, time.perf_counter() - start)
+            return None
+
+        self.stats.add(name, response.status, time.perf_counter() - start)
+        return response
+
+    #scenarios, each a short burst of requests a real client would make
+
+    async def login(self):
+        await self.call('token', 'POST', '/api/user/token/', {
+            'email': self.email,
+            'password': USER_PASSWORD,
+        }, auth=False)
+
+    async def list_shoes(self):
+        await self.call('shoes list', 'GET', '/api/shoes/shoes/')
+
+    async def filter_shoes(self):
+        tags = random.sample(self.tags, 2)
+        query = urlencode({'tags': ','.join(map(str, tags))})
+        await self.call('shoes filter', 'GET', f'/api/shoes/shoes/?{query}')
+
+    async def shoe_detail(self):
+        shoe = random.choice(self.shoes)
+        await self.call('shoes detail', 'GET', f'/api/shoes/shoes/{shoe}/')
+
+    async def create_shoe(self):
+        response = await self.call('shoes create', 'POST', '/api/shoes/shoes/',
+                                   random_shoe(self.tags,
+                                               self.characteristics))
+        if response is not None and response.status == 201:
+            self.shoes.append(response.json()['id'])
+
+    async def list_tags(self):
+        await self.call('tags list', 'GET',
+                        '/api/shoes/tags/?assigned_only=1')
+
+    async def list_characteristics(self):
+        await self.call('characteristics list', 'GET',
+                        '/api/shoes/characteristics/?with_counts=1')
+
+    async def upload_image(self):
+        shoe = random.choice(self.shoes)
+        body, content_type = multipart('image', 'shoe.png', png(), 'image/png')
+        await self.call('upload image', 'POST',
+                        f'/api/shoes/shoes/{shoe}/upload-image/',
+                        body=body, content_type=content_type)
+
+    async def run(self, scenarios, weights, deadline):
+        while time.monotonic() < deadline:
+            scenario = random.choices(scenarios, weights)[0]
+            await getattr(self, scenario)()
+
+
+#scenario -> relative frequency, roughly what the mobile client sends
+SCENARIOS = {
+    'login': 2,
+    'list_shoes': 25,
+    'filter_shoes': 15,
+    'shoe_detail': 25,
+    'create_shoe': 8,
+    'list_tags': 12,
+    'list_characteristics': 10,
+    'upload_image': 3,
+}
+
+
+def random_shoe(tags, characteristics):
+    return {
+        'title': f'Shoe {uuid.uuid4().hex[:8]}',
+        'brand': random.choice(BRANDS),
+        'price': f'{random.uniform(40, 250):.2f}',
+        'tags': random.sample(tags, 3),
+        'characteristics': random.sample(characteristics, 2),
+    }
+
+
+async def prepare_account(target, number):
+    """Create or sign in a load test user and make sure it has a catalog"""
+    connection = Connection(target.hostname, target.port or 80)
+    email = f'loadgen-{number}@example.com'
+    credentials = {'email': email, 'password': USER_PASSWORD}
+
+    async def send(method, path, payload=None, token=None):
+        headers = {'Content-Type': 'application/json'}
+        if token:
+            headers['Authorization'] = f'Token {token}'
+        body = json.dumps(payload).encode() if payload is not None else b''
+        return await connection.request(method, path, body, headers)
+
+    def failed(method, path, response):
+        return RuntimeError(f'{method} {path} failed with '
+                            f'{response.status}: {response.body[:200]}')
+
+    async def call(method, path, payload=None, token=None):
+        response = await send(method, path, payload, token)
+        if response.status >= 400 and response.status != 409:
+            raise failed(method, path, response)
+        return response.json()
+
+    response = await send('POST', '/api/user/create/',
+                          dict(credentials, name=f'Load test {number}'))
+    #only an email taken by an earlier run is fine; a server that is down
+    #or throttling is reported
+    if response.status >= 400 and not (
+            response.status == 400 and
+            'already exists' in str(response.json().get('email'))):
+        raise failed('POST', '/api/user/create/', response)
+    token = (await call('POST', '/api/user/token/', credentials))['token']
+
+    resolved = {}
+    for kind, count in (('tags', SEED_TAGS),
+                        ('characteristics', SEED_CHARACTERISTICS)):
+        names = [f'{kind} {index}' for index in range(count)]
+        objects = await call('POST', f'/api/shoes/{kind}/resolve/',
+                             {'names': names}, token)
+        resolved[kind] = [obj['id'] for obj in objects]
+
+    shoes = [shoe['id'] for shoe in
+             await call('GET', '/api/shoes/shoes/?fields=id', token=token)]
+    while len(shoes) < SEED_SHOES:
+        shoe = await call('POST', '/api/shoes/shoes/', random_shoe(
+            resolved['tags'], resolved['characteristics']
+        ), token)
+        shoes.append(shoe['id'])
+
+    connection.close()
+    return {'email': email, 'token': token, 'shoes': shoes, **resolved}
+
+
+async def run_step(target, accounts, concurrency, seconds, scenarios):
+    stats = Stats()
+    names = list(scenarios)
+    weights = [scenarios[name] for name in names]
+    users = []
+    for index in range(concurrency):
+        user = VirtualUser(target, accounts[index % len(accounts)])
+        user.stats = stats
+        users.append(user)
+
+    start = time.monotonic()
+    await asyncio.gather(*(
+        user.run(names, weights, start + seconds) for user in users
+    ))
+    elapsed = time.monotonic() - start
+    for user in users:
+        user.connection.close()
+
+    return stats.summary(concurrency, elapsed)
+
+
+def print_step(summary):
+    latency = summary['latency_ms']
+    print(f"{summary['concurrency']:>6} {summary['requests']:>8} "
+          f"{summary['rps']:>9.1f} {summary['error_rate']:>7.2%} "
+          f"{summary['throttled']:>6} {latency.get('p50', 0):>8.1f} "
+          f"{latency.get('p90', 0):>8.1f} {latency.get('p99', 0):>8.1f}")
+
+
+async def main(args):
+    target = urlsplit(args.url)
+    if target.scheme != 'http':
+        sys.exit('Only plain http:// targets are supported')
+
+    scenarios = dict(SCENARIOS)
+    if args.scenarios:
+        scenarios = {name: SCENARIOS[name]
+                     for name in args.scenarios.split(',')}
+
+    print(f'Preparing {args.users} accounts...', file=sys.stderr)
+    accounts = await asyncio.gather(*(
+        prepare_account(target, number) for number in range(args.users)
+    ))
+
+    print(f"{'users':>6} {'requests':>8} {'req/s':>9} {'errors':>7} "
+          f"{'429s':>6} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8}")
+    steps = []
+    for concurrency in args.ramp:
+        summary = await run_step(target, accounts, concurrency,
+                                 args.step_seconds, scenarios)
+        print_step(summary)
+        steps.append(summary)
+
+    if args.json:
+        with open(args.json, 'w') as report_file:
+            json.dump({'url': args.url, 'step_seconds': args.step_seconds,
+                       'steps': steps}, report_file, indent=2)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--ramp', default='1,2,4,8,16,32',
+                        type=lambda value: [int(n) for n in value.split(',')],
+                        help='concurrent users for each step')
+    parser.add_argument('--step-seconds', type=float, default=10.0)
+    parser.add_argument('--users', type=int, default=8,
+                        help='accounts shared by the virtual users')
+    parser.add_argument('--scenarios',
+                        help='comma separated subset of: ' +
+                             ', '.join(SCENARIOS))
+    parser.add_argument('--json', help='also write the results to FILE')
+    asyncio.run(main(parser.parse_args()))
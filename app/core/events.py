@@ -0,0 +1,87 @@
+import asyncio
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+
+#sent instead of the dropped events when a subscriber falls behind
+RESYNC_EVENT = {'type': 'resync'}
+
+
+class Subscription:
+    """A bounded queue of events for one connected client"""
+
+    __slots__ = ('user_id', 'queue', 'loop', 'overflowed')
+
+    def __init__(self, user_id, maxsize, loop):
+        self.user_id = user_id
+        self.queue = asyncio.Queue(maxsize)
+        self.loop = loop
+        self.overflowed = False
+
+    def offer(self, event):
+        """Queue an event, replacing the backlog with a resync if full"""
+        if self.overflowed:
+            return
+
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            #the client has to refetch anyway, so drop what is queued
+            self.overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC_EVENT)
+
+    async def get(self):
+        """Wait for the next event"""
+        event = await self.queue.get()
+        if event is RESYNC_EVENT:
+            self.overflowed = False
+        return event
+
+
+class Broker:
+    """In-process pub/sub of catalog change events keyed by user
+
+    Publishing may happen from any thread; events are handed to each
+    subscriber's event loop.
+    """
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def has_subscribers(self, user_id):
+        return user_id in self._subscribers
+
+    def subscribe(self, user_id):
+        """Return a new subscription on the running event loop"""
+        subscription = Subscription(
+            user_id,
+            settings.EVENTS_QUEUE_SIZE,
+            asyncio.get_event_loop()
+        )
+        with self._lock:
+            self._subscribers[user_id].add(subscription)
+
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscribers.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscribers[subscription.user_id]
+
+    def publish(self, user_id, event):
+        """Send an event to every subscription of a user"""
+        with self._lock:
+            subscriptions = list(self._subscribers.get(user_id, ()))
+
+        for subscription in subscriptions:
+            subscription.loop.call_soon_threadsafe(subscription.offer, event)
+
+
+broker = Broker()
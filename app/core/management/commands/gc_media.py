@@ -0,0 +1,123 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.models import Shoes
+from core.renditions import delete_renditions
+from core.storage import lock_content
+
+
+def scan_files(root):
+    """Yield os.DirEntry objects for all files below root"""
+    try:
+        entries = os.scandir(root)
+    except FileNotFoundError:
+        return
+
+    with entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from scan_files(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                yield entry
+
+
+class Command(BaseCommand):
+    """Django command to delete media files no shoe refers to"""
+
+    help = ('Delete unreferenced files under MEDIA_ROOT/uploads/shoe and '
+            'their renditions')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-seconds', type=int, default=24 * 60 * 60,
+                            help='keep files modified more recently than this')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true',
+                            help='only report what would be deleted')
+
+    def handle(self, *args, **options):
+        self.dry_run = options['dry_run']
+        self.counts = dict.fromkeys(
+            ('scanned', 'referenced', 'recent', 'deleted', 'bytes'), 0
+        )
+
+        self.cutoff = time.time() - options['grace_seconds']
+        root = os.path.join(settings.MEDIA_ROOT, 'uploads', 'shoe')
+
+        #look scanned files up a batch at a time so memory stays bounded
+        #however many shoes and files there are
+        batch = {}
+        for entry in scan_files(root):
+            self.counts['scanned'] += 1
+            name = os.path.relpath(entry.path, settings.MEDIA_ROOT) \
+                          .replace(os.sep, '/')
+            batch[name] = entry
+            if len(batch) >= options['batch_size']:
+                self.check_batch(batch)
+                batch = {}
+
+        if batch:
+            self.check_batch(batch)
+
+        verb = 'would delete' if self.dry_run else 'deleted'
+        self.stdout.write(self.style.SUCCESS(
+            f'scanned {self.counts["scanned"]} files: '
+            f'{self.counts["referenced"]} referenced, '
+            f'{self.counts["recent"]} within grace period, '
+            f'{verb} {self.counts["deleted"]} '
+            f'({self.counts["bytes"]} bytes)'
+        ))
+
+    def check_batch(self, entries):
+        """Delete the old files of a scanned batch that no shoe refers to"""
+        referenced = set(Shoes.objects.filter(image__in=list(entries))
+                                      .values_list('image', flat=True))
+
+        batch = {}
+        for name, entry in entries.items():
+            if name in referenced:
+                self.counts['referenced'] += 1
+                continue
+
+            stat = entry.stat(follow_symlinks=False)
+            if stat.st_mtime > self.cutoff:
+                self.counts['recent'] += 1
+                continue
+
+            batch[name] = (entry.path, stat.st_size)
+
+        if batch:
+            self.delete_batch(batch)
+
+    def delete_batch(self, batch):
+        """Delete a batch of candidates that are still unreferenced"""
+        with transaction.atomic():
+            #a save of the same bytes holds the lock until its shoe commits
+            for name in sorted(batch):
+                lock_content(name)
+            self.delete_unattached(batch)
+
+    def delete_unattached(self, batch):
+        #files may have been attached again since the batch was checked
+        attached = set(Shoes.objects.filter(image__in=list(batch))
+                                    .values_list('image', flat=True))
+
+        for name, (path, size) in batch.items():
+            if name in attached:
+                self.counts['referenced'] += 1
+                continue
+
+            if self.dry_run:
+                self.stdout.write(f'would delete {name}')
+            else:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    continue
+                delete_renditions(name)
+
+            self.counts['deleted'] += 1
+            self.counts['bytes'] += size
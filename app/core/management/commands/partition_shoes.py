@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from core import partitioning
+
+class Command(BaseCommand):
+    """Django command to hash partition the shoe tables, or undo it"""
+    help = 'Hash partition core_shoes and its through tables. The tables ' \
+           'are copied and locked while this runs.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--partitions',
+            type=int,
+            default=settings.SHOES_PARTITIONS,
+            help='Partitions per table (default: SHOES_PARTITIONS)'
+        )
+        parser.add_argument(
+            '--undo',
+            action='store_true',
+            help='Turn the tables back into plain tables'
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Partitioning needs PostgreSQL')
+
+        with transaction.atomic():
+            if options['undo']:
+                partitioning.unpartition_tables(connection)
+                self.stdout.write(
+                    self.style.SUCCESS('shoe tables unpartitioned')
+                )
+                return
+
+            if options['partitions'] < 2:
+                raise CommandError('Use --partitions 2 or more')
+            partitioning.partition_tables(connection, options['partitions'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"shoe tables partitioned {options['partitions']} ways"
+        ))
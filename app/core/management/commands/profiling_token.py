@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from core.profiling import profile_token
+
+class Command(BaseCommand):
+    """Django command to print an X-Profile header value"""
+    help = 'Print a signed X-Profile header value that triggers profiling'
+
+    def add_arguments(self, parser):
+        parser.add_argument('label', nargs='?', default='manual',
+                            help='Added to the profile file names')
+
+    def handle(self, *args, **options):
+        self.stdout.write(profile_token(options['label']))
@@ -0,0 +1,18 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.models import Tombstone
+
+class Command(BaseCommand):
+    """Django command to delete tombstones past the sync retention window"""
+
+    def handle(self, *args, **options):
+        horizon = timezone.now() - timedelta(
+            days=settings.SYNC_TOMBSTONE_RETENTION_DAYS
+        )
+        deleted, _ = Tombstone.objects.filter(deleted_at__lt=horizon).delete()
+
+        self.stdout.write(self.style.SUCCESS(f'{deleted} tombstones pruned'))
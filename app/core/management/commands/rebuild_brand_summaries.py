@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from core.signals import rebuild_brand_summaries
+
+class Command(BaseCommand):
+    """Django command to rebuild the per-brand shoe summaries"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=int,
+            action='append',
+            dest='users',
+            help='Only rebuild these user ids (repeatable)'
+        )
+
+    def handle(self, *args, **options):
+        written = rebuild_brand_summaries(options['users'])
+        self.stdout.write(
+            self.style.SUCCESS(f'brand summaries rebuilt: {written} rows')
+        )
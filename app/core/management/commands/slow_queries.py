@@ -0,0 +1,50 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.slow_queries import aggregate, read_log
+
+class Command(BaseCommand):
+    """Django command to summarize the slow query log by fingerprint"""
+    help = 'Show slow queries grouped by fingerprint, most total time first'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--log', default=None,
+                            help='Log file (default: SLOW_QUERY_LOG)')
+        parser.add_argument('--view', help='Only queries run by this view, '
+                                           'e.g. ShoeViewSet.list')
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument('--plans', action='store_true',
+                            help='Print the latest captured plan of each')
+        parser.add_argument('--json', action='store_true',
+                            help='Print the summaries as JSON')
+
+    def handle(self, *args, **options):
+        path = options['log'] or settings.SLOW_QUERY_LOG
+        try:
+            entries = list(read_log(path))
+        except FileNotFoundError:
+            raise CommandError(f'No slow query log at {path}')
+
+        if options['view']:
+            entries = [entry for entry in entries
+                       if entry['view'] == options['view']]
+        summaries = aggregate(entries)[:options['limit']]
+
+        if options['json']:
+            self.stdout.write(json.dumps(summaries, indent=2))
+            return
+
+        self.stdout.write(f"{'count':>7} {'total ms':>10} {'p95 ms':>9} "
+                          f"{'max ms':>9}  views / query")
+        for summary in summaries:
+            self.stdout.write(
+                f"{summary['count']:>7} {summary['total_ms']:>10.1f} "
+                f"{summary['p95_ms']:>9.1f} {summary['max_ms']:>9.1f}  "
+                f"{', '.join(summary['views'])}"
+            )
+            self.stdout.write(f"        {summary['fingerprint']}")
+            if options['plans'] and summary['plan']:
+                for line in summary['plan'].splitlines():
+                    self.stdout.write(f'            {line}')
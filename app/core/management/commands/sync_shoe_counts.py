@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from core.models import Tag, Characteristic
+from core.signals import update_shoe_counts
+
+class Command(BaseCommand):
+    """Django command to rebuild the denormalized shoe counts"""
+
+    def handle(self, *args, **options):
+        for model in (Tag, Characteristic):
+            updated = update_shoe_counts(model)
+            self.stdout.write(
+                f'{model._meta.verbose_name}: {updated} rows recounted'
+            )
+
+        self.stdout.write(self.style.SUCCESS('shoe counts rebuilt'))
@@ -1,20 +1,68 @@
+import random
 import time
 
-from django.db import connections
+from django.db import connections, DEFAULT_DB_ALIAS
+from django.db.migrations.executor import MigrationExecutor
 from django.db.utils import OperationalError
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 
 class Command(BaseCommand):
     """Django command to pause execution until db is available"""
 
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument('--timeout', type=float, default=60,
+                            help='give up after this many seconds')
+        parser.add_argument('--initial-delay', type=float, default=0.1)
+        parser.add_argument('--max-delay', type=float, default=5)
+        parser.add_argument('--check-migrations', action='store_true',
+                            help='also wait until no migrations are pending')
+
     def handle(self, *args, **options):
         self.stdout.write('waiting for database...')
-        db_conn = None
-        while not db_conn:
-            try:
-                db_conn = connections['default']
-            except OperationalError:
-                self.stdout.write('Database unavailable. Waiting 1 second...')
-                time.sleep(1)
-        
-        self.stdout.write(self.style.SUCCESS('!!!database available!!!'))
\ No newline at end of file
+        deadline = time.monotonic() + options['timeout']
+        attempt = 0
+
+        while True:
+            ready, reason = self.probe(
+                options['database'],
+                options['check_migrations']
+            )
+            if ready:
+                break
+
+            #full jitter keeps a fleet of containers from probing in lockstep
+            delay = random.uniform(0, min(
+                options['max_delay'],
+                options['initial_delay'] * 2 ** attempt
+            ))
+            if time.monotonic() + delay > deadline:
+                raise CommandError(
+                    f'Database not ready after {options["timeout"]}s: {reason}'
+                )
+
+            self.stdout.write(f'{reason}. Retrying in {delay:.2f}s...')
+            time.sleep(delay)
+            attempt += 1
+
+        self.stdout.write(self.style.SUCCESS('!!!database available!!!'))
+
+    def probe(self, alias, check_migrations):
+        """Return (ready, reason) after probing the database"""
+        connection = connections[alias]
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+                cursor.fetchone()
+        except OperationalError as exc:
+            #drop the half-open connection so the next probe reconnects
+            connection.close()
+            return False, f'Database unavailable ({exc})'.strip()
+
+        if check_migrations:
+            executor = MigrationExecutor(connection)
+            targets = executor.loader.graph.leaf_nodes()
+            if executor.migration_plan(targets):
+                return False, 'Migrations pending'
+
+        return True, ''
@@ -0,0 +1,155 @@
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponse, \
+                        HttpResponseNotModified, HttpResponseRedirect
+from django.utils.http import parse_etags, quote_etag
+
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.views import APIView
+
+from core.models import Shoes
+from core.renditions import original_name, rendition_storage
+
+#uploaded names are never reused, so a file's bytes never change
+IMMUTABLE_CACHE_CONTROL = 'private, max-age=31536000, immutable'
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeFile:
+    """File wrapper that stops reading after `length` bytes
+
+    Keeps fileno() so WSGI servers can still sendfile() the range; they
+    start at the current offset and stop at Content-Length.
+    """
+
+    def __init__(self, file, length):
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """Return (start, end) for a single byte range, or None to send it all
+
+    Raises ValueError when the range cannot be satisfied.
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+
+    start, end = match.groups()
+    if not start:
+        #suffix range: the last N bytes
+        start, end = max(size - int(end), 0), size - 1
+    else:
+        start = int(start)
+        end = min(int(end), size - 1) if end else size - 1
+
+    if start >= size or start > end:
+        raise ValueError('unsatisfiable range')
+
+    return start, end
+
+
+def guess_content_type(path):
+    """Return the content type to serve a file with"""
+    return mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+
+def file_response(request, path, etag):
+    """Stream a file from disk, honouring single byte ranges"""
+    size = os.path.getsize(path)
+    content_type = guess_content_type(path)
+
+    byte_range = None
+    range_header = request.META.get('HTTP_RANGE')
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if range_header and (not if_range or if_range == etag):
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+    file = open(path, 'rb')
+    if byte_range is None:
+        response = FileResponse(file, content_type=content_type)
+    else:
+        start, end = byte_range
+        file.seek(start)
+        response = FileResponse(
+            RangeFile(file, end - start + 1),
+            content_type=content_type,
+            status=206
+        )
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = end - start + 1
+
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+class MediaView(APIView):
+    """Serve uploaded shoe images and their renditions to their owner"""
+
+    authentication_classes = (TokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+
+    def get(self, request, path):
+        original = original_name(path)
+        owned = Shoes.objects.filter(
+            user=request.user,
+            image=original or path
+        ).exists()
+        if not owned:
+            raise Http404
+
+        storage = rendition_storage if original else default_storage
+        try:
+            full_path = storage.path(path)
+        except NotImplementedError:
+            #object storage: let the client fetch it with a presigned URL
+            response = HttpResponseRedirect(storage.url(path))
+            response['Cache-Control'] = 'private, no-store'
+            return response
+        try:
+            stat = os.stat(full_path)
+        except FileNotFoundError:
+            raise Http404
+
+        etag = quote_etag(f'{stat.st_mtime_ns:x}-{stat.st_size:x}')
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH', '')
+        if etag in parse_etags(if_none_match) or if_none_match == '*':
+            response = HttpResponseNotModified()
+        elif settings.MEDIA_SERVE_MODE == 'x-accel-redirect':
+            response = HttpResponse(content_type=guess_content_type(path))
+            response['X-Accel-Redirect'] = \
+                settings.MEDIA_ACCEL_REDIRECT_PREFIX + path
+        elif settings.MEDIA_SERVE_MODE == 'x-sendfile':
+            response = HttpResponse(content_type=guess_content_type(path))
+            response['X-Sendfile'] = full_path
+        else:
+            response = file_response(request, full_path, etag)
+
+        response['ETag'] = etag
+        response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+        return response
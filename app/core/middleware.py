@@ -0,0 +1,404 @@
+import gzip
+import hashlib
+import logging
+import random
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.messages.middleware import MessageMiddleware
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.middleware.clickjacking import XFrameOptionsMiddleware
+from django.middleware.csrf import CsrfViewMiddleware
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+
+from core import profiling, slow_queries
+from core.routers import replica_reads
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def is_api_request(request):
+    """Return whether the request targets a token-authenticated path"""
+    return request.path_info.startswith(settings.API_PATH_PREFIXES)
+
+
+class ApiExemptMixin:
+    """Skip a browser-oriented middleware for API requests
+
+    The API authenticates with tokens only, so sessions, messages, CSRF
+    cookies and frame options are wasted work there; /admin/ keeps them.
+    """
+
+    def __call__(self, request):
+        if is_api_request(request):
+            return self.get_response(request)
+
+        return super().__call__(request)
+
+
+class ApiExemptSessionMiddleware(ApiExemptMixin, SessionMiddleware):
+    pass
+
+
+class ApiExemptCsrfViewMiddleware(ApiExemptMixin, CsrfViewMiddleware):
+
+    def process_view(self, request, callback, callback_args, callback_kwargs):
+        if is_api_request(request):
+            return None
+
+        return super().process_view(
+            request,
+            callback,
+            callback_args,
+            callback_kwargs
+        )
+
+
+class ApiExemptAuthenticationMiddleware(ApiExemptMixin,
+                                        AuthenticationMiddleware):
+    pass
+
+
+class ApiExemptMessageMiddleware(ApiExemptMixin, MessageMiddleware):
+    pass
+
+
+class ApiExemptXFrameOptionsMiddleware(ApiExemptMixin,
+                                       XFrameOptionsMiddleware):
+    pass
+
+
+class ReplicaRoutingMiddleware:
+    """Serve safe requests from replicas, keeping read-your-writes
+
+    A client that sends a write is pinned to the primary for
+    REPLICA_STICKY_SECONDS, so it never reads back stale data from a
+    lagging replica. The pin travels with the client in a signed cookie,
+    so whichever worker serves its next read honours it. It is also kept
+    in the default cache for clients that drop cookies, which only spans
+    workers if that cache is shared.
+    """
+
+    cookie_name = 'replica_pin'
+    cookie_salt = 'core.replica-pin'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+
+        sticky = settings.REPLICA_STICKY_SECONDS
+        if request.method not in SAFE_METHODS:
+            cache.set(self._pin_key(request), True, sticky)
+            response = self.get_response(request)
+            response.set_signed_cookie(self.cookie_name, '1',
+                                       salt=self.cookie_salt, max_age=sticky,
+                                       httponly=True, samesite='Lax')
+            return response
+
+        if self._pinned(request):
+            return self.get_response(request)
+
+        with replica_reads():
+            return self.get_response(request)
+
+    def _pinned(self, request):
+        """Return whether the client wrote within REPLICA_STICKY_SECONDS"""
+        cookie = request.get_signed_cookie(
+            self.cookie_name, None, salt=self.cookie_salt,
+            max_age=settings.REPLICA_STICKY_SECONDS
+        )
+
+        return cookie is not None or bool(cache.get(self._pin_key(request)))
+
+    def _pin_key(self, request):
+        """Return the cache key identifying the client of a request"""
+        client = request.META.get('HTTP_AUTHORIZATION') or \
+            request.META.get('REMOTE_ADDR', '')
+        digest = hashlib.sha1(client.encode()).hexdigest()
+
+        return f'replica-pin:{digest}'
+
+
+class RateLimitHeadersMiddleware:
+    """Report the throttle state of a request in RateLimit-* headers"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        ratelimit = getattr(request, 'ratelimit', None)
+        if ratelimit is not None:
+            limit, remaining, reset = ratelimit
+            response['RateLimit-Limit'] = limit
+            response['RateLimit-Remaining'] = remaining
+            response['RateLimit-Reset'] = reset
+
+        return response
+
+
+COMPRESSIBLE_TYPES = ('application/json', 'text/', 'application/javascript')
+ACCEPT_ENCODING_RE = re.compile(r'^\s*([\w*-]+)\s*(?:;\s*q=([\d.]+))?')
+
+
+def accepted_encodings(header):
+    """Return the encodings an Accept-Encoding header allows"""
+    encodings = set()
+    for item in header.split(','):
+        match = ACCEPT_ENCODING_RE.match(item)
+        if not match:
+            continue
+        try:
+            quality = float(match.group(2) or 1)
+        except ValueError:
+            continue
+        if quality > 0:
+            encodings.add(match.group(1).lower())
+
+    return encodings
+
+
+def compress(encoding, data):
+    if encoding == 'br':
+        return brotli.compress(data, quality=settings.COMPRESSION_BROTLI_QUALITY)
+
+    return gzip.compress(data, compresslevel=settings.COMPRESSION_GZIP_LEVEL)
+
+
+def compress_stream(encoding, chunks):
+    """Compress an iterable of byte chunks, flushing after each one"""
+    if encoding == 'br':
+        compressor = brotli.Compressor(
+            quality=settings.COMPRESSION_BROTLI_QUALITY
+        )
+        for chunk in chunks:
+            yield compressor.process(chunk) + compressor.flush()
+        yield compressor.finish()
+        return
+
+    #wbits 16 + MAX_WBITS writes a gzip header and trailer
+    compressor = zlib.compressobj(settings.COMPRESSION_GZIP_LEVEL,
+                                  zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+
+class CompressedBodyCache:
+    """LRU of compressed bodies keyed by a digest of the uncompressed body
+
+    Hot list endpoints keep returning identical bytes; hashing them is far
+    cheaper than compressing them again.
+    """
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compress(self, encoding, data):
+        key = (encoding, hashlib.sha1(data).digest())
+        with self._lock:
+            compressed = self._entries.get(key)
+            if compressed is not None:
+                self._entries.move_to_end(key)
+                return compressed
+
+        compressed = compress(encoding, data)
+        with self._lock:
+            self._entries[key] = compressed
+            while len(self._entries) > settings.COMPRESSION_CACHE_ENTRIES:
+                self._entries.popitem(last=False)
+
+        return compressed
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+compressed_bodies = CompressedBodyCache()
+
+
+class CompressionMiddleware:
+    """Compress API responses with brotli or gzip
+
+    Bodies below COMPRESSION_MIN_SIZE are sent as they are, streaming
+    responses are compressed chunk by chunk and brotli is only offered when
+    the brotli package is installed.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        content_type = response.get('Content-Type', '')
+        if not content_type.startswith(COMPRESSIBLE_TYPES):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if response.has_header('Content-Encoding') or \
+                response.status_code != 200:
+            return response
+
+        encoding = self._negotiate(request)
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            response.streaming_content = compress_stream(
+                encoding,
+                response.streaming_content
+            )
+            del response['Content-Length']
+        else:
+            if len(response.content) < settings.COMPRESSION_MIN_SIZE:
+                return response
+
+            compressed = compressed_bodies.get_or_compress(
+                encoding,
+                response.content
+            )
+            if len(compressed) >= len(response.content):
+                return response
+
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+
+        #the compressed bytes differ, so a strong validator would be wrong
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+
+        response['Content-Encoding'] = encoding
+        return response
+
+    def _negotiate(self, request):
+        """Return the best encoding the client accepts, if any"""
+        accepted = accepted_encodings(
+            request.META.get('HTTP_ACCEPT_ENCODING', '')
+        )
+        if brotli is not None and 'br' in accepted:
+            return 'br'
+        if 'gzip' in accepted:
+            return 'gzip'
+
+        return None
+
+
+class ProfilingMiddleware:
+    """Record a sampled stack profile of selected requests
+
+    A request is profiled when it carries a valid X-Profile header (see
+    the profiling_token command) or is picked at PROFILING_SAMPLE_RATE.
+    The collapsed stacks go to PROFILING_DIR with a JSON file naming the
+    route and the number of queries. Unless PROFILING_ENABLED is set the
+    middleware removes itself from the stack.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        label = self._label(request)
+        if label is None:
+            return self.get_response(request)
+
+        queries = []
+
+        def count_query(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        started = timezone.now()
+        sampler = profiling.StackSampler(threading.get_ident(),
+                                         settings.PROFILING_INTERVAL)
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(count_query))
+            start = time.perf_counter()
+            sampler.start()
+            try:
+                response = self.get_response(request)
+            finally:
+                stacks = sampler.stop()
+            duration = time.perf_counter() - start
+
+        match = request.resolver_match
+        view_name = match.view_name if match else None
+        name = profiling.profile_name(started, view_name, label)
+        try:
+            profiling.write_profile(settings.PROFILING_DIR, name, stacks, {
+                'method': request.method,
+                'path': request.path,
+                'route': match.route if match else None,
+                'view_name': view_name,
+                'label': label,
+                'status': response.status_code,
+                'started': started.isoformat(),
+                'duration_ms': round(duration * 1000, 3),
+                'query_count': len(queries),
+                'interval_ms': settings.PROFILING_INTERVAL * 1000,
+            })
+        except OSError:
+            logger.exception('Writing a profile failed')
+        else:
+            response['X-Profile-Id'] = name
+
+        return response
+
+    def _label(self, request):
+        """Return a label if the request is to be profiled, else None"""
+        token = request.META.get('HTTP_X_PROFILE')
+        if token:
+            return profiling.profile_label(token,
+                                           settings.PROFILING_TOKEN_MAX_AGE)
+
+        if random.random() < settings.PROFILING_SAMPLE_RATE:
+            return 'sampled'
+
+        return None
+
+
+class SlowQueryViewMiddleware:
+    """Name the view running each request in the slow query log"""
+
+    def __init__(self, get_response):
+        if not settings.SLOW_QUERY_MS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            return self.get_response(request)
+        finally:
+            slow_queries.current_view.set(None)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        slow_queries.current_view.set(
+            slow_queries.view_label(view_func, request.method)
+        )
@@ -0,0 +1,51 @@
+from django.db import migrations
+from django.db.models.functions import Lower
+
+
+def merge_duplicate_names(apps, schema_editor):
+    """Fold case-insensitive duplicate tags/characteristics into one row"""
+    Shoes = apps.get_model('core', 'Shoes')
+
+    for model_name, m2m_name in (('Tag', 'tags'), ('Characteristic',
+                                                   'characteristics')):
+        model = apps.get_model('core', model_name)
+        through = getattr(Shoes, m2m_name).through
+        fk_name = f'{model_name.lower()}_id'
+
+        keepers = {}
+        rows = model.objects.annotate(lower_name=Lower('name')) \
+                            .order_by('id') \
+                            .values_list('id', 'user_id', 'lower_name')
+        for obj_id, user_id, lower_name in rows:
+            keeper = keepers.setdefault((user_id, lower_name), obj_id)
+            if keeper == obj_id:
+                continue
+
+            linked = set(through.objects.filter(**{fk_name: keeper})
+                                        .values_list('shoes_id', flat=True))
+            dupes = through.objects.filter(**{fk_name: obj_id})
+            dupes.filter(shoes_id__in=linked).delete()
+            dupes.update(**{fk_name: keeper})
+            model.objects.filter(id=obj_id).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_shoes_image'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_names,
+                             migrations.RunPython.noop),
+        migrations.RunSQL(
+            'CREATE UNIQUE INDEX core_tag_user_id_lower_name_uniq '
+            'ON core_tag (user_id, lower(name));',
+            'DROP INDEX core_tag_user_id_lower_name_uniq;',
+        ),
+        migrations.RunSQL(
+            'CREATE UNIQUE INDEX core_characteristic_user_id_lower_name_uniq '
+            'ON core_characteristic (user_id, lower(name));',
+            'DROP INDEX core_characteristic_user_id_lower_name_uniq;',
+        ),
+    ]
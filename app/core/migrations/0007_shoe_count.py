@@ -0,0 +1,23 @@
+# Generated by Django 3.0.14 on 2026-10-19 02:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_unique_tag_characteristic_names'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='characteristic',
+            name='shoe_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='shoe_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
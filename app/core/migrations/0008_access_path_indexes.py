@@ -0,0 +1,46 @@
+# Generated by Django 3.0.14 on 2026-10-19 02:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_shoe_count'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='characteristic',
+            index=models.Index(fields=['user', 'name'], name='core_charac_user_id_c36f06_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shoes',
+            index=models.Index(fields=['user', 'id'], name='core_shoes_user_id_2cdfd1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shoes',
+            index=models.Index(fields=['user', 'brand'], name='core_shoes_user_id_202151_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shoes',
+            index=models.Index(fields=['user', 'price'], name='core_shoes_user_id_113589_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['user', 'name'], name='core_tag_user_id_74e398_idx'),
+        ),
+        #the auto-created through tables only get a unique (shoes_id, x_id)
+        #index, so looking up the shoes of a tag/characteristic needs the
+        #reverse order to stay index-only
+        migrations.RunSQL(
+            'CREATE INDEX core_shoes_tags_tag_id_shoes_id_idx '
+            'ON core_shoes_tags (tag_id, shoes_id);',
+            'DROP INDEX core_shoes_tags_tag_id_shoes_id_idx;',
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX core_shoes_characteristics_char_id_shoes_id_idx '
+            'ON core_shoes_characteristics (characteristic_id, shoes_id);',
+            'DROP INDEX core_shoes_characteristics_char_id_shoes_id_idx;',
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 3.0.14 on 2026-10-19 02:46
+
+import core.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_access_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='shoes',
+            name='image',
+            field=models.ImageField(db_index=True, null=True, upload_to=core.models.shoe_image_file_path),
+        ),
+    ]
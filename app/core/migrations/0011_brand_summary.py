@@ -0,0 +1,56 @@
+# Generated by Django 3.0.14 on 2026-10-19 03:04
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+import django.db.models.deletion
+
+
+def build_brand_summaries(apps, schema_editor):
+    """Summarize the shoes that already exist"""
+    Shoes = apps.get_model('core', 'Shoes')
+    BrandSummary = apps.get_model('core', 'BrandSummary')
+
+    rows = Shoes.objects.values('user_id', 'brand') \
+                        .annotate(count=Count('id'), total=Sum('price')) \
+                        .order_by()
+    BrandSummary.objects.bulk_create(
+        (BrandSummary(user_id=row['user_id'], brand=row['brand'],
+                      shoe_count=row['count'], total_price=row['total'])
+         for row in rows.iterator()),
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_sync_timestamps_tombstone'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BrandSummary',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('brand', models.CharField(max_length=255)),
+                ('shoe_count', models.PositiveIntegerField(default=0)),
+                ('total_price', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['user', '-shoe_count'], name='core_tag_user_id_c37bc5_idx'),
+        ),
+        migrations.AddField(
+            model_name='brandsummary',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddConstraint(
+            model_name='brandsummary',
+            constraint=models.UniqueConstraint(fields=('user', 'brand'), name='core_brandsummary_user_brand'),
+        ),
+        migrations.RunPython(build_brand_summaries,
+                             migrations.RunPython.noop),
+    ]
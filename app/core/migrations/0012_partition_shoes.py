@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.db import migrations
+
+from core import partitioning
+
+
+def partition_shoes(apps, schema_editor):
+    """Hash partition the shoe tables when SHOES_PARTITIONS is set"""
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql' and settings.SHOES_PARTITIONS:
+        partitioning.partition_tables(connection, settings.SHOES_PARTITIONS)
+
+
+def unpartition_shoes(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        partitioning.unpartition_tables(connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_brand_summary'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_shoes, unpartition_shoes),
+    ]
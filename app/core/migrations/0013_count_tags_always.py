@@ -0,0 +1,26 @@
+from django.db import migrations
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_tags(apps, schema_editor):
+    """Recount Tag.shoe_count, which is now maintained unconditionally"""
+    Tag = apps.get_model('core', 'Tag')
+    Shoes = apps.get_model('core', 'Shoes')
+
+    counts = Shoes.tags.through.objects.filter(tag_id=OuterRef('pk')) \
+                                       .values('tag_id') \
+                                       .annotate(total=Count('*')) \
+                                       .values('total')
+    Tag.objects.update(shoe_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_partition_shoes'),
+    ]
+
+    operations = [
+        migrations.RunPython(count_tags, migrations.RunPython.noop),
+    ]
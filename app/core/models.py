@@ -1,5 +1,7 @@
 import uuid
 import os
+from decimal import Decimal
+
 from django.db import models
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, \
                                         PermissionsMixin
@@ -57,6 +59,17 @@ class Tag(models.Model):
         
         on_delete = models.CASCADE,
     )
+    #always maintained, the stats endpoint ranks tags by it
+    shoe_count = models.PositiveIntegerField(default=0, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'name']),
+            models.Index(fields=['user', 'updated_at']),
+            models.Index(fields=['user', '-shoe_count']),
+        ]
 
     def __str__(self):
         return self.name
@@ -68,6 +81,16 @@ class Characteristic(models.Model):
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
     )
+    #only maintained when SHOES_DENORMALIZED_COUNTS is enabled
+    shoe_count = models.PositiveIntegerField(default=0, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'name']),
+            models.Index(fields=['user', 'updated_at']),
+        ]
 
     def __str__(self):
         return self.name
@@ -86,7 +109,96 @@ class Shoes(models.Model):
 
     characteristics = models.ManyToManyField('Characteristic')
     tags = models.ManyToManyField('Tag')
-    image = models.ImageField(null = True, upload_to=shoe_image_file_path)
+    #indexed so content addressed files can be reference counted
+    image = models.ImageField(
+        null = True,
+        upload_to=shoe_image_file_path,
+        db_index=True
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    #also bumped when the shoe's tags or characteristics change
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'id']),
+            models.Index(fields=['user', 'brand']),
+            models.Index(fields=['user', 'price']),
+            models.Index(fields=['user', 'updated_at']),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Remember the stored image and brand/price as loaded
+
+        _original_image lets a replaced file be released and
+        _original_summary lets the brand summaries follow an edit.
+        """
+        instance = super().from_db(db, field_names, values)
+        instance._original_image = instance.__dict__.get('image')
+        instance._original_summary = (
+            instance.__dict__.get('brand'),
+            instance.__dict__.get('price'),
+        )
+        return instance
+
+    def __str__(self):
+        return self.title
+
+class BrandSummary(models.Model):
+    """Running shoe count and price total of one brand in a catalog"""
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+    )
+    brand = models.CharField(max_length=255)
+    shoe_count = models.PositiveIntegerField(default=0)
+    total_price = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=0
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'brand'],
+                name='core_brandsummary_user_brand'
+            ),
+        ]
+
+    @property
+    def average_price(self):
+        return (self.total_price / self.shoe_count).quantize(Decimal('0.01'))
+
+    def __str__(self):
+        return self.brand
+
+class Tombstone(models.Model):
+    """Record of a deleted tag, characteristic or shoe for delta sync"""
+    KIND_SHOE = 'shoe'
+    KIND_TAG = 'tag'
+    KIND_CHARACTERISTIC = 'characteristic'
+    KIND_CHOICES = (
+        (KIND_SHOE, 'Shoe'),
+        (KIND_TAG, 'Tag'),
+        (KIND_CHARACTERISTIC, 'Characteristic'),
+    )
+
+    #no constraint: tombstones are written while a user is being deleted
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+    )
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    object_id = models.IntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'deleted_at']),
+        ]
 
     def __str__(self):
-        return self.title
\ No newline at end of file
+        return f'{self.kind} {self.object_id}'
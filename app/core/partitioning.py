@@ -0,0 +1,137 @@
+"""Hash partitioning of the shoe tables on PostgreSQL
+
+core_shoes is partitioned by user_id and its tag/characteristic through
+tables by shoes_id, the only column they have that follows the owner.
+PostgreSQL requires unique constraints on a partitioned table to include
+the partition key, so the shoe primary key becomes (id, user_id) and the
+through tables lose their foreign key to core_shoes; deleting a shoe still
+deletes its links, as Django removes them itself. The models do not change.
+"""
+SHOES_TABLE = 'core_shoes'
+
+#table -> partition key. Named rather than read off the models, as the
+#0012 migration uses this module.
+PARTITIONED_TABLES = (
+    (SHOES_TABLE, 'user_id'),
+    ('core_shoes_tags', 'shoes_id'),
+    ('core_shoes_characteristics', 'shoes_id'),
+)
+
+
+def is_partitioned(cursor, table):
+    cursor.execute(
+        'SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass',
+        [table]
+    )
+    return cursor.fetchone() is not None
+
+
+def table_definition(cursor, table):
+    """Return the constraint and standalone index definitions of a table"""
+    cursor.execute(
+        'SELECT conname, contype, pg_get_constraintdef(oid) '
+        'FROM pg_constraint WHERE conrelid = %s::regclass AND contype <> %s '
+        'ORDER BY contype DESC, conname',
+        [table, 'n']
+    )
+    constraints = cursor.fetchall()
+
+    cursor.execute(
+        'SELECT pg_get_indexdef(indexrelid) FROM pg_index '
+        'WHERE indrelid = %s::regclass AND indexrelid NOT IN ('
+        '    SELECT conindid FROM pg_constraint WHERE conrelid = %s::regclass'
+        ') ORDER BY indexrelid',
+        [table, table]
+    )
+    indexes = [row[0] for row in cursor.fetchall()]
+
+    return constraints, indexes
+
+
+def serial_sequence(cursor, table):
+    cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [table])
+    return cursor.fetchone()[0]
+
+
+def rebuild_table(cursor, table, partition_clause, partitions,
+                  constraint_sql):
+    """Copy a table into a new one built by the given DDL and swap them
+
+    `constraint_sql(name, kind, definition)` returns the constraint to add
+    to the new table, or None to leave it out.
+    """
+    qn = cursor.db.ops.quote_name
+    old = f'{table}_old'
+    constraints, indexes = table_definition(cursor, table)
+    sequence = serial_sequence(cursor, table)
+
+    cursor.execute(f'ALTER TABLE {qn(table)} RENAME TO {qn(old)}')
+    cursor.execute(
+        f'CREATE TABLE {qn(table)} (LIKE {qn(old)} INCLUDING DEFAULTS) '
+        f'{partition_clause}'
+    )
+    for remainder in range(partitions):
+        cursor.execute(
+            f'CREATE TABLE {qn(f"{table}_p{remainder}")} PARTITION OF '
+            f'{qn(table)} FOR VALUES WITH '
+            f'(MODULUS {partitions}, REMAINDER {remainder})'
+        )
+    cursor.execute(f'INSERT INTO {qn(table)} SELECT * FROM {qn(old)}')
+
+    #the sequence would go with the table owning it
+    cursor.execute(f'ALTER SEQUENCE {sequence} OWNED BY {qn(table)}.id')
+    cursor.execute(f'DROP TABLE {qn(old)} CASCADE')
+
+    for name, kind, definition in constraints:
+        definition = constraint_sql(name, kind, definition)
+        if definition is not None:
+            cursor.execute(
+                f'ALTER TABLE {qn(table)} ADD CONSTRAINT {qn(name)} '
+                f'{definition}'
+            )
+    for index in indexes:
+        cursor.execute(index)
+
+
+def partition_tables(connection, partitions):
+    """Hash partition the shoe tables into `partitions` partitions each"""
+    with connection.cursor() as cursor:
+        for table, key in PARTITIONED_TABLES:
+            if is_partitioned(cursor, table):
+                continue
+
+            def constraint_sql(name, kind, definition, key=key):
+                if kind == 'p':
+                    return f'PRIMARY KEY (id, {key})'
+                if kind == 'f' and f'REFERENCES {SHOES_TABLE}(' in definition:
+                    #unique on (id, user_id) only, so it cannot be referenced
+                    return None
+                return definition
+
+            rebuild_table(cursor, table, f'PARTITION BY HASH ({key})',
+                          partitions, constraint_sql)
+
+
+def unpartition_tables(connection):
+    """Turn the shoe tables back into plain tables"""
+    qn = connection.ops.quote_name
+
+    def constraint_sql(name, kind, definition):
+        return 'PRIMARY KEY (id)' if kind == 'p' else definition
+
+    with connection.cursor() as cursor:
+        partitioned = [table for table, _ in PARTITIONED_TABLES
+                       if is_partitioned(cursor, table)]
+        for table in partitioned:
+            rebuild_table(cursor, table, '', 0, constraint_sql)
+
+        #restore the foreign keys partitioning dropped
+        for table, key in PARTITIONED_TABLES:
+            if key != 'shoes_id' or SHOES_TABLE not in partitioned:
+                continue
+            cursor.execute(
+                f'ALTER TABLE {qn(table)} ADD CONSTRAINT '
+                f'{qn(f"{table}_shoes_id_fk")} FOREIGN KEY (shoes_id) '
+                f'REFERENCES {qn(SHOES_TABLE)} (id) '
+                f'DEFERRABLE INITIALLY DEFERRED'
+            )
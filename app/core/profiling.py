@@ -0,0 +1,93 @@
+import json
+import os
+import re
+import sys
+import threading
+from collections import Counter
+
+from django.core import signing
+
+PROFILING_SALT = 'core.profiling'
+
+
+def frame_name(frame):
+    """Return a frame as module.function, the unit a flame graph groups"""
+    module = frame.f_globals.get('__name__', '?')
+    return f'{module}.{frame.f_code.co_name}'
+
+
+class StackSampler:
+    """Sample one thread's call stack from a background thread
+
+    Samples are counted by stack, root first, which is the collapsed
+    format flamegraph.pl and speedscope read. The sampled thread runs
+    untouched; the cost is the sampler waking up every `interval` seconds.
+    """
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profiler',
+                                        daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        """Stop sampling and return the sampled stacks"""
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(frame_name(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+
+def collapsed(stacks):
+    """Return sampled stacks as collapsed-stack lines"""
+    return ''.join(
+        f'{stack} {count}\n' for stack, count in stacks.most_common()
+    )
+
+
+def profile_name(started, view_name, label=None):
+    """Return a file name for a profile, safe on any filesystem"""
+    parts = [started.strftime('%Y%m%dT%H%M%S%f'), view_name or 'unresolved']
+    if label:
+        parts.append(label)
+    parts.append(str(os.getpid()))
+    return re.sub(r'[^\w.-]+', '_', '-'.join(parts))
+
+
+def write_profile(directory, name, stacks, metadata):
+    """Write `name`.folded with the stacks and `name`.json beside it"""
+    os.makedirs(directory, exist_ok=True)
+    base = os.path.join(directory, name)
+    with open(base + '.folded', 'w') as folded:
+        folded.write(collapsed(stacks))
+    with open(base + '.json', 'w') as meta:
+        json.dump(dict(metadata, samples=sum(stacks.values())), meta,
+                  indent=2)
+
+
+def profile_token(label):
+    """Return an X-Profile header value that asks for a profile"""
+    return signing.TimestampSigner(salt=PROFILING_SALT).sign(label)
+
+
+def profile_label(token, max_age):
+    """Return the label of a valid X-Profile value, or None"""
+    try:
+        return signing.TimestampSigner(salt=PROFILING_SALT) \
+                      .unsign(token, max_age=max_age)
+    except signing.BadSignature:
+        return None
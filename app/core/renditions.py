@@ -0,0 +1,124 @@
+import io
+import logging
+import queue
+import threading
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage, get_storage_class
+from django.utils.functional import LazyObject
+
+logger = logging.getLogger(__name__)
+
+RENDITIONS_DIR = 'renditions/shoe'
+
+
+class RenditionStorage(LazyObject):
+    """Storage for renditions, which are named after their original
+
+    The originals are content addressed, so a rendition's name derived from
+    its original's never needs to change.
+    """
+
+    def _setup(self):
+        self._wrapped = get_storage_class(settings.RENDITION_STORAGE)()
+
+
+rendition_storage = RenditionStorage()
+
+
+def rendition_name(name, size):
+    """Return the storage name of an image's rendition at `size` pixels"""
+    return f'{RENDITIONS_DIR}/{size}/{name}'
+
+
+def original_name(path):
+    """Return the original image name for a rendition path, or None"""
+    prefix = RENDITIONS_DIR + '/'
+    if not path.startswith(prefix):
+        return None
+
+    size, _, name = path[len(prefix):].partition('/')
+    if not size.isdigit() or int(size) not in settings.SHOES_RENDITION_SIZES:
+        return None
+
+    return name
+
+
+def render(name):
+    """Write the missing renditions of one stored image"""
+    #Pillow is only needed by the workers that actually render
+    from PIL import Image
+
+    missing = [
+        size for size in settings.SHOES_RENDITION_SIZES
+        if not rendition_storage.exists(rendition_name(name, size))
+    ]
+    if not missing:
+        return
+
+    with default_storage.open(name) as original:
+        image = Image.open(original)
+        image.load()
+
+    image_format = image.format or 'JPEG'
+    if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+
+    for size in missing:
+        rendition = image.copy()
+        rendition.thumbnail((size, size))
+        buffer = io.BytesIO()
+        rendition.save(buffer, format=image_format)
+        rendition_storage.save(rendition_name(name, size),
+                               ContentFile(buffer.getvalue()))
+
+
+def delete_renditions(name):
+    """Delete every rendition of an image"""
+    for size in settings.SHOES_RENDITION_SIZES:
+        rendition_storage.delete(rendition_name(name, size))
+
+
+class RenditionQueue:
+    """Render images on a background thread of this process
+
+    Nothing is persisted: renditions lost to a restart are recreated by
+    queueing the image again, as render() skips sizes that exist.
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def put(self, names):
+        """Queue images for rendering"""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run,
+                    name='renditions',
+                    daemon=True
+                )
+                self._thread.start()
+
+        for name in names:
+            self._queue.put(name)
+
+    def join(self):
+        """Wait until every queued image has been rendered"""
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            name = self._queue.get()
+            try:
+                render(name)
+            except Exception:
+                logger.exception('Rendering %s failed', name)
+            finally:
+                self._queue.task_done()
+
+
+renditions = RenditionQueue()
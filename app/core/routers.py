@@ -0,0 +1,100 @@
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.utils import OperationalError
+
+#set by ReplicaRoutingMiddleware for the duration of a safe request
+_replica_reads = ContextVar('replica_reads', default=None)
+
+#replica alias -> monotonic time at which it may be tried again
+_down_until = {}
+
+
+class ReplicaChoice:
+    """The replica a block reads from, picked on its first read
+
+    Every read of a request then sees the same replica, and so the same
+    point in time, rather than each query landing on a different lag.
+    """
+
+    def __init__(self):
+        self.alias = None
+
+    def get(self):
+        if self.alias is None:
+            self.alias = choose_replica()
+
+        return self.alias
+
+
+@contextmanager
+def replica_reads():
+    """Route reads inside the block to one replica"""
+    token = _replica_reads.set(ReplicaChoice())
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def mark_replica_down(alias):
+    """Stop routing to a replica for REPLICA_RETRY_SECONDS"""
+    _down_until[alias] = time.monotonic() + settings.REPLICA_RETRY_SECONDS
+
+
+def _available(alias):
+    """Return whether a replica is up, connecting to it if needed"""
+    if _down_until.get(alias, 0) > time.monotonic():
+        return False
+
+    try:
+        connections[alias].ensure_connection()
+    except OperationalError:
+        mark_replica_down(alias)
+        return False
+
+    _down_until.pop(alias, None)
+    return True
+
+
+def choose_replica():
+    """Return a live replica alias, or the primary if none is reachable"""
+    replicas = list(settings.DATABASE_REPLICAS)
+    random.shuffle(replicas)
+    for alias in replicas:
+        if _available(alias):
+            return alias
+
+    return DEFAULT_DB_ALIAS
+
+
+class ReplicaRouter:
+    """Send reads to replicas during safe requests and writes to the primary"""
+
+    def db_for_read(self, model, **hints):
+        replica = _replica_reads.get()
+        if replica is None or not settings.DATABASE_REPLICAS:
+            return DEFAULT_DB_ALIAS
+
+        #reads inside a transaction must see its uncommitted writes
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+
+        return replica.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if {obj1._state.db, obj2._state.db} <= databases:
+            return True
+
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
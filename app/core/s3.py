@@ -0,0 +1,450 @@
+import hashlib
+import hmac
+import http.client
+import io
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone as dt_timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import quote, urlsplit
+from xml.etree import ElementTree
+
+from django.conf import settings
+from django.core.files.base import File
+from django.core.files.storage import Storage
+from django.utils import timezone
+from django.utils.deconstruct import deconstructible
+from django.utils.functional import cached_property
+
+ALGORITHM = 'AWS4-HMAC-SHA256'
+UNSIGNED_PAYLOAD = 'UNSIGNED-PAYLOAD'
+
+
+def uri_encode(value, safe='-_.~'):
+    return quote(value, safe=safe)
+
+
+def canonical_query(params):
+    """Return query parameters in SigV4 canonical form"""
+    return '&'.join(
+        f'{uri_encode(key)}={uri_encode(value)}'
+        for key, value in sorted(params.items())
+    )
+
+
+def canonical_request(method, path, params, headers, signed_headers,
+                      payload_hash):
+    """Return the SigV4 canonical request for an encoded path"""
+    canonical_headers = ''.join(
+        f'{name}:{" ".join(str(headers[name]).split())}\n'
+        for name in signed_headers
+    )
+    return '\n'.join((
+        method,
+        path,
+        canonical_query(params),
+        canonical_headers,
+        ';'.join(signed_headers),
+        payload_hash,
+    ))
+
+
+def signature(secret_key, region, amz_date, request):
+    """Return the hex SigV4 signature of a canonical request"""
+    date = amz_date[:8]
+    key = ('AWS4' + secret_key).encode()
+    for part in (date, region, 's3', 'aws4_request'):
+        key = hmac.new(key, part.encode(), hashlib.sha256).digest()
+
+    string_to_sign = '\n'.join((
+        ALGORITHM,
+        amz_date,
+        f'{date}/{region}/s3/aws4_request',
+        hashlib.sha256(request.encode()).hexdigest(),
+    ))
+    return hmac.new(key, string_to_sign.encode(), hashlib.sha256).hexdigest()
+
+
+def amz_date(now=None):
+    now = now or datetime.now(dt_timezone.utc)
+    return now.strftime('%Y%m%dT%H%M%SZ')
+
+
+def sign_headers(method, path, params, headers, payload_hash, access_key,
+                 secret_key, region, now=None):
+    """Add SigV4 Authorization headers to `headers` (lower-case names)"""
+    headers['x-amz-date'] = amz_date(now)
+    headers['x-amz-content-sha256'] = payload_hash
+    signed_headers = sorted(headers)
+    request = canonical_request(method, path, params, headers,
+                                signed_headers, payload_hash)
+    date = headers['x-amz-date']
+    credential = f'{access_key}/{date[:8]}/{region}/s3/aws4_request'
+    headers['authorization'] = (
+        f'{ALGORITHM} Credential={credential}, '
+        f'SignedHeaders={";".join(signed_headers)}, '
+        f'Signature={signature(secret_key, region, date, request)}'
+    )
+
+
+def presign(method, host, path, access_key, secret_key, region, expires,
+            now=None, params=None):
+    """Return the query parameters of a presigned request"""
+    date = amz_date(now)
+    credential = f'{access_key}/{date[:8]}/{region}/s3/aws4_request'
+    query = dict(params or {})
+    query.update({
+        'X-Amz-Algorithm': ALGORITHM,
+        'X-Amz-Credential': credential,
+        'X-Amz-Date': date,
+        'X-Amz-Expires': str(expires),
+        'X-Amz-SignedHeaders': 'host',
+    })
+    request = canonical_request(method, path, query, {'host': host},
+                                ['host'], UNSIGNED_PAYLOAD)
+    query['X-Amz-Signature'] = signature(secret_key, region, date, request)
+    return query
+
+
+def xml_text(root, tag):
+    """Return the text of the first element named `tag`, any namespace"""
+    for element in root.iter():
+        if element.tag == tag or element.tag.endswith('}' + tag):
+            return element.text
+
+    return None
+
+
+class S3Error(Exception):
+    """An error response from the object store"""
+
+    def __init__(self, status, code, message=''):
+        super().__init__(f'{status} {code}: {message}')
+        self.status = status
+        self.code = code
+
+    @classmethod
+    def from_response(cls, status, body):
+        try:
+            root = ElementTree.fromstring(body)
+        except ElementTree.ParseError:
+            return cls(status, 'Unknown', body[:200])
+
+        return cls(status, xml_text(root, 'Code'), xml_text(root, 'Message'))
+
+
+class S3Client:
+    """Minimal S3 REST client using path-style addressing
+
+    Each thread keeps one persistent connection to the endpoint.
+    """
+
+    def __init__(self, endpoint_url, bucket, region, access_key, secret_key,
+                 timeout=30):
+        parsed = urlsplit(endpoint_url)
+        self.scheme = parsed.scheme
+        self.host = parsed.netloc
+        self.bucket = bucket
+        self.region = region
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def object_path(self, key):
+        return f'/{uri_encode(self.bucket)}/{uri_encode(key, safe="/-_.~")}'
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection_class = http.client.HTTPSConnection \
+                if self.scheme == 'https' else http.client.HTTPConnection
+            connection = connection_class(self.host, timeout=self.timeout)
+            self._local.connection = connection
+
+        return connection
+
+    def request(self, method, key, params=None, body=b'', headers=None,
+                expect=(200,)):
+        """Send a signed request and return (response, body bytes)"""
+        params = params or {}
+        path = self.object_path(key)
+        headers = {name.lower(): value for name, value in
+                   (headers or {}).items()}
+        headers['host'] = self.host
+        sign_headers(method, path, params, headers,
+                     hashlib.sha256(body).hexdigest(), self.access_key,
+                     self.secret_key, self.region)
+        url = path + ('?' + canonical_query(params) if params else '')
+
+        for attempt in (1, 2):
+            connection = self._connection()
+            try:
+                connection.request(method, url, body=body, headers=headers)
+                response = connection.getresponse()
+                data = response.read()
+                break
+            except (http.client.HTTPException, OSError):
+                #the server may have closed an idle keep-alive connection
+                connection.close()
+                self._local.connection = None
+                if attempt == 2:
+                    raise
+
+        if response.status not in expect:
+            raise S3Error.from_response(response.status, data)
+
+        return response, data
+
+    def presigned_url(self, method, key, expires, params=None):
+        """Return a URL that allows one request without credentials"""
+        path = self.object_path(key)
+        query = presign(method, self.host, path, self.access_key,
+                        self.secret_key, self.region, expires, params=params)
+        return f'{self.scheme}://{self.host}{path}?{canonical_query(query)}'
+
+    def put_object(self, key, body, content_type):
+        response, _ = self.request('PUT', key, body=body, headers={
+            'content-type': content_type,
+        })
+        return response.getheader('ETag')
+
+    def upload_multipart(self, key, first_part, stream, part_size,
+                         content_type):
+        """Upload `first_part` and the rest of `stream` in parts"""
+        _, data = self.request('POST', key, params={'uploads': ''}, headers={
+            'content-type': content_type,
+        })
+        upload_id = xml_text(ElementTree.fromstring(data), 'UploadId')
+
+        try:
+            etags = []
+            part = first_part
+            while part:
+                response, _ = self.request('PUT', key, body=part, params={
+                    'partNumber': str(len(etags) + 1),
+                    'uploadId': upload_id,
+                })
+                etags.append(response.getheader('ETag'))
+                part = stream.read(part_size)
+
+            root = ElementTree.Element('CompleteMultipartUpload')
+            for number, etag in enumerate(etags, 1):
+                element = ElementTree.SubElement(root, 'Part')
+                ElementTree.SubElement(element, 'PartNumber').text = \
+                    str(number)
+                ElementTree.SubElement(element, 'ETag').text = etag
+            _, data = self.request('POST', key, params={
+                'uploadId': upload_id,
+            }, body=ElementTree.tostring(root))
+
+            #completion can fail after the 200 status has been sent
+            if b'<Error>' in data:
+                raise S3Error.from_response(200, data)
+        except Exception:
+            self.request('DELETE', key, params={'uploadId': upload_id},
+                         expect=(200, 204, 404))
+            raise
+
+        return xml_text(ElementTree.fromstring(data), 'ETag')
+
+    def head_object(self, key):
+        """Return (size, last modified, etag), or None if missing"""
+        response, _ = self.request('HEAD', key, expect=(200, 404))
+        if response.status == 404:
+            return None
+
+        return (
+            int(response.getheader('Content-Length')),
+            parsedate_to_datetime(response.getheader('Last-Modified')),
+            response.getheader('ETag'),
+        )
+
+    def get_object(self, key, length=None):
+        """Return an object's bytes, or only its first `length` bytes"""
+        headers = {'range': f'bytes=0-{length - 1}'} if length else None
+        _, data = self.request('GET', key, headers=headers, expect=(200, 206))
+        return data
+
+    def copy_object(self, source, key):
+        """Copy an object within the bucket without downloading it"""
+        _, data = self.request('PUT', key, headers={
+            'x-amz-copy-source': self.object_path(source),
+        })
+        #a copy can fail after the 200 status has been sent
+        if b'<Error>' in data:
+            raise S3Error.from_response(200, data)
+
+    def delete_object(self, key):
+        self.request('DELETE', key, expect=(200, 204))
+
+
+class MetadataCache:
+    """LRU of object metadata with a time to live
+
+    Only existing objects are cached, so a file uploaded by another worker
+    is seen at once; a deletion elsewhere is seen after `ttl` seconds.
+    """
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, metadata):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, metadata)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+@deconstructible
+class S3Storage(Storage):
+    """Storage in an S3-compatible bucket, configured by the S3_* settings
+
+    Files of at least S3_MULTIPART_SIZE bytes are sent as multipart
+    uploads, and url() returns presigned GET URLs.
+    """
+
+    def __init__(self, bucket=None, endpoint_url=None, region=None,
+                 access_key=None, secret_key=None):
+        self._bucket = bucket
+        self._endpoint_url = endpoint_url
+        self._region = region
+        self._access_key = access_key
+        self._secret_key = secret_key
+
+    @cached_property
+    def client(self):
+        return S3Client(
+            self._endpoint_url or settings.S3_ENDPOINT_URL,
+            self._bucket or settings.S3_BUCKET,
+            self._region or settings.S3_REGION,
+            self._access_key or settings.S3_ACCESS_KEY_ID,
+            self._secret_key or settings.S3_SECRET_ACCESS_KEY,
+            timeout=settings.S3_TIMEOUT
+        )
+
+    @cached_property
+    def metadata_cache(self):
+        return MetadataCache(settings.S3_METADATA_CACHE_SIZE,
+                             settings.S3_METADATA_CACHE_TTL)
+
+    def metadata(self, name):
+        """Return (size, last modified, etag) of a file, or None"""
+        metadata = self.metadata_cache.get(name)
+        if metadata is None:
+            metadata = self.client.head_object(name)
+            if metadata is not None:
+                self.metadata_cache.set(name, metadata)
+
+        return metadata
+
+    def _open(self, name, mode='rb'):
+        if 'w' in mode or 'a' in mode:
+            raise ValueError('S3 files can only be opened for reading')
+
+        try:
+            data = self.client.get_object(name)
+        except S3Error as exc:
+            if exc.status == 404:
+                raise FileNotFoundError(name)
+            raise
+
+        return File(io.BytesIO(data), name=name)
+
+    def _save(self, name, content):
+        part_size = settings.S3_MULTIPART_SIZE
+        content_type = getattr(content, 'content_type', None) or \
+            'application/octet-stream'
+        if hasattr(content, 'seek'):
+            content.seek(0)
+
+        first_part = content.read(part_size)
+        if len(first_part) < part_size:
+            self.client.put_object(name, first_part, content_type)
+        else:
+            self.client.upload_multipart(name, first_part, content,
+                                         part_size, content_type)
+
+        self.metadata_cache.discard(name)
+        return name
+
+    def delete(self, name):
+        self.client.delete_object(name)
+        self.metadata_cache.discard(name)
+
+    def move(self, name, new_name):
+        """Move a file to a new name inside the bucket"""
+        try:
+            self.client.copy_object(name, new_name)
+        except S3Error as exc:
+            if exc.status == 404:
+                raise FileNotFoundError(name)
+            raise
+
+        self.metadata_cache.discard(new_name)
+        self.delete(name)
+
+    def read_start(self, name, length):
+        """Return the first `length` bytes of a file"""
+        try:
+            return self.client.get_object(name, length)
+        except S3Error as exc:
+            if exc.status == 404:
+                raise FileNotFoundError(name)
+            raise
+
+    def exists(self, name):
+        return self.metadata(name) is not None
+
+    def size(self, name):
+        metadata = self.metadata(name)
+        if metadata is None:
+            raise FileNotFoundError(name)
+
+        return metadata[0]
+
+    def get_modified_time(self, name):
+        metadata = self.metadata(name)
+        if metadata is None:
+            raise FileNotFoundError(name)
+
+        modified = metadata[1]
+        if settings.USE_TZ:
+            return modified
+
+        return timezone.make_naive(modified)
+
+    def url(self, name):
+        return self.presigned_url(name)
+
+    def upload_url(self, name, expires):
+        """Return a URL for uploading `name` straight to the bucket"""
+        return self.presigned_url(name, method='PUT', expires=expires)
+
+    def presigned_url(self, name, method='GET', expires=None):
+        """Return a time-limited URL for one request on a file"""
+        return self.client.presigned_url(
+            method,
+            name,
+            expires or settings.S3_URL_EXPIRES
+        )
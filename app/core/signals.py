@@ -0,0 +1,353 @@
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.backends.signals import connection_created
+from django.db.models import Count, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.db.models.signals import m2m_changed, pre_delete, post_delete, \
+                                     post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core import slow_queries
+from core.events import broker
+from core.models import Tag, Characteristic, Shoes, Tombstone, BrandSummary
+from core.renditions import delete_renditions
+from core.similarity import shoe_indexes
+from core.storage import lock_content
+
+#through table -> (counted model, name of its fk on the through table)
+COUNTED_RELATIONS = {
+    Shoes.tags.through: (Tag, 'tag_id'),
+    Shoes.characteristics.through: (Characteristic, 'characteristic_id'),
+}
+
+
+def update_shoe_counts(model, pks=None):
+    """Recompute the denormalized shoe_count for the given objects"""
+    through, fk_name = next(
+        (through, fk_name)
+        for through, (counted, fk_name) in COUNTED_RELATIONS.items()
+        if counted is model
+    )
+    counts = through.objects.filter(**{fk_name: OuterRef('pk')}) \
+                            .values(fk_name) \
+                            .annotate(total=Count('*')) \
+                            .values('total')
+
+    queryset = model.objects.all()
+    if pks is not None:
+        queryset = queryset.filter(pk__in=pks)
+
+    return queryset.update(shoe_count=Coalesce(Subquery(counts), 0))
+
+
+def counts_maintained(model):
+    """Return whether a model's shoe_count is kept up to date
+
+    Tag counts always are, as the stats endpoint ranks tags by them.
+    """
+    return model is Tag or settings.SHOES_DENORMALIZED_COUNTS
+
+
+@receiver(m2m_changed, sender=Shoes.tags.through)
+@receiver(m2m_changed, sender=Shoes.characteristics.through)
+def track_shoe_counts(sender, instance, action, reverse, pk_set, **kwargs):
+    """Keep shoe_count in step with changes to a shoe's tags/characteristics"""
+    counted, fk_name = COUNTED_RELATIONS[sender]
+    if not counts_maintained(counted):
+        return
+
+    if reverse:
+        #instance is the tag/characteristic itself
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            update_shoe_counts(counted, [instance.pk])
+    elif action == 'post_add':
+        #pk_set only holds the links that were actually created
+        counted.objects.filter(pk__in=pk_set) \
+                       .update(shoe_count=F('shoe_count') + 1)
+    elif action == 'post_remove':
+        update_shoe_counts(counted, pk_set)
+    elif action == 'pre_clear':
+        instance._cleared_count_pks = list(
+            sender.objects.filter(shoes_id=instance.pk)
+                          .values_list(fk_name, flat=True)
+        )
+    elif action == 'post_clear':
+        update_shoe_counts(counted, instance.__dict__.pop(
+            '_cleared_count_pks', []
+        ))
+
+
+@receiver(pre_delete, sender=Shoes)
+def remember_counted_relations(sender, instance, **kwargs):
+    """Record which counts a shoe deletion will affect"""
+    instance._counted_pks = {
+        counted: list(through.objects.filter(shoes_id=instance.pk)
+                                     .values_list(fk_name, flat=True))
+        for through, (counted, fk_name) in COUNTED_RELATIONS.items()
+        if counts_maintained(counted)
+    }
+
+
+@receiver(post_delete, sender=Shoes)
+def update_counts_after_delete(sender, instance, **kwargs):
+    """Recount the tags/characteristics of a deleted shoe"""
+    for counted, pks in instance.__dict__.pop('_counted_pks', {}).items():
+        update_shoe_counts(counted, pks)
+
+
+def adjust_brand_summary(user_id, brand, count, total):
+    """Add count shoes worth total to a brand's summary row"""
+    rows = BrandSummary.objects.filter(user_id=user_id, brand=brand)
+    updated = rows.update(
+        shoe_count=F('shoe_count') + count,
+        total_price=F('total_price') + total
+    )
+
+    if not updated and count > 0:
+        try:
+            with transaction.atomic():
+                BrandSummary.objects.create(user_id=user_id, brand=brand,
+                                            shoe_count=count,
+                                            total_price=total)
+        except IntegrityError:
+            #another request created it first
+            rows.update(
+                shoe_count=F('shoe_count') + count,
+                total_price=F('total_price') + total
+            )
+    elif count < 0:
+        rows.filter(shoe_count=0).delete()
+
+
+def rebuild_brand_summaries(user_ids=None):
+    """Recompute brand summaries from the shoes table
+
+    Returns the number of summary rows written.
+    """
+    shoes = Shoes.objects.all()
+    summaries = BrandSummary.objects.all()
+    if user_ids is not None:
+        shoes = shoes.filter(user_id__in=user_ids)
+        summaries = summaries.filter(user_id__in=user_ids)
+
+    rows = shoes.values('user_id', 'brand') \
+                .annotate(count=Count('id'), total=Sum('price')) \
+                .order_by()
+    with transaction.atomic():
+        summaries.delete()
+        created = BrandSummary.objects.bulk_create(
+            (BrandSummary(user_id=row['user_id'], brand=row['brand'],
+                          shoe_count=row['count'], total_price=row['total'])
+             for row in rows.iterator()),
+            batch_size=1000
+        )
+
+    return len(created)
+
+
+@receiver(post_save, sender=Shoes)
+def summarize_saved_shoe(sender, instance, created, **kwargs):
+    """Move a shoe's brand and price into the brand summaries"""
+    brand, price = instance.brand, Decimal(str(instance.price))
+    original = getattr(instance, '_original_summary', (None, None))
+    instance._original_summary = (brand, price)
+
+    if created:
+        adjust_brand_summary(instance.user_id, brand, 1, price)
+    elif None in original:
+        #saved without being loaded first, so the old values are unknown
+        rebuild_brand_summaries([instance.user_id])
+    elif original != (brand, price):
+        adjust_brand_summary(instance.user_id, original[0], -1, -original[1])
+        adjust_brand_summary(instance.user_id, brand, 1, price)
+
+
+@receiver(post_delete, sender=Shoes)
+def summarize_deleted_shoe(sender, instance, **kwargs):
+    adjust_brand_summary(instance.user_id, instance.brand, -1,
+                         -Decimal(str(instance.price)))
+
+
+def release_image(name):
+    """Delete an image file once no shoe refers to it any more
+
+    The check and delete run under the file's content lock, which a
+    transaction saving the same bytes holds until it commits.
+    """
+    if not name:
+        return
+
+    with transaction.atomic():
+        lock_content(name)
+        if not Shoes.objects.filter(image=name).exists():
+            default_storage.delete(name)
+            delete_renditions(name)
+
+
+@receiver(post_save, sender=Shoes)
+def release_replaced_image(sender, instance, created, **kwargs):
+    """Release the previous image file when a shoe's image changes"""
+    original = getattr(instance, '_original_image', None)
+    current = instance.image.name
+    instance._original_image = current
+
+    if original and original != current:
+        transaction.on_commit(lambda: release_image(original))
+
+
+@receiver(post_delete, sender=Shoes)
+def release_deleted_image(sender, instance, **kwargs):
+    """Release the image file of a deleted shoe"""
+    name = instance.image.name
+    if name:
+        transaction.on_commit(lambda: release_image(name))
+
+
+TOMBSTONE_KINDS = {
+    Shoes: Tombstone.KIND_SHOE,
+    Tag: Tombstone.KIND_TAG,
+    Characteristic: Tombstone.KIND_CHARACTERISTIC,
+}
+
+
+@receiver(post_delete, sender=Shoes)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Characteristic)
+def record_tombstone(sender, instance, **kwargs):
+    """Remember deletions so delta syncs can report them"""
+    Tombstone.objects.create(
+        user_id=instance.user_id,
+        kind=TOMBSTONE_KINDS[sender],
+        object_id=instance.pk
+    )
+
+
+@receiver(m2m_changed, sender=Shoes.tags.through)
+@receiver(m2m_changed, sender=Shoes.characteristics.through)
+def touch_changed_shoes(sender, instance, action, reverse, pk_set, **kwargs):
+    """Bump updated_at on shoes whose tags/characteristics changed"""
+    if not reverse:
+        shoe_ids = [instance.pk]
+    elif action == 'pre_clear':
+        _, fk_name = COUNTED_RELATIONS[sender]
+        instance._cleared_shoe_ids = list(
+            sender.objects.filter(**{fk_name: instance.pk})
+                          .values_list('shoes_id', flat=True)
+        )
+        return
+    elif action == 'post_clear':
+        shoe_ids = instance.__dict__.pop('_cleared_shoe_ids', [])
+    else:
+        shoe_ids = pk_set
+
+    if action in ('post_add', 'post_remove', 'post_clear') and shoe_ids:
+        Shoes.objects.filter(pk__in=shoe_ids).update(updated_at=timezone.now())
+
+
+def publish_change(user_id, kind, action, object_id):
+    """Publish a catalog change event once the transaction commits"""
+    if not broker.has_subscribers(user_id):
+        return
+
+    event = {'type': f'{kind}.{action}', 'id': object_id}
+    transaction.on_commit(lambda: broker.publish(user_id, event))
+
+
+@receiver(post_save, sender=Shoes)
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Characteristic)
+def publish_saved(sender, instance, created, **kwargs):
+    """Publish created/updated events"""
+    action = 'created' if created else 'updated'
+    publish_change(instance.user_id, TOMBSTONE_KINDS[sender], action,
+                   instance.pk)
+
+
+@receiver(post_delete, sender=Shoes)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Characteristic)
+def publish_deleted(sender, instance, **kwargs):
+    """Publish deleted events"""
+    publish_change(instance.user_id, TOMBSTONE_KINDS[sender], 'deleted',
+                   instance.pk)
+
+
+@receiver(m2m_changed, sender=Shoes.tags.through)
+@receiver(m2m_changed, sender=Shoes.characteristics.through)
+def publish_relations_changed(sender, instance, action, reverse, pk_set,
+                              **kwargs):
+    """Publish shoe updates when tags/characteristics are linked"""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        publish_change(instance.user_id, Tombstone.KIND_SHOE, 'updated',
+                       instance.pk)
+    elif pk_set:
+        for shoe_id in pk_set:
+            publish_change(instance.user_id, Tombstone.KIND_SHOE, 'updated',
+                           shoe_id)
+
+
+def update_similarity_index(user_id, method, *args):
+    """Apply a change to a loaded similarity index once it commits"""
+    if shoe_indexes.is_loaded(user_id):
+        transaction.on_commit(
+            lambda: shoe_indexes.apply(user_id, method, *args)
+        )
+
+
+@receiver(post_save, sender=Shoes)
+def index_saved_shoe(sender, instance, **kwargs):
+    """Index new shoes and brand/price changes"""
+    update_similarity_index(instance.user_id, 'set_shoe', instance.pk,
+                            instance.brand, instance.price)
+
+
+@receiver(post_delete, sender=Shoes)
+def unindex_deleted_shoe(sender, instance, **kwargs):
+    update_similarity_index(instance.user_id, 'remove_shoe', instance.pk)
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Characteristic)
+def unindex_deleted_feature(sender, instance, **kwargs):
+    update_similarity_index(instance.user_id, 'drop_feature',
+                            TOMBSTONE_KINDS[sender], instance.pk)
+
+
+@receiver(m2m_changed, sender=Shoes.tags.through)
+@receiver(m2m_changed, sender=Shoes.characteristics.through)
+def index_relations_changed(sender, instance, action, reverse, pk_set,
+                            **kwargs):
+    """Keep similarity indexes in step with tag/characteristic links"""
+    kind = TOMBSTONE_KINDS[COUNTED_RELATIONS[sender][0]]
+    user_id = instance.user_id
+
+    if action == 'post_clear':
+        if reverse:
+            update_similarity_index(user_id, 'drop_feature', kind,
+                                    instance.pk)
+        else:
+            update_similarity_index(user_id, 'clear_features', instance.pk,
+                                    kind)
+    elif action in ('post_add', 'post_remove') and pk_set:
+        method = 'add_features' if action == 'post_add' else \
+                 'remove_features'
+        if reverse:
+            for shoe_id in pk_set:
+                update_similarity_index(user_id, method, shoe_id, kind,
+                                        [instance.pk])
+        else:
+            update_similarity_index(user_id, method, instance.pk, kind,
+                                    list(pk_set))
+
+
+@receiver(connection_created)
+def install_slow_query_log(sender, connection, **kwargs):
+    """Time the queries of new connections when the slow query log is on"""
+    slow_queries.install(connection)
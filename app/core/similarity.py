@@ -0,0 +1,242 @@
+import heapq
+import threading
+import time
+from array import array
+from collections import OrderedDict, defaultdict
+
+from django.conf import settings
+
+from core.models import Shoes
+
+#weight of one shared tag/characteristic in the weighted Jaccard index
+FEATURE_WEIGHTS = {
+    'tag': 1.0,
+    'characteristic': 1.5,
+}
+
+#how much each signal contributes to the final score
+SET_WEIGHT = 0.7
+BRAND_WEIGHT = 0.2
+PRICE_WEIGHT = 0.1
+
+
+def price_proximity(a, b):
+    """Return 1 for equal prices, falling towards 0 as they diverge"""
+    high = max(a, b)
+    if high <= 0:
+        return 1.0
+
+    return 1.0 - abs(a - b) / high
+
+
+class ShoeIndex:
+    """Inverted index of one user's shoes over tags and characteristics
+
+    Rows are append only: per-row data lives in flat arrays and each
+    feature (a tag or characteristic) and brand keeps a posting list of
+    rows. Deleted shoes leave a dead row behind until the index is rebuilt.
+    """
+
+    def __init__(self):
+        self.rows = {}
+        self.shoe_ids = array('q')
+        self.prices = array('d')
+        self.weights = array('d')
+        self.brands = []
+        self.features = []
+        self.postings = defaultdict(lambda: array('l'))
+        self.brand_postings = defaultdict(lambda: array('l'))
+
+    @classmethod
+    def build(cls, user_id):
+        """Load the index for a user's catalog"""
+        index = cls()
+        shoes = Shoes.objects.filter(user_id=user_id) \
+                             .values_list('id', 'brand', 'price')
+        for shoe_id, brand, price in shoes.iterator():
+            index.set_shoe(shoe_id, brand, price)
+
+        relations = (
+            ('tag', Shoes.tags.through, 'tag_id'),
+            ('characteristic', Shoes.characteristics.through,
+             'characteristic_id'),
+        )
+        for kind, through, fk_name in relations:
+            links = through.objects.filter(shoes__user_id=user_id) \
+                                   .values_list('shoes_id', fk_name)
+            for shoe_id, feature_id in links.iterator():
+                index.add_features(shoe_id, kind, [feature_id])
+
+        return index
+
+    def set_shoe(self, shoe_id, brand, price):
+        """Add a shoe or update its brand and price"""
+        brand = brand.strip().lower()
+        row = self.rows.get(shoe_id)
+        if row is None:
+            row = self.rows[shoe_id] = len(self.shoe_ids)
+            self.shoe_ids.append(shoe_id)
+            self.prices.append(float(price))
+            self.weights.append(0.0)
+            self.brands.append(brand)
+            self.features.append(set())
+            self.brand_postings[brand].append(row)
+            return
+
+        self.prices[row] = float(price)
+        if self.brands[row] != brand:
+            self.brand_postings[self.brands[row]].remove(row)
+            self.brand_postings[brand].append(row)
+            self.brands[row] = brand
+
+    def remove_shoe(self, shoe_id):
+        """Forget a deleted shoe"""
+        row = self.rows.pop(shoe_id, None)
+        if row is None:
+            return
+
+        for feature in self.features[row]:
+            self.postings[feature].remove(row)
+        self.brand_postings[self.brands[row]].remove(row)
+        self.features[row] = set()
+        self.weights[row] = 0.0
+
+    def add_features(self, shoe_id, kind, feature_ids):
+        """Link a shoe to tags or characteristics"""
+        row = self.rows.get(shoe_id)
+        if row is None:
+            return
+
+        for feature_id in feature_ids:
+            feature = (kind, feature_id)
+            if feature not in self.features[row]:
+                self.features[row].add(feature)
+                self.postings[feature].append(row)
+                self.weights[row] += FEATURE_WEIGHTS[kind]
+
+    def remove_features(self, shoe_id, kind, feature_ids):
+        """Unlink a shoe from tags or characteristics"""
+        row = self.rows.get(shoe_id)
+        if row is None:
+            return
+
+        for feature_id in feature_ids:
+            feature = (kind, feature_id)
+            if feature in self.features[row]:
+                self.features[row].remove(feature)
+                self.postings[feature].remove(row)
+                self.weights[row] -= FEATURE_WEIGHTS[kind]
+
+    def clear_features(self, shoe_id, kind):
+        """Unlink a shoe from all its tags or characteristics"""
+        row = self.rows.get(shoe_id)
+        if row is None:
+            return
+
+        self.remove_features(shoe_id, kind, [
+            feature_id for feature_kind, feature_id in self.features[row]
+            if feature_kind == kind
+        ])
+
+    def drop_feature(self, kind, feature_id):
+        """Unlink every shoe from a tag or characteristic"""
+        feature = (kind, feature_id)
+        for row in self.postings.pop(feature, ()):
+            self.features[row].discard(feature)
+            self.weights[row] -= FEATURE_WEIGHTS[kind]
+
+    def similar(self, shoe_id, limit):
+        """Return up to `limit` (shoe id, score) pairs, best first
+
+        Only shoes sharing a feature or the brand are candidates, so the
+        cost depends on the posting lists touched, not the catalog size.
+        """
+        row = self.rows[shoe_id]
+        shared = defaultdict(float)
+        for feature in self.features[row]:
+            weight = FEATURE_WEIGHTS[feature[0]]
+            for other in self.postings[feature]:
+                shared[other] += weight
+
+        brand = self.brands[row]
+        candidates = set(shared)
+        candidates.update(self.brand_postings[brand])
+        candidates.discard(row)
+
+        weight = self.weights[row]
+        price = self.prices[row]
+        scored = []
+        for other in candidates:
+            intersection = shared.get(other, 0.0)
+            union = weight + self.weights[other] - intersection
+            jaccard = intersection / union if union else 0.0
+            score = (
+                SET_WEIGHT * jaccard +
+                BRAND_WEIGHT * (self.brands[other] == brand) +
+                PRICE_WEIGHT * price_proximity(price, self.prices[other])
+            )
+            scored.append((score, -self.shoe_ids[other]))
+
+        return [
+            (-negative_id, round(score, 4))
+            for score, negative_id in heapq.nlargest(limit, scored)
+        ]
+
+
+class IndexRegistry:
+    """Per-process similarity indexes of recently queried users
+
+    Changes made in this process are applied as they commit; indexes are
+    rebuilt after SIMILAR_SHOES_INDEX_TTL seconds to pick up changes from
+    other workers. At most SIMILAR_SHOES_MAX_INDEXES users are kept.
+    """
+
+    def __init__(self):
+        self._indexes = OrderedDict()
+        self._lock = threading.RLock()
+
+    def is_loaded(self, user_id):
+        return user_id in self._indexes
+
+    def get(self, user_id, rebuild=False):
+        """Return the user's index, building it when missing or expired"""
+        with self._lock:
+            entry = self._indexes.get(user_id)
+            if entry is not None and not rebuild and \
+                    time.monotonic() < entry[0]:
+                self._indexes.move_to_end(user_id)
+                return entry[1]
+
+        index = ShoeIndex.build(user_id)
+        expires = time.monotonic() + settings.SIMILAR_SHOES_INDEX_TTL
+        with self._lock:
+            self._indexes[user_id] = (expires, index)
+            self._indexes.move_to_end(user_id)
+            while len(self._indexes) > settings.SIMILAR_SHOES_MAX_INDEXES:
+                self._indexes.popitem(last=False)
+
+        return index
+
+    def apply(self, user_id, method, *args):
+        """Call an update method on the user's index if it is loaded"""
+        with self._lock:
+            entry = self._indexes.get(user_id)
+            if entry is not None:
+                getattr(entry[1], method)(*args)
+
+    def similar(self, user_id, shoe_id, limit):
+        """Return the shoes most similar to one of the user's shoes"""
+        index = self.get(user_id)
+        if shoe_id not in index.rows:
+            #created by another worker since the index was built
+            index = self.get(user_id, rebuild=True)
+
+        with self._lock:
+            return index.similar(shoe_id, limit)
+
+    def clear(self):
+        with self._lock:
+            self._indexes.clear()
+
+
+shoe_indexes = IndexRegistry()
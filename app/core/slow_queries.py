@@ -0,0 +1,166 @@
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+#label of the view the current request is running, set by
+#core.middleware.SlowQueryViewMiddleware
+current_view = ContextVar('current_view', default=None)
+
+STRING_RE = re.compile(r"'(?:[^']|'')*'")
+NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+LIST_RE = re.compile(r'\bIN \((?:\s*%s\s*,)*\s*%s\s*\)', re.IGNORECASE)
+SPACE_RE = re.compile(r'\s+')
+
+_write_lock = threading.Lock()
+
+
+def fingerprint(sql):
+    """Return the query with its literals and IN lists normalized
+
+    Queries that only differ in their parameters share a fingerprint.
+    """
+    sql = STRING_RE.sub('%s', sql)
+    sql = NUMBER_RE.sub('%s', sql)
+    sql = LIST_RE.sub('IN (...)', sql)
+    return SPACE_RE.sub(' ', sql).strip()
+
+
+def view_label(view_func, method):
+    """Return ShoeViewSet.list style names for a resolved view"""
+    view_class = getattr(view_func, 'cls', None) or \
+        getattr(view_func, 'view_class', None)
+    if view_class is None:
+        return f'{view_func.__module__}.{view_func.__name__}'
+
+    actions = getattr(view_func, 'actions', None) or {}
+    action = actions.get(method.lower(), method.lower())
+    return f'{view_class.__name__}.{action}'
+
+
+def explain(connection, sql, params):
+    """Return the EXPLAIN (ANALYZE, BUFFERS) output of a SELECT
+
+    The statement runs on a separate raw cursor, so it neither goes through
+    the execute wrappers again nor disturbs the original cursor's rows.
+    Inside a transaction it runs in a savepoint, so a failing EXPLAIN does
+    not abort the request's transaction.
+    """
+    savepoint = connection.in_atomic_block
+    with connection.connection.cursor() as cursor:
+        if savepoint:
+            cursor.execute('SAVEPOINT slow_query_explain')
+        try:
+            cursor.execute('EXPLAIN (ANALYZE, BUFFERS) ' + sql, params)
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+        except Exception:
+            if savepoint:
+                cursor.execute('ROLLBACK TO SAVEPOINT slow_query_explain')
+            raise
+        if savepoint:
+            cursor.execute('RELEASE SAVEPOINT slow_query_explain')
+
+    return plan
+
+
+def record(entry):
+    """Append an entry to the slow query log"""
+    line = json.dumps(entry, default=str) + '\n'
+    with _write_lock, open(settings.SLOW_QUERY_LOG, 'a') as log_file:
+        log_file.write(line)
+
+
+def log_slow_queries(execute, sql, params, many, context):
+    """Execute wrapper logging queries slower than SLOW_QUERY_MS"""
+    start = time.perf_counter()
+    result = execute(sql, params, many, context)
+    duration_ms = (time.perf_counter() - start) * 1000
+
+    if duration_ms < settings.SLOW_QUERY_MS:
+        return result
+
+    connection = context['connection']
+    entry = {
+        'at': timezone.now().isoformat(),
+        'view': current_view.get(),
+        'duration_ms': round(duration_ms, 3),
+        'fingerprint': fingerprint(sql),
+        'sql': sql,
+        'plan': None,
+    }
+    if connection.vendor == 'postgresql' and not many and \
+            sql.lstrip()[:6].upper() == 'SELECT' and \
+            random.random() < settings.SLOW_QUERY_EXPLAIN_RATE:
+        try:
+            entry['plan'] = explain(connection, sql, params)
+        except Exception:
+            logger.exception('EXPLAIN of a slow query failed')
+
+    logger.warning('Slow query (%.1fms) in %s: %s', duration_ms,
+                   entry['view'], entry['fingerprint'])
+    try:
+        record(entry)
+    except OSError:
+        logger.exception('Writing the slow query log failed')
+
+    return result
+
+
+def install(connection):
+    """Add the slow query wrapper to a connection if the log is on"""
+    if not settings.SLOW_QUERY_MS or \
+            log_slow_queries in connection.execute_wrappers:
+        return
+
+    os.makedirs(os.path.dirname(settings.SLOW_QUERY_LOG), exist_ok=True)
+    connection.execute_wrappers.append(log_slow_queries)
+
+
+def p95(durations):
+    """Return the nearest-rank 95th percentile of some durations"""
+    ordered = sorted(durations)
+    return ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+
+
+def aggregate(entries):
+    """Group log entries by fingerprint, slowest total time first"""
+    groups = defaultdict(list)
+    for entry in entries:
+        groups[entry['fingerprint']].append(entry)
+
+    summaries = []
+    for query, group in groups.items():
+        durations = [entry['duration_ms'] for entry in group]
+        plans = [entry['plan'] for entry in group if entry.get('plan')]
+        summaries.append({
+            'fingerprint': query,
+            'count': len(group),
+            'total_ms': round(sum(durations), 3),
+            'p95_ms': p95(durations),
+            'max_ms': max(durations),
+            'views': sorted({entry['view'] or '-' for entry in group}),
+            'last_seen': max(entry['at'] for entry in group),
+            'plan': plans[-1] if plans else None,
+        })
+
+    return sorted(summaries, key=lambda summary: -summary['total_ms'])
+
+
+def read_log(path):
+    """Yield the entries of a slow query log, skipping damaged lines"""
+    with open(path) as log_file:
+        for line in log_file:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
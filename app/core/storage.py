@@ -0,0 +1,141 @@
+import hashlib
+import os
+import tempfile
+
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.db import connection
+from django.utils.deconstruct import deconstructible
+
+from core.s3 import S3Storage
+from core.upload_service import signed_upload_url
+
+
+def lock_content(name):
+    """Hold a lock on a stored name until the current transaction ends
+
+    Saving a file and releasing it both take the lock, so a release cannot
+    delete a file between its save and the commit of the shoe using it.
+    Outside a transaction there is no commit to wait for, so no lock.
+    """
+    if connection.vendor != 'postgresql' or not connection.in_atomic_block:
+        return
+
+    digest = hashlib.sha256(name.encode()).digest()
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_advisory_xact_lock(%s)',
+                       [int.from_bytes(digest[:8], 'big', signed=True)])
+
+
+class ContentAddressedMixin:
+    """Name stored files after a hash of their content
+
+    The directory and extension of the requested name are kept, the rest is
+    replaced with the SHA-256 of the bytes, so identical uploads share one
+    file and saving a file that already exists writes nothing.
+    """
+
+    def content_name(self, name, content):
+        """Return the content addressed name for `content`"""
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        digest = digest.hexdigest()
+
+        directory, filename = os.path.split(name)
+        ext = os.path.splitext(filename)[1].lower()
+
+        return os.path.join(directory, digest[:2], digest + ext)
+
+    def get_available_name(self, name, max_length=None):
+        """Names are derived from content, so never rename on collision"""
+        return name
+
+
+@deconstructible
+class OverwriteStorage(FileSystemStorage):
+    """Storage below MEDIA_ROOT that replaces files saved under a taken name
+
+    Files are written beside their target and renamed over it, so readers
+    never see a partial file and concurrent saves of one name leave one
+    whole file.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        return name
+
+    def _save(self, name, content):
+        full_path = self.path(name)
+        directory = os.path.dirname(full_path)
+        if self.directory_permissions_mode is not None:
+            old_umask = os.umask(0)
+            try:
+                os.makedirs(directory, self.directory_permissions_mode,
+                            exist_ok=True)
+            finally:
+                os.umask(old_umask)
+        else:
+            os.makedirs(directory, exist_ok=True)
+
+        if hasattr(content, 'temporary_file_path'):
+            file_move_safe(content.temporary_file_path(), full_path,
+                           allow_overwrite=True)
+        else:
+            with tempfile.NamedTemporaryFile(dir=directory,
+                                             delete=False) as tmp:
+                for chunk in content.chunks():
+                    tmp.write(chunk)
+            os.replace(tmp.name, full_path)
+
+        if self.file_permissions_mode is not None:
+            os.chmod(full_path, self.file_permissions_mode)
+
+        return name
+
+
+@deconstructible
+class ContentAddressedStorage(ContentAddressedMixin, OverwriteStorage):
+    """Content addressed storage below MEDIA_ROOT"""
+
+    def upload_url(self, name, expires):
+        """Return a URL on the upload service for a direct PUT of `name`"""
+        return signed_upload_url(name, expires)
+
+    def move(self, name, new_name):
+        """Rename a file below MEDIA_ROOT"""
+        full_path = self.path(new_name)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        os.replace(self.path(name), full_path)
+
+    def read_start(self, name, length):
+        """Return the first `length` bytes of a file"""
+        with open(self.path(name), 'rb') as f:
+            return f.read(length)
+
+    def _save(self, name, content):
+        name = self.content_name(name, content)
+        lock_content(name)
+        if self.exists(name):
+            #refresh the mtime so gc_media treats the file as in use
+            os.utime(self.path(name))
+            return name
+
+        #a concurrent upload of the same bytes produces the same file, so
+        #either rename may win
+        return super()._save(name, content)
+
+
+@deconstructible
+class ContentAddressedS3Storage(ContentAddressedMixin, S3Storage):
+    """Content addressed storage in an S3-compatible bucket"""
+
+    def _save(self, name, content):
+        name = self.content_name(name, content)
+        lock_content(name)
+        #ask the bucket rather than the metadata cache, which can still
+        #list an object another worker has since deleted
+        if self.client.head_object(name) is not None:
+            return name
+
+        return super()._save(name, content)
+
@@ -0,0 +1,148 @@
+"""Query-count and latency budgets for API tests
+
+Set PERF_REPORT to a file path to get every measurement written there as
+JSON, e.g. for CI to keep as an artifact or compare between runs.
+"""
+import functools
+import json
+import math
+import os
+import time
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+class PerfReport:
+    """Measurements taken during the test run, written out as they come"""
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = []
+
+    def record(self, **entry):
+        self.entries.append(entry)
+        if not self.path:
+            return
+
+        #rewritten every time so an aborted run still leaves a report
+        with open(self.path, 'w') as report_file:
+            json.dump({'measurements': self.entries}, report_file, indent=2)
+
+
+report = PerfReport(os.environ.get('PERF_REPORT'))
+
+
+def describe_test(test):
+    return f'{type(test).__module__}.{type(test).__qualname__}.' \
+           f'{test._testMethodName}'
+
+
+def query_budget(max_queries):
+    """Fail the decorated test if it runs more than `max_queries` queries"""
+    def decorator(test_method):
+        @functools.wraps(test_method)
+        def wrapper(self, *args, **kwargs):
+            with CaptureQueriesContext(connection) as queries:
+                result = test_method(self, *args, **kwargs)
+
+            report.record(test=describe_test(self), queries=len(queries),
+                          max_queries=max_queries,
+                          passed=len(queries) <= max_queries)
+            self.assertLessEqual(
+                len(queries), max_queries,
+                'Query budget exceeded:\n' + '\n'.join(
+                    query['sql'] for query in queries.captured_queries
+                )
+            )
+            return result
+        return wrapper
+    return decorator
+
+
+def volumes(small, large):
+    """Set the row counts assertScalesFlat() seeds for the decorated test"""
+    def decorator(test_method):
+        test_method.perf_volumes = (small, large)
+        return test_method
+    return decorator
+
+
+class ScalingTestMixin:
+    """Check that endpoints do not do more work per row than they should
+
+    An endpoint is requested with a small and a large number of rows
+    seeded. Its query count must not change between the two, and its time
+    may grow at most as (rows ratio) ** max_time_exponent, which tolerates
+    the linear cost of serializing a list but not an N+1 or worse.
+    """
+    perf_volumes = (10, 200)
+    max_time_exponent = 1.25
+    perf_repeat = 5
+
+    def measure(self, path, **params):
+        """Return (response, queries, seconds) for GET requests to `path`
+
+        The time is the fastest of perf_repeat requests, which is the least
+        disturbed by whatever else the machine is doing.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(path, params)
+        #read now, the next request resets the connection's query log
+        query_count = len(queries)
+
+        timings = []
+        for _ in range(self.perf_repeat):
+            start = time.perf_counter()
+            self.client.get(path, params)
+            timings.append(time.perf_counter() - start)
+
+        return res, query_count, min(timings)
+
+    def assertScalesFlat(self, path, seed, max_queries=None, **params):
+        """Assert a GET endpoint's cost is independent of the rows it returns
+
+        `seed(count)` must bring the data the endpoint serves up to `count`
+        rows.
+        """
+        method = getattr(self, self._testMethodName)
+        small, large = getattr(method, 'perf_volumes', self.perf_volumes)
+
+        seed(small)
+        small_res, small_queries, small_seconds = self.measure(path, **params)
+        seed(large)
+        res, queries, seconds = self.measure(path, **params)
+
+        self.assertEqual(small_res.status_code, 200)
+        self.assertEqual(res.status_code, 200)
+
+        exponent = math.log(max(seconds / small_seconds, 1.0)) / \
+            math.log(large / small)
+        report.record(
+            test=describe_test(self), path=path, params=params,
+            volumes=[small, large],
+            queries=[small_queries, queries], max_queries=max_queries,
+            seconds=[round(small_seconds, 6), round(seconds, 6)],
+            time_exponent=round(exponent, 3),
+            max_time_exponent=self.max_time_exponent,
+            passed=(
+                queries == small_queries and
+                (max_queries is None or queries <= max_queries) and
+                exponent <= self.max_time_exponent
+            )
+        )
+
+        self.assertEqual(
+            queries, small_queries,
+            f'{path} ran {small_queries} queries for {small} rows but '
+            f'{queries} for {large}'
+        )
+        if max_queries is not None:
+            self.assertLessEqual(queries, max_queries)
+        self.assertLessEqual(
+            exponent, self.max_time_exponent,
+            f'{path} took {small_seconds * 1000:.1f}ms for {small} rows and '
+            f'{seconds * 1000:.1f}ms for {large}'
+        )
+
+        return res
@@ -0,0 +1,188 @@
+import hashlib
+import hmac
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+from email.utils import format_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, unquote, urlsplit
+from xml.etree import ElementTree
+
+from core.s3 import UNSIGNED_PAYLOAD, canonical_request, signature
+
+ERROR_XML = (
+    '<?xml version="1.0"?>'
+    '<Error><Code>{}</Code><Message>{}</Message></Error>'
+)
+
+
+class S3StandIn:
+    """In-memory S3-compatible server for tests
+
+    Implements the object calls S3Storage makes, including copies and
+    ranged reads, checks SigV4 header and presigned signatures, and records
+    every request in `requests`.
+    """
+
+    def __init__(self, access_key='test-key', secret_key='test-secret',
+                 region='us-east-1'):
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+        self.objects = {}
+        self.uploads = {}
+        self.requests = []
+        handler = type('Handler', (S3RequestHandler,), {'standin': self})
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       daemon=True)
+
+    @property
+    def endpoint_url(self):
+        return 'http://%s:%d' % self.server.server_address
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class S3RequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    standin = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def send(self, status, body=b'', headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if self.command != 'HEAD' or 'Content-Length' not in (headers or {}):
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def error(self, status, code, message=''):
+        self.send(status, ERROR_XML.format(code, message).encode())
+
+    def authorized(self, body):
+        """Check the request's SigV4 signature"""
+        path, _, query = self.path.partition('?')
+        params = dict(parse_qsl(query, keep_blank_values=True))
+        headers = {name.lower(): value for name, value in self.headers.items()}
+        given = params.pop('X-Amz-Signature', None)
+
+        if given is not None:
+            date = params['X-Amz-Date']
+            issued = datetime.strptime(date, '%Y%m%dT%H%M%SZ') \
+                             .replace(tzinfo=dt_timezone.utc)
+            expires = issued + timedelta(seconds=int(params['X-Amz-Expires']))
+            if expires < datetime.now(dt_timezone.utc):
+                return False
+            signed_headers = params['X-Amz-SignedHeaders'].split(';')
+            payload_hash = UNSIGNED_PAYLOAD
+        else:
+            authorization = headers.get('authorization', '')
+            fields = dict(
+                item.strip().split('=', 1)
+                for item in authorization.partition(' ')[2].split(',')
+                if '=' in item
+            )
+            given = fields.get('Signature')
+            signed_headers = fields.get('SignedHeaders', '').split(';')
+            date = headers.get('x-amz-date', '')
+            payload_hash = headers.get('x-amz-content-sha256', '')
+            if payload_hash != UNSIGNED_PAYLOAD and \
+                    payload_hash != hashlib.sha256(body).hexdigest():
+                return False
+
+        request = canonical_request(self.command, path, params, headers,
+                                    signed_headers, payload_hash)
+        expected = signature(self.standin.secret_key, self.standin.region,
+                             date, request)
+        return given is not None and hmac.compare_digest(given, expected)
+
+    def handle_request(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        path, _, query = self.path.partition('?')
+        params = dict(parse_qsl(query, keep_blank_values=True))
+        self.standin.requests.append((self.command, unquote(path), params))
+
+        if not self.authorized(body):
+            return self.error(403, 'SignatureDoesNotMatch')
+
+        _, bucket, key = unquote(urlsplit(path).path).split('/', 2)
+        objects = self.standin.objects
+        uploads = self.standin.uploads
+
+        if self.command == 'POST' and 'uploads' in params:
+            upload_id = uuid.uuid4().hex
+            uploads[upload_id] = {}
+            return self.send(200, (
+                '<InitiateMultipartUploadResult><UploadId>{}</UploadId>'
+                '</InitiateMultipartUploadResult>'
+            ).format(upload_id).encode())
+
+        if 'uploadId' in params:
+            parts = uploads.get(params['uploadId'])
+            if parts is None:
+                return self.error(404, 'NoSuchUpload')
+            if self.command == 'PUT':
+                parts[int(params['partNumber'])] = body
+                etag = '"%s"' % hashlib.md5(body).hexdigest()
+                return self.send(200, headers={'ETag': etag})
+            if self.command == 'DELETE':
+                del uploads[params['uploadId']]
+                return self.send(204)
+            numbers = [
+                int(element.text) for element in
+                ElementTree.fromstring(body).iter('PartNumber')
+            ]
+            data = b''.join(parts[number] for number in numbers)
+            del uploads[params['uploadId']]
+            objects[key] = (data, datetime.now(dt_timezone.utc))
+            return self.send(200, (
+                '<CompleteMultipartUploadResult><ETag>"{}"</ETag>'
+                '</CompleteMultipartUploadResult>'
+            ).format(hashlib.md5(data).hexdigest()).encode())
+
+        if self.command == 'PUT' and 'x-amz-copy-source' in self.headers:
+            source = unquote(self.headers['x-amz-copy-source']).split('/', 2)[2]
+            if source not in objects:
+                return self.error(404, 'NoSuchKey')
+            body = objects[source][0]
+            objects[key] = (body, datetime.now(dt_timezone.utc))
+            return self.send(200, (
+                '<CopyObjectResult><ETag>"{}"</ETag></CopyObjectResult>'
+            ).format(hashlib.md5(body).hexdigest()).encode())
+
+        if self.command == 'PUT':
+            objects[key] = (body, datetime.now(dt_timezone.utc))
+            etag = '"%s"' % hashlib.md5(body).hexdigest()
+            return self.send(200, headers={'ETag': etag})
+
+        if self.command == 'DELETE':
+            objects.pop(key, None)
+            return self.send(204)
+
+        if key not in objects:
+            return self.error(404, 'NoSuchKey')
+
+        data, modified = objects[key]
+        headers = {
+            'ETag': '"%s"' % hashlib.md5(data).hexdigest(),
+            'Last-Modified': format_datetime(modified, usegmt=True),
+        }
+        if self.command == 'HEAD':
+            headers['Content-Length'] = str(len(data))
+        elif 'range' in self.headers:
+            start, _, end = self.headers['range'][len('bytes='):].partition('-')
+            return self.send(206, data[int(start):int(end) + 1], headers)
+        return self.send(200, data, headers)
+
+    do_GET = do_HEAD = do_PUT = do_POST = do_DELETE = handle_request
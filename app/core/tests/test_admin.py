@@ -1,6 +1,10 @@
-from django.test import TestCase, Client
+import importlib
+
+from django.test import SimpleTestCase, TestCase, Client, modify_settings
 from django.contrib.auth import get_user_model
-from django.urls import reverse
+from django.urls import clear_url_caches, reverse
+
+from app import urls
 
 class AdminSiteTest(TestCase):
 
@@ -38,4 +42,23 @@ class AdminSiteTest(TestCase):
         url = reverse('admin:core_user_add')
         res = self.client.get(url) 
 
-        self.assertEqual(res.status_code, 200)
\ No newline at end of file
+        self.assertEqual(res.status_code, 200)
+
+
+class AdminMountTest(SimpleTestCase):
+
+    def tearDown(self):
+        importlib.reload(urls)
+        clear_url_caches()
+
+    def test_admin_not_mounted_when_not_installed(self):
+        """Test API-only nodes don't route /admin/"""
+        with modify_settings(INSTALLED_APPS={
+            'remove': ['django.contrib.admin'],
+        }):
+            importlib.reload(urls)
+
+        routes = [str(pattern.pattern) for pattern in urls.urlpatterns]
+        self.assertNotIn('admin/', routes)
+        self.assertIn('api/shoes/', routes)
+
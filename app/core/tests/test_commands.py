@@ -1,23 +1,216 @@
-from unittest.mock import patch
+import os
+import shutil
+import tempfile
+import time
+from io import StringIO
+from unittest.mock import patch, MagicMock
 from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.db.utils import OperationalError
-from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+
+from core.models import Tag, Shoes, BrandSummary
+from core.profiling import profile_label
+from core.renditions import rendition_name
 
 class CommandTest(TestCase):
     def test_wait_for_db_ready(self):
         """test waiting for db when db is available"""
         with patch('django.db.utils.ConnectionHandler.__getitem__') as gi:
-            gi.return_value = True
-            call_command('wait_for_db')
+            call_command('wait_for_db', stdout=StringIO())
             self.assertEqual(gi.call_count, 1)
+            gi.return_value.cursor.return_value.__enter__.return_value \
+                .execute.assert_called_once_with('SELECT 1')
+
+    def test_wait_for_db_with_system_checks(self):
+        """Test the command runs with system checks, as manage.py does"""
+        out = StringIO()
+
+        call_command('wait_for_db', skip_checks=False, stdout=out)
+
+        self.assertIn('database available', out.getvalue())
 
     @patch('time.sleep', return_value=True)
     def test_wait_for_db(self, ts):
         """Test waiting for db"""
         with patch('django.db.utils.ConnectionHandler.__getitem__') as gi:
-            gi.side_effect = [OperationalError] * 5 + [True]
-            call_command('wait_for_db')
+            gi.return_value.cursor.side_effect = \
+                [OperationalError] * 5 + [MagicMock()]
+            call_command('wait_for_db', stdout=StringIO())
             self.assertEqual(gi.call_count, 6)
+            self.assertEqual(gi.return_value.close.call_count, 5)
+            self.assertEqual(ts.call_count, 5)
+
+    @patch('random.uniform', side_effect=lambda low, high: high)
+    @patch('time.sleep', return_value=True)
+    def test_wait_for_db_backoff(self, ts, uniform):
+        """Test retries back off exponentially up to the maximum delay"""
+        with patch('django.db.utils.ConnectionHandler.__getitem__') as gi:
+            gi.return_value.cursor.side_effect = \
+                [OperationalError] * 5 + [MagicMock()]
+            call_command('wait_for_db', initial_delay=1, max_delay=5,
+                         stdout=StringIO())
+
+        delays = [call[0][0] for call in ts.call_args_list]
+        self.assertEqual(delays, [1, 2, 4, 5, 5])
+
+    @patch('time.sleep', return_value=True)
+    def test_wait_for_db_timeout(self, ts):
+        """Test giving up once the timeout is exceeded"""
+        with patch('django.db.utils.ConnectionHandler.__getitem__') as gi:
+            gi.return_value.cursor.side_effect = OperationalError
+            with self.assertRaises(CommandError):
+                call_command('wait_for_db', timeout=0, stdout=StringIO())
+
+    @patch('time.sleep', return_value=True)
+    def test_wait_for_db_pending_migrations(self, ts):
+        """Test waiting until pending migrations have been applied"""
+        path = 'core.management.commands.wait_for_db.MigrationExecutor'
+        with patch(path) as executor:
+            executor.return_value.migration_plan.side_effect = \
+                [['0009_pending'], []]
+            call_command('wait_for_db', check_migrations=True,
+                         stdout=StringIO())
+
+        self.assertEqual(ts.call_count, 1)
+
+    def test_sync_shoe_counts(self):
+        """Test rebuilding denormalized shoe counts"""
+        user = get_user_model().objects.create_user(
+            'test@testdomain.com',
+            'testpass'
+        )
+        tag = Tag.objects.create(user=user, name='runners', shoe_count=5)
+        shoe = Shoes.objects.create(
+            user=user,
+            title='Pegasus',
+            brand='Nike',
+            price=120
+        )
+        shoe.tags.add(tag)
+
+        call_command('sync_shoe_counts')
+
+        tag.refresh_from_db()
+        self.assertEqual(tag.shoe_count, 1)
+
+    def test_rebuild_brand_summaries(self):
+        """Test brand summaries are recomputed from the shoes table"""
+        user = get_user_model().objects.create_user(
+            'test@testdomain.com',
+            'testpass'
+        )
+        Shoes.objects.bulk_create([
+            Shoes(user=user, title='Pegasus', brand='Nike', price=120),
+            Shoes(user=user, title='Vomero', brand='Nike', price=150),
+        ])
+        BrandSummary.objects.create(user=user, brand='Gone', shoe_count=3)
+
+        call_command('rebuild_brand_summaries', stdout=StringIO())
+
+        summary = BrandSummary.objects.get(user=user)
+        self.assertEqual(summary.brand, 'Nike')
+        self.assertEqual(summary.shoe_count, 2)
+        self.assertEqual(summary.total_price, 270)
+
+    def test_profiling_token(self):
+        """Test the printed token is accepted by the profiler"""
+        out = StringIO()
+
+        call_command('profiling_token', 'slow-list', stdout=out)
+
+        self.assertEqual(
+            profile_label(out.getvalue().strip(), max_age=60),
+            'slow-list'
+        )
+
+class GcMediaCommandTests(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        user = get_user_model().objects.create_user(
+            'test@testdomain.com',
+            'testpass'
+        )
+        Shoes.objects.create(
+            user=user,
+            title='Pegasus',
+            brand='Nike',
+            price=120,
+            image='uploads/shoe/ab/kept.jpg'
+        )
+
+    def create_file(self, name, age=0):
+        """Create a media file last modified `age` seconds ago"""
+        path = os.path.join(self.media_root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(b'x' * 10)
+
+        mtime = time.time() - age
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def test_gc_media_deletes_old_orphans(self):
+        """Test only old unreferenced files are deleted"""
+        kept = self.create_file('uploads/shoe/ab/kept.jpg', age=10 ** 6)
+        orphan = self.create_file('uploads/shoe/cd/orphan.jpg', age=10 ** 6)
+        recent = self.create_file('uploads/shoe/cd/recent.jpg')
+
+        out = StringIO()
+        call_command('gc_media', batch_size=1, stdout=out)
+
+        self.assertTrue(os.path.exists(kept))
+        self.assertFalse(os.path.exists(orphan))
+        self.assertTrue(os.path.exists(recent))
+        self.assertIn('deleted 1 (10 bytes)', out.getvalue())
+
+    def test_gc_media_checks_references_per_batch(self):
+        """Test references are looked up for each scanned batch"""
+        self.create_file('uploads/shoe/ab/kept.jpg', age=10 ** 6)
+        self.create_file('uploads/shoe/cd/orphan.jpg', age=10 ** 6)
+        self.create_file('uploads/shoe/cd/recent.jpg')
+
+        out = StringIO()
+        with self.assertNumQueries(6):
+            #a lookup per batch, then a savepoint, the content lock and the
+            #re-check around deleting the one old orphan
+            call_command('gc_media', batch_size=2, stdout=out)
+
+        self.assertIn('scanned 3 files: 1 referenced, 1 within grace period',
+                      out.getvalue())
+
+    def test_gc_media_deletes_renditions(self):
+        """Test the renditions of a deleted orphan are deleted with it"""
+        self.create_file('uploads/shoe/cd/orphan.jpg', age=10 ** 6)
+        orphan_rendition = self.create_file(
+            rendition_name('uploads/shoe/cd/orphan.jpg', 320)
+        )
+        kept_rendition = self.create_file(
+            rendition_name('uploads/shoe/ab/kept.jpg', 320)
+        )
+
+        call_command('gc_media', stdout=StringIO())
+
+        self.assertFalse(os.path.exists(orphan_rendition))
+        self.assertTrue(os.path.exists(kept_rendition))
+
+    def test_gc_media_dry_run(self):
+        """Test a dry run deletes nothing"""
+        orphan = self.create_file('uploads/shoe/cd/orphan.jpg', age=10 ** 6)
+        rendition = self.create_file(
+            rendition_name('uploads/shoe/cd/orphan.jpg', 320)
+        )
 
-            
+        out = StringIO()
+        call_command('gc_media', dry_run=True, stdout=out)
 
+        self.assertTrue(os.path.exists(orphan))
+        self.assertTrue(os.path.exists(rendition))
+        self.assertIn('would delete 1 (10 bytes)', out.getvalue())
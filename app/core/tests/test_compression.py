@@ -0,0 +1,132 @@
+import gzip
+import json
+import zlib
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core import middleware
+from core.models import Tag
+
+TAGS_URL = reverse('shoes:tag-list')
+
+def compressed(response, accept='gzip, deflate'):
+    """Run a response through the compression middleware"""
+    request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING=accept)
+    return middleware.CompressionMiddleware(lambda r: response)(request)
+
+def json_response(size=2048, **kwargs):
+    return HttpResponse(
+        json.dumps(['x' * size]),
+        content_type='application/json',
+        **kwargs
+    )
+
+class CompressionMiddlewareTests(TestCase):
+
+    def setUp(self):
+        middleware.compressed_bodies.clear()
+
+    def test_accepted_encodings(self):
+        """Test q=0 entries are not treated as accepted"""
+        self.assertEqual(
+            middleware.accepted_encodings('gzip;q=0, br;q=0.5, identity'),
+            {'br', 'identity'}
+        )
+
+    def test_large_json_gzipped(self):
+        """Test bodies above the threshold are gzipped"""
+        response = compressed(json_response())
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(int(response['Content-Length']),
+                         len(response.content))
+        self.assertEqual(json.loads(gzip.decompress(response.content)),
+                         ['x' * 2048])
+
+    def test_small_body_untouched(self):
+        """Test bodies below the threshold are sent uncompressed"""
+        with self.settings(COMPRESSION_MIN_SIZE=4096):
+            response = compressed(json_response())
+
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+    def test_not_accepted(self):
+        """Test clients without gzip support get the plain body"""
+        response = compressed(json_response(), accept='gzip;q=0')
+
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_binary_types_skipped(self):
+        """Test image responses are left alone"""
+        response = compressed(
+            HttpResponse(b'\0' * 4096, content_type='image/jpeg')
+        )
+
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertFalse(response.has_header('Vary'))
+
+    def test_strong_etag_weakened(self):
+        """Test a strong ETag becomes weak once the body is compressed"""
+        response = json_response()
+        response['ETag'] = '"abc"'
+
+        self.assertEqual(compressed(response)['ETag'], 'W/"abc"')
+
+    def test_compressed_body_cached(self):
+        """Test identical bodies are compressed only once"""
+        with patch('core.middleware.compress',
+                   wraps=middleware.compress) as compress:
+            first = compressed(json_response())
+            second = compressed(json_response())
+
+        self.assertEqual(compress.call_count, 1)
+        self.assertEqual(first.content, second.content)
+
+    def test_streaming_compressed_per_chunk(self):
+        """Test streaming responses are compressed chunk by chunk"""
+        chunks = [b'[', b'"a",' * 100, b'"b"]']
+        response = compressed(StreamingHttpResponse(
+            iter(chunks),
+            content_type='application/json'
+        ))
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertFalse(response.has_header('Content-Length'))
+        body = b''.join(response.streaming_content)
+        self.assertEqual(zlib.decompress(body, 16 + zlib.MAX_WBITS),
+                         b''.join(chunks))
+
+    def test_brotli_preferred_when_installed(self):
+        """Test br wins over gzip only when brotli is importable"""
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip, br')
+        compression = middleware.CompressionMiddleware(None)
+
+        with patch('core.middleware.brotli', None):
+            self.assertEqual(compression._negotiate(request), 'gzip')
+        with patch('core.middleware.brotli', object()):
+            self.assertEqual(compression._negotiate(request), 'br')
+
+    def test_api_response_compressed(self):
+        """Test list endpoints are compressed end to end"""
+        user = get_user_model().objects.create_user(
+            'test@test.com',
+            'testpass'
+        )
+        Tag.objects.bulk_create(
+            Tag(user=user, name='tag %d' % i) for i in range(100)
+        )
+        client = APIClient()
+        client.force_authenticate(user)
+
+        res = client.get(TAGS_URL, HTTP_ACCEPT_ENCODING='gzip')
+
+        self.assertEqual(res['Content-Encoding'], 'gzip')
+        self.assertEqual(len(json.loads(gzip.decompress(res.content))), 100)
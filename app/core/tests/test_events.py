@@ -0,0 +1,125 @@
+import asyncio
+import threading
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+
+from core.events import Broker, RESYNC_EVENT, broker
+from core.models import Shoes, Tag
+
+def run(coroutine):
+    """Run a coroutine on a fresh event loop"""
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+async def drain(subscription):
+    """Let queued callbacks run and return everything received"""
+    await asyncio.sleep(0)
+    events = []
+    while not subscription.queue.empty():
+        events.append(await subscription.get())
+    return events
+
+@override_settings(EVENTS_QUEUE_SIZE=3)
+class BrokerTests(SimpleTestCase):
+
+    def test_publish_to_user_subscriptions(self):
+        """Test events reach every subscription of the user only"""
+        test_broker = Broker()
+
+        async def scenario():
+            first = test_broker.subscribe(1)
+            second = test_broker.subscribe(1)
+            other = test_broker.subscribe(2)
+            test_broker.publish(1, {'type': 'shoe.created', 'id': 5})
+            return [await drain(sub) for sub in (first, second, other)]
+
+        first, second, other = run(scenario())
+
+        self.assertEqual(first, [{'type': 'shoe.created', 'id': 5}])
+        self.assertEqual(second, first)
+        self.assertEqual(other, [])
+
+    def test_publish_from_other_thread(self):
+        """Test publishing from a worker thread wakes the subscriber"""
+        test_broker = Broker()
+
+        async def scenario():
+            subscription = test_broker.subscribe(1)
+            thread = threading.Thread(
+                target=test_broker.publish,
+                args=(1, {'type': 'tag.deleted', 'id': 2})
+            )
+            thread.start()
+            event = await asyncio.wait_for(subscription.get(), 1)
+            thread.join()
+            return event
+
+        self.assertEqual(run(scenario()), {'type': 'tag.deleted', 'id': 2})
+
+    def test_overflow_replaced_by_resync(self):
+        """Test a full queue is replaced by a single resync event"""
+        test_broker = Broker()
+
+        async def scenario():
+            subscription = test_broker.subscribe(1)
+            for i in range(10):
+                test_broker.publish(1, {'type': 'shoe.updated', 'id': i})
+            events = await drain(subscription)
+            test_broker.publish(1, {'type': 'shoe.updated', 'id': 11})
+            return events + await drain(subscription)
+
+        self.assertEqual(run(scenario()), [
+            RESYNC_EVENT,
+            {'type': 'shoe.updated', 'id': 11},
+        ])
+
+    def test_unsubscribe(self):
+        """Test unsubscribing the last subscription forgets the user"""
+        test_broker = Broker()
+
+        async def scenario():
+            subscription = test_broker.subscribe(1)
+            test_broker.unsubscribe(subscription)
+
+        run(scenario())
+        self.assertFalse(test_broker.has_subscribers(1))
+
+class ChangeEventSignalTests(TransactionTestCase):
+
+    def test_changes_published(self):
+        """Test saves, deletes and relation changes publish events"""
+        user = get_user_model().objects.create_user(
+            'test@testdomain.com',
+            'testpass'
+        )
+
+        async def subscribe():
+            return broker.subscribe(user.pk)
+
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        subscription = loop.run_until_complete(subscribe())
+        self.addCleanup(broker.unsubscribe, subscription)
+
+        shoe = Shoes.objects.create(
+            user=user,
+            title='Pegasus',
+            brand='Nike',
+            price=120
+        )
+        tag = Tag.objects.create(user=user, name='runners')
+        tag_id = tag.pk
+        shoe.tags.add(tag)
+        tag.delete()
+        events = loop.run_until_complete(drain(subscription))
+
+        self.assertEqual(events, [
+            {'type': 'shoe.created', 'id': shoe.pk},
+            {'type': 'tag.created', 'id': tag_id},
+            {'type': 'shoe.updated', 'id': shoe.pk},
+            {'type': 'tag.deleted', 'id': tag_id},
+        ])
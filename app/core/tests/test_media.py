@@ -0,0 +1,135 @@
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Shoes
+
+IMAGE_NAME = 'uploads/shoe/test-uuid.jpg'
+IMAGE_BYTES = bytes(range(256)) * 4
+
+class MediaViewTests(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        os.makedirs(os.path.join(self.media_root, 'uploads/shoe'))
+        with open(os.path.join(self.media_root, IMAGE_NAME), 'wb') as f:
+            f.write(IMAGE_BYTES)
+
+        self.user = get_user_model().objects.create_user(
+            'test@testdomain.com',
+            'testpass'
+        )
+        Shoes.objects.create(
+            user=self.user,
+            title='Pegasus',
+            brand='Nike',
+            price=120,
+            image=IMAGE_NAME
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse('media', args=[IMAGE_NAME])
+
+    def test_serve_image(self):
+        """Test the owner gets the file with long lived cache headers"""
+        res = self.client.get(self.url)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join(res.streaming_content), IMAGE_BYTES)
+        self.assertEqual(res['Content-Type'], 'image/jpeg')
+        self.assertEqual(res['Content-Length'], str(len(IMAGE_BYTES)))
+        self.assertIn('immutable', res['Cache-Control'])
+        self.assertTrue(res['ETag'].startswith('"'))
+
+    def test_login_required(self):
+        """Test anonymous requests are rejected"""
+        res = APIClient().get(self.url)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_other_users_image_not_found(self):
+        """Test users cannot fetch images of other users' shoes"""
+        user2 = get_user_model().objects.create_user(
+            'other@testdomain.com',
+            'testpass'
+        )
+        self.client.force_authenticate(user2)
+
+        res = self.client.get(self.url)
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_not_modified(self):
+        """Test a matching If-None-Match gets an empty 304"""
+        etag = self.client.get(self.url)['ETag']
+
+        res = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_byte_range(self):
+        """Test serving a byte range"""
+        res = self.client.get(self.url, HTTP_RANGE='bytes=10-19')
+
+        self.assertEqual(res.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(b''.join(res.streaming_content), IMAGE_BYTES[10:20])
+        self.assertEqual(res['Content-Range'], 'bytes 10-19/1024')
+        self.assertEqual(res['Content-Length'], '10')
+
+    def test_suffix_byte_range(self):
+        """Test serving the last bytes of a file"""
+        res = self.client.get(self.url, HTTP_RANGE='bytes=-4')
+
+        self.assertEqual(res.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(b''.join(res.streaming_content), IMAGE_BYTES[-4:])
+
+    def test_unsatisfiable_range(self):
+        """Test a range past the end of the file is rejected"""
+        res = self.client.get(self.url, HTTP_RANGE='bytes=5000-')
+
+        self.assertEqual(
+            res.status_code,
+            status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE
+        )
+        self.assertEqual(res['Content-Range'], 'bytes */1024')
+
+    def test_stale_if_range_sends_whole_file(self):
+        """Test a range is ignored when If-Range does not match"""
+        res = self.client.get(
+            self.url,
+            HTTP_RANGE='bytes=0-9',
+            HTTP_IF_RANGE='"stale"'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    @override_settings(MEDIA_SERVE_MODE='x-accel-redirect')
+    def test_x_accel_redirect(self):
+        """Test handing the transfer off to nginx"""
+        res = self.client.get(self.url)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['X-Accel-Redirect'], f'/protected-media/{IMAGE_NAME}')
+        self.assertEqual(res.content, b'')
+
+    @override_settings(MEDIA_SERVE_MODE='x-sendfile')
+    def test_x_sendfile(self):
+        """Test handing the transfer off with X-Sendfile"""
+        res = self.client.get(self.url)
+
+        self.assertEqual(
+            res['X-Sendfile'],
+            os.path.join(self.media_root, IMAGE_NAME)
+        )
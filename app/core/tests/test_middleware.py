@@ -0,0 +1,44 @@
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase
+from django.urls import reverse
+
+TAGS_URL = reverse('shoes:tag-list')
+ADMIN_LOGIN_URL = reverse('admin:login')
+
+class ApiExemptMiddlewareTests(TestCase):
+
+    def setUp(self):
+        self.client = Client(enforce_csrf_checks=True)
+
+    def test_api_skips_browser_middleware(self):
+        """Test API responses carry no session, CSRF or frame headers"""
+        user = get_user_model().objects.create_user(
+            'test@test.com',
+            'testpass'
+        )
+        self.client.force_login(user)
+
+        res = self.client.get(TAGS_URL)
+
+        self.assertEqual(res.status_code, 401)
+        self.assertFalse(res.has_header('X-Frame-Options'))
+        self.assertNotIn('Cookie', res.get('Vary', ''))
+        self.assertFalse(hasattr(res.wsgi_request, 'session'))
+
+    def test_admin_keeps_browser_middleware(self):
+        """Test the admin still gets sessions, CSRF and frame options"""
+        res = self.client.get(ADMIN_LOGIN_URL)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res['X-Frame-Options'], 'DENY')
+        self.assertIn('csrftoken', res.cookies)
+        self.assertTrue(hasattr(res.wsgi_request, 'session'))
+
+    def test_admin_post_requires_csrf(self):
+        """Test CSRF is still enforced on the admin"""
+        res = self.client.post(ADMIN_LOGIN_URL, {
+            'username': 'test@test.com',
+            'password': 'testpass',
+        })
+
+        self.assertEqual(res.status_code, 403)
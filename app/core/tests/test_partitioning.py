@@ -0,0 +1,108 @@
+import re
+from io import StringIO
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase
+
+from core import partitioning
+from core.models import Shoes, Tag
+
+
+def set_constraints_immediate():
+    """Check deferred foreign keys now, as tables can't be altered before"""
+    with connection.cursor() as cursor:
+        cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+
+def partitioned_tables():
+    with connection.cursor() as cursor:
+        return [table for table, _ in partitioning.PARTITIONED_TABLES
+                if partitioning.is_partitioned(cursor, table)]
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Partitioning is PostgreSQL')
+class PartitioningTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@testdomain.com',
+            'testpass'
+        )
+        self.other_user = get_user_model().objects.create_user(
+            'other@testdomain.com',
+            'testpass'
+        )
+        self.tag = Tag.objects.create(user=self.user, name='Running')
+        for number in range(10):
+            user = self.user if number % 2 else self.other_user
+            shoe = Shoes.objects.create(user=user, title=f'Shoe {number}',
+                                        brand='Nike', price=100)
+            if user == self.user:
+                shoe.tags.add(self.tag)
+        set_constraints_immediate()
+        #SHOES_PARTITIONS may have partitioned the test database already
+        partitioning.unpartition_tables(connection)
+
+    def test_partition_keeps_data(self):
+        """Test partitioning keeps every row and the models working"""
+        partitioning.partition_tables(connection, 4)
+
+        self.assertEqual(partitioned_tables(), [
+            table for table, _ in partitioning.PARTITIONED_TABLES
+        ])
+        self.assertEqual(Shoes.objects.count(), 10)
+        shoes = Shoes.objects.filter(user=self.user, tags=self.tag)
+        self.assertEqual(shoes.count(), 5)
+        last_id = Shoes.objects.order_by('-id').first().id
+
+        shoe = Shoes.objects.create(user=self.user, title='New',
+                                    brand='Asics', price=90)
+        shoe.tags.add(self.tag)
+        self.assertGreater(shoe.id, last_id)
+        self.assertEqual(list(shoe.tags.all()), [self.tag])
+
+        shoes.first().delete()
+        self.assertEqual(self.tag.shoes_set.count(), 5)
+        self.assertEqual(Shoes.tags.through.objects.count(), 5)
+
+    def test_user_queries_read_one_partition(self):
+        """Test per-user queries are pruned to the user's partition"""
+        partitioning.partition_tables(connection, 4)
+
+        plan = Shoes.objects.filter(user=self.user).explain()
+
+        self.assertEqual(len(set(re.findall(r'core_shoes_p\d+', plan))), 1)
+
+    def test_unpartition_restores_plain_tables(self):
+        """Test undoing partitioning restores keys and foreign keys"""
+        partitioning.partition_tables(connection, 4)
+        set_constraints_immediate()
+
+        partitioning.unpartition_tables(connection)
+
+        self.assertEqual(partitioned_tables(), [])
+        self.assertEqual(Shoes.objects.count(), 10)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT count(*) FROM pg_constraint WHERE contype = 'f' "
+                "AND confrelid = 'core_shoes'::regclass"
+            )
+            self.assertEqual(cursor.fetchone()[0], 2)
+            cursor.execute(
+                "SELECT pg_get_constraintdef(oid) FROM pg_constraint "
+                "WHERE contype = 'p' AND conrelid = 'core_shoes'::regclass"
+            )
+            self.assertEqual(cursor.fetchone()[0], 'PRIMARY KEY (id)')
+
+    def test_command(self):
+        """Test the command partitions the tables and refuses 1 partition"""
+        with self.assertRaises(CommandError):
+            call_command('partition_shoes', partitions=1, stdout=StringIO())
+
+        call_command('partition_shoes', partitions=2, stdout=StringIO())
+
+        self.assertEqual(len(partitioned_tables()), 3)
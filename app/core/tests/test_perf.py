@@ -0,0 +1,65 @@
+import json
+import os
+import tempfile
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core.models import Tag
+from core.tests import perf
+from shoes.tests.test_performance import seed_shoes
+from shoes.views import ShoeViewSet
+
+SHOES_URL = reverse('shoes:shoes-list')
+
+class PerfHelperTests(perf.ScalingTestMixin, TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'user@testdomain.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+
+    def seed(self, count):
+        seed_shoes(self.user, count)
+
+    @perf.volumes(2, 10)
+    def test_n_plus_one_detected(self):
+        """Test a list that queries per row fails the scaling check"""
+        with patch.object(ShoeViewSet, '_select_output', lambda self, qs: qs):
+            with self.assertRaisesRegex(AssertionError,
+                                        'queries for 2 rows but'):
+                self.assertScalesFlat(SHOES_URL, self.seed)
+
+    def test_query_budget_exceeded(self):
+        """Test the decorator fails a test running too many queries"""
+        check = perf.query_budget(1)(
+            lambda test: [Tag.objects.count() for _ in range(2)]
+        )
+
+        with self.assertRaisesRegex(AssertionError, 'Query budget exceeded'):
+            check(self)
+
+    def test_report_written(self):
+        """Test every measurement is written to the report file"""
+        fd, path = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+
+        with patch.object(perf, 'report', perf.PerfReport(path)):
+            perf.query_budget(1)(lambda test: Tag.objects.count())(self)
+
+        with open(path) as report_file:
+            measurements = json.load(report_file)['measurements']
+        self.assertEqual(len(measurements), 1)
+        self.assertEqual(measurements[0]['queries'], 1)
+        self.assertTrue(measurements[0]['passed'])
+        self.assertTrue(measurements[0]['test'].endswith(
+            'PerfHelperTests.test_report_written'
+        ))
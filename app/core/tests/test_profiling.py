@@ -0,0 +1,138 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import MiddlewareNotUsed
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core import profiling
+from core.middleware import ProfilingMiddleware
+
+TAGS_URL = reverse('shoes:tag-list')
+
+
+def busy_wait(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+class StackSamplerTests(TestCase):
+
+    def test_samples_running_thread(self):
+        """Test samples are collapsed stacks of the sampled thread"""
+        sampler = profiling.StackSampler(threading.get_ident(), 0.001)
+
+        sampler.start()
+        busy_wait(0.05)
+        stacks = sampler.stop()
+
+        self.assertTrue(stacks)
+        stack = stacks.most_common(1)[0][0]
+        self.assertTrue(stack.endswith(f'{__name__}.busy_wait'))
+        self.assertIn(f'{__name__}.test_samples_running_thread', stack)
+
+    def test_collapsed_lines(self):
+        """Test stacks are written as 'frame;frame count' lines"""
+        stacks = profiling.Counter({'a;b': 2, 'a;c': 5})
+
+        self.assertEqual(profiling.collapsed(stacks), 'a;c 5\na;b 2\n')
+
+    def test_tampered_token(self):
+        """Test a modified X-Profile value is not accepted"""
+        token = profiling.profile_token('slow')
+
+        self.assertIsNone(profiling.profile_label(token + 'x', max_age=60))
+        self.assertEqual(profiling.profile_label(token, max_age=60), 'slow')
+
+
+class ProfilingMiddlewareTests(TestCase):
+
+    def setUp(self):
+        self.profile_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.profile_dir)
+        settings_override = override_settings(
+            PROFILING_ENABLED=True,
+            PROFILING_DIR=self.profile_dir,
+            PROFILING_INTERVAL=0.0005,
+            PROFILING_SAMPLE_RATE=0
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = get_user_model().objects.create_user(
+            'test@testdomain.com',
+            'testpass'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def profiles(self):
+        return sorted(os.listdir(self.profile_dir))
+
+    def test_removed_when_disabled(self):
+        """Test the middleware takes itself out of the stack when off"""
+        with self.settings(PROFILING_ENABLED=False):
+            with self.assertRaises(MiddlewareNotUsed):
+                ProfilingMiddleware(lambda request: None)
+
+    def test_signed_header_profiles_request(self):
+        """Test a request with a valid X-Profile header is profiled"""
+        res = self.client.get(
+            TAGS_URL,
+            HTTP_X_PROFILE=profiling.profile_token('slow-tags')
+        )
+
+        name = res['X-Profile-Id']
+        self.assertIn('slow-tags', name)
+        self.assertEqual(self.profiles(), [name + '.folded', name + '.json'])
+        with open(os.path.join(self.profile_dir, name + '.json')) as meta:
+            metadata = json.load(meta)
+        self.assertEqual(metadata['view_name'], 'shoes:tag-list')
+        self.assertEqual(metadata['route'], 'api/shoes/tags/$')
+        self.assertEqual(metadata['query_count'], 1)
+        self.assertEqual(metadata['status'], 200)
+
+    def test_unwritable_profile_dir(self):
+        """Test a profile that cannot be written does not fail the request"""
+        blocker = os.path.join(self.profile_dir, 'file')
+        open(blocker, 'w').close()
+
+        with self.settings(PROFILING_DIR=os.path.join(blocker, 'profiles')):
+            with self.assertLogs('core.middleware', 'ERROR'):
+                res = self.client.get(
+                    TAGS_URL,
+                    HTTP_X_PROFILE=profiling.profile_token('slow-tags')
+                )
+
+        self.assertEqual(res.status_code, 200)
+        self.assertFalse(res.has_header('X-Profile-Id'))
+
+    def test_invalid_header_ignored(self):
+        """Test requests with a bad X-Profile value are not profiled"""
+        res = self.client.get(TAGS_URL, HTTP_X_PROFILE='forged')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertFalse(res.has_header('X-Profile-Id'))
+        self.assertEqual(self.profiles(), [])
+
+    def test_sample_rate(self):
+        """Test requests are picked at the configured rate"""
+        with self.settings(PROFILING_SAMPLE_RATE=0.5):
+            with patch('core.middleware.random.random', return_value=0.7):
+                self.client.get(TAGS_URL)
+            self.assertEqual(self.profiles(), [])
+
+            with patch('core.middleware.random.random', return_value=0.2):
+                res = self.client.get(TAGS_URL)
+
+        self.assertIn('sampled', res['X-Profile-Id'])
+        self.assertEqual(len(self.profiles()), 2)
@@ -0,0 +1,92 @@
+import io
+import os
+
+from PIL import Image
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+
+from core import renditions
+from core.signals import release_image
+from core.tests.test_storage import TempMediaMixin
+
+def sample_image(name='uploads/shoe/photo.jpg', size=(1000, 500)):
+    """Store a JPEG and return its name"""
+    buffer = io.BytesIO()
+    Image.new('RGB', size).save(buffer, format='JPEG')
+    return default_storage.save(name, ContentFile(buffer.getvalue()))
+
+@override_settings(SHOES_RENDITION_SIZES=(100, 400))
+class RenditionTests(TempMediaMixin, TestCase):
+
+    def rendition_size(self, name, size):
+        path = renditions.rendition_name(name, size)
+        with renditions.rendition_storage.open(path) as f:
+            return Image.open(f).size
+
+    def test_render_all_sizes(self):
+        """Test renditions fit within each configured size"""
+        name = sample_image()
+
+        renditions.render(name)
+
+        self.assertEqual(self.rendition_size(name, 100), (100, 50))
+        self.assertEqual(self.rendition_size(name, 400), (400, 200))
+
+    def test_render_skips_existing(self):
+        """Test rendering twice keeps the first renditions"""
+        name = sample_image()
+        renditions.render(name)
+        path = os.path.join(self.media_root,
+                            renditions.rendition_name(name, 100))
+        mtime = os.stat(path).st_mtime_ns
+
+        renditions.render(name)
+
+        self.assertEqual(os.stat(path).st_mtime_ns, mtime)
+        self.assertEqual(len(os.listdir(os.path.dirname(path))), 1)
+
+    def test_rendition_saved_over_in_place(self):
+        """Test saving a rendition again replaces it instead of renaming"""
+        path = renditions.rendition_name('uploads/shoe/photo.jpg', 100)
+        renditions.rendition_storage.save(path, ContentFile(b'old'))
+
+        saved = renditions.rendition_storage.save(path, ContentFile(b'new'))
+
+        self.assertEqual(saved, path)
+        with renditions.rendition_storage.open(path) as f:
+            self.assertEqual(f.read(), b'new')
+        full_path = os.path.join(self.media_root, path)
+        self.assertEqual(os.listdir(os.path.dirname(full_path)), ['photo.jpg'])
+
+    def test_queue_renders_in_background(self):
+        """Test queued images are rendered by the worker thread"""
+        name = sample_image()
+
+        renditions.renditions.put([name])
+        renditions.renditions.join()
+
+        self.assertEqual(self.rendition_size(name, 100), (100, 50))
+
+    def test_original_name(self):
+        """Test rendition paths map back to their original"""
+        self.assertEqual(
+            renditions.original_name('renditions/shoe/100/uploads/shoe/a.jpg'),
+            'uploads/shoe/a.jpg'
+        )
+        self.assertIsNone(
+            renditions.original_name('renditions/shoe/99/uploads/shoe/a.jpg')
+        )
+        self.assertIsNone(renditions.original_name('uploads/shoe/a.jpg'))
+
+    def test_released_image_renditions_deleted(self):
+        """Test releasing an image deletes its renditions"""
+        name = sample_image()
+        renditions.render(name)
+
+        release_image(name)
+
+        self.assertFalse(renditions.rendition_storage.exists(
+            renditions.rendition_name(name, 100)
+        ))
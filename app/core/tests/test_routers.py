@@ -0,0 +1,157 @@
+from unittest import skipUnless
+from unittest.mock import patch, MagicMock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.utils import OperationalError
+from django.http import HttpResponse
+from django.test import SimpleTestCase, TransactionTestCase, \
+                        RequestFactory, override_settings
+
+from core import routers
+from core.middleware import ReplicaRoutingMiddleware
+from core.models import Tag
+
+REPLICAS = ['replica_0', 'replica_1']
+
+@override_settings(DATABASE_REPLICAS=REPLICAS)
+class ReplicaRouterTests(SimpleTestCase):
+
+    def setUp(self):
+        self.router = routers.ReplicaRouter()
+        routers._down_until.clear()
+        patcher = patch('core.routers.connections')
+        self.connections = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.replicas = {alias: MagicMock() for alias in REPLICAS}
+        self.replicas['default'] = MagicMock(in_atomic_block=False)
+        self.connections.__getitem__.side_effect = self.replicas.__getitem__
+
+    def test_reads_use_primary_outside_safe_requests(self):
+        """Test reads go to the primary unless replica reads are enabled"""
+        self.assertEqual(self.router.db_for_read(Tag), 'default')
+
+    def test_reads_use_replica(self):
+        """Test reads go to a replica inside replica_reads"""
+        with routers.replica_reads():
+            self.assertIn(self.router.db_for_read(Tag), REPLICAS)
+
+    def test_one_replica_per_block(self):
+        """Test every read of a request goes to the same replica"""
+        with routers.replica_reads():
+            aliases = {self.router.db_for_read(Tag) for _ in range(20)}
+
+        self.assertEqual(len(aliases), 1)
+        connects = sum(self.replicas[alias].ensure_connection.call_count
+                       for alias in REPLICAS)
+        self.assertEqual(connects, 1)
+
+    def test_writes_use_primary(self):
+        """Test writes always go to the primary"""
+        with routers.replica_reads():
+            self.assertEqual(self.router.db_for_write(Tag), 'default')
+
+    @patch('random.shuffle')
+    def test_down_replica_skipped(self, shuffle):
+        """Test an unreachable replica is skipped until its retry time"""
+        self.replicas['replica_0'].ensure_connection.side_effect = \
+            OperationalError
+
+        with routers.replica_reads():
+            for _ in range(5):
+                self.assertEqual(self.router.db_for_read(Tag), 'replica_1')
+
+        self.assertEqual(
+            self.replicas['replica_0'].ensure_connection.call_count,
+            1
+        )
+
+    def test_all_replicas_down_falls_back_to_primary(self):
+        """Test reads go to the primary when no replica is reachable"""
+        for alias in REPLICAS:
+            self.replicas[alias].ensure_connection.side_effect = \
+                OperationalError
+
+        with routers.replica_reads():
+            self.assertEqual(self.router.db_for_read(Tag), 'default')
+
+    def test_reads_in_transaction_use_primary(self):
+        """Test reads inside a transaction see its writes"""
+        self.replicas['default'].in_atomic_block = True
+
+        with routers.replica_reads():
+            self.assertEqual(self.router.db_for_read(Tag), 'default')
+
+    def test_migrations_only_on_primary(self):
+        """Test migrations are not run against replicas"""
+        self.assertTrue(self.router.allow_migrate('default', 'core'))
+        self.assertFalse(self.router.allow_migrate('replica_0', 'core'))
+
+@override_settings(DATABASE_REPLICAS=REPLICAS)
+class ReplicaRoutingMiddlewareTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.middleware = ReplicaRoutingMiddleware(self.get_response)
+
+    def get_response(self, request):
+        """Record whether the view would read from replicas"""
+        self.replica_reads = routers._replica_reads.get()
+        return HttpResponse()
+
+    def test_safe_request_reads_replica(self):
+        """Test GET requests are served from replicas"""
+        self.middleware(self.factory.get('/api/shoes/shoes/'))
+        self.assertTrue(self.replica_reads)
+
+    def test_write_pins_client_to_primary(self):
+        """Test a client reads from the primary right after writing"""
+        auth = {'HTTP_AUTHORIZATION': 'Token abc'}
+        self.middleware(self.factory.post('/api/shoes/shoes/', **auth))
+        self.assertFalse(self.replica_reads)
+
+        self.middleware(self.factory.get('/api/shoes/shoes/', **auth))
+        self.assertFalse(self.replica_reads)
+
+        other = {'HTTP_AUTHORIZATION': 'Token def'}
+        self.middleware(self.factory.get('/api/shoes/shoes/', **other))
+        self.assertTrue(self.replica_reads)
+
+    def test_pin_cookie_holds_across_workers(self):
+        """Test the pin cookie works where the cache has no pin"""
+        response = self.middleware(self.factory.post('/api/shoes/shoes/'))
+        cookie = response.cookies['replica_pin']
+        self.assertEqual(cookie['max-age'], settings.REPLICA_STICKY_SECONDS)
+        #another worker, with a cache of its own
+        cache.clear()
+
+        request = self.factory.get('/api/shoes/shoes/')
+        request.COOKIES['replica_pin'] = cookie.value
+        self.middleware(request)
+        self.assertFalse(self.replica_reads)
+
+        request = self.factory.get('/api/shoes/shoes/')
+        request.COOKIES['replica_pin'] = 'forged'
+        self.middleware(request)
+        self.assertTrue(self.replica_reads)
+
+@skipUnless(settings.DATABASE_REPLICAS, 'no replica databases configured')
+class ReplicaDatabaseTests(TransactionTestCase):
+    """Run against real replicas, e.g. DB_REPLICA_HOSTS=localhost"""
+
+    databases = {'default', *settings.DATABASE_REPLICAS}
+
+    def test_reads_served_by_replica(self):
+        """Test committed rows are read back through a replica"""
+        user = get_user_model().objects.create_user(
+            'test@testdomain.com',
+            'testpass'
+        )
+        Tag.objects.create(user=user, name='runners')
+
+        with routers.replica_reads():
+            tag = Tag.objects.get(name='runners')
+
+        self.assertIn(tag._state.db, settings.DATABASE_REPLICAS)
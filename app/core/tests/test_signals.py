@@ -0,0 +1,141 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+
+from core import models
+
+def sample_user(email = 'test@testdomain.com', password = "testpassword"):
+    """Create a sample user"""
+    return get_user_model().objects.create_user(email, password)
+
+def sample_shoe(user, title='Sample shoe'):
+    """Create a sample shoe"""
+    return models.Shoes.objects.create(
+        user=user,
+        title=title,
+        brand='Sample brand',
+        price=100
+    )
+
+@override_settings(SHOES_DENORMALIZED_COUNTS=True)
+class ShoeCountSignalTests(TestCase):
+
+    def setUp(self):
+        self.user = sample_user()
+        self.tag = models.Tag.objects.create(user=self.user, name='runners')
+        self.characteristic = models.Characteristic.objects.create(
+            user=self.user,
+            name='mesh'
+        )
+
+    def assertCounts(self, tag_count, characteristic_count):
+        self.tag.refresh_from_db()
+        self.characteristic.refresh_from_db()
+        self.assertEqual(self.tag.shoe_count, tag_count)
+        self.assertEqual(
+            self.characteristic.shoe_count,
+            characteristic_count
+        )
+
+    def test_counts_follow_add_and_remove(self):
+        """Test adding and removing links updates the counts"""
+        shoe1 = sample_shoe(self.user)
+        shoe2 = sample_shoe(self.user)
+
+        shoe1.tags.add(self.tag)
+        shoe1.tags.add(self.tag)
+        shoe2.tags.add(self.tag)
+        shoe1.characteristics.add(self.characteristic)
+        self.assertCounts(2, 1)
+
+        shoe1.tags.remove(self.tag)
+        shoe1.characteristics.clear()
+        self.assertCounts(1, 0)
+
+    def test_counts_follow_set_and_reverse_changes(self):
+        """Test set() and changes from the tag side update the counts"""
+        shoe = sample_shoe(self.user)
+        other_tag = models.Tag.objects.create(user=self.user, name='trail')
+
+        shoe.tags.set([self.tag, other_tag])
+        shoe.tags.set([other_tag])
+        self.assertCounts(0, 0)
+
+        self.tag.shoes_set.add(shoe)
+        self.assertCounts(1, 0)
+
+    def test_counts_follow_shoe_delete(self):
+        """Test deleting a shoe decrements its tags' counts"""
+        shoe = sample_shoe(self.user)
+        shoe.tags.add(self.tag)
+        shoe.characteristics.add(self.characteristic)
+
+        shoe.delete()
+        self.assertCounts(0, 0)
+
+    @override_settings(SHOES_DENORMALIZED_COUNTS=False)
+    def test_only_tag_counts_maintained_when_disabled(self):
+        """Test only tag counts are maintained when denormalization is off"""
+        shoe = sample_shoe(self.user)
+        shoe.tags.add(self.tag)
+        shoe.characteristics.add(self.characteristic)
+        self.assertCounts(1, 0)
+
+        shoe.delete()
+        self.assertCounts(0, 0)
+
+class BrandSummarySignalTests(TestCase):
+
+    def setUp(self):
+        self.user = sample_user()
+
+    def assertSummary(self, brand, shoe_count, total_price):
+        summary = models.BrandSummary.objects.get(user=self.user, brand=brand)
+        self.assertEqual(summary.shoe_count, shoe_count)
+        self.assertEqual(summary.total_price, total_price)
+
+    def test_created_shoes_summarized(self):
+        """Test new shoes add to their brand's count and total"""
+        sample_shoe(self.user)
+        sample_shoe(self.user)
+
+        self.assertSummary('Sample brand', 2, 200)
+
+    def test_price_and_brand_changes_move_totals(self):
+        """Test updating a shoe moves it between summaries"""
+        sample_shoe(self.user)
+        shoe = models.Shoes.objects.get(pk=sample_shoe(self.user).pk)
+
+        shoe.price = 150
+        shoe.save()
+        self.assertSummary('Sample brand', 2, 250)
+
+        shoe.brand = 'Other brand'
+        shoe.save()
+        self.assertSummary('Sample brand', 1, 100)
+        self.assertSummary('Other brand', 1, 150)
+
+    def test_deleting_last_shoe_drops_summary(self):
+        """Test a brand without shoes has no summary row"""
+        shoe = sample_shoe(self.user)
+        shoe.delete()
+
+        self.assertFalse(models.BrandSummary.objects.exists())
+
+    def test_unloaded_shoe_save_rebuilds(self):
+        """Test saving a shoe that wasn't loaded recomputes the summaries"""
+        shoe = sample_shoe(self.user)
+        models.Shoes(pk=shoe.pk, user=self.user, title='x', brand='New',
+                     price=5, created_at=shoe.created_at).save()
+
+        self.assertSummary('New', 1, 5)
+        self.assertFalse(models.BrandSummary.objects.filter(
+            brand='Sample brand'
+        ).exists())
+
+    def test_user_deletion(self):
+        """Test deleting a user with shoes removes their summaries"""
+        sample_shoe(self.user)
+
+        self.user.delete()
+
+        self.assertFalse(models.BrandSummary.objects.exists())
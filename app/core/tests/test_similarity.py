@@ -0,0 +1,143 @@
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from core.models import Characteristic, Shoes, Tag
+from core.similarity import ShoeIndex, shoe_indexes
+
+def index_state(index):
+    """Return an index's live contents, independent of row layout"""
+    return {
+        shoe_id: (
+            index.brands[row],
+            index.prices[row],
+            index.weights[row],
+            frozenset(index.features[row]),
+        )
+        for shoe_id, row in index.rows.items()
+    }
+
+class ShoeIndexTests(TestCase):
+
+    def setUp(self):
+        self.index = ShoeIndex()
+        self.index.set_shoe(1, 'Nike', 100)
+        self.index.set_shoe(2, 'Nike', 100)
+        self.index.set_shoe(3, 'Asics', 100)
+        self.index.set_shoe(4, 'Asics', 100)
+
+    def test_ranked_by_weighted_jaccard(self):
+        """Test shared features outrank a shared brand"""
+        self.index.add_features(1, 'tag', [1, 2])
+        self.index.add_features(3, 'tag', [1, 2])
+        self.index.add_features(4, 'tag', [1])
+
+        self.assertEqual(
+            [shoe_id for shoe_id, _ in self.index.similar(1, 10)],
+            [3, 4, 2]
+        )
+
+    def test_characteristics_weigh_more(self):
+        """Test a shared characteristic beats a shared tag"""
+        self.index.add_features(1, 'tag', [1])
+        self.index.add_features(1, 'characteristic', [1])
+        self.index.add_features(3, 'tag', [1])
+        self.index.add_features(4, 'characteristic', [1])
+
+        ranked = self.index.similar(1, 10)
+
+        self.assertEqual(ranked[0][0], 4)
+
+    def test_unrelated_shoes_excluded(self):
+        """Test shoes sharing neither features nor brand are left out"""
+        self.assertEqual(
+            [shoe_id for shoe_id, _ in self.index.similar(1, 10)],
+            [2]
+        )
+
+    def test_removed_shoe_not_returned(self):
+        """Test deleted shoes drop out of the results"""
+        self.index.remove_shoe(2)
+
+        self.assertEqual(self.index.similar(1, 10), [])
+
+    def test_drop_feature(self):
+        """Test deleting a tag unlinks it from every shoe"""
+        self.index.add_features(1, 'tag', [1])
+        self.index.add_features(3, 'tag', [1])
+
+        self.index.drop_feature('tag', 1)
+
+        self.assertEqual(self.index.weights[self.index.rows[1]], 0)
+        self.assertNotIn(3, [shoe_id for shoe_id, _ in
+                             self.index.similar(1, 10)])
+
+class IndexRegistryTests(TestCase):
+
+    def setUp(self):
+        shoe_indexes.clear()
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'testpass'
+        )
+
+    def test_index_rebuilt_after_ttl(self):
+        """Test expired indexes are rebuilt"""
+        with patch('time.monotonic', return_value=100):
+            first = shoe_indexes.get(self.user.id)
+            self.assertIs(shoe_indexes.get(self.user.id), first)
+
+        with override_settings(SIMILAR_SHOES_INDEX_TTL=10), \
+                patch('time.monotonic', return_value=1000):
+            self.assertIsNot(shoe_indexes.get(self.user.id), first)
+
+    def test_unknown_shoe_rebuilds(self):
+        """Test a shoe created by another worker triggers a rebuild"""
+        shoe_indexes.get(self.user.id)
+        shoe = Shoes.objects.create(user=self.user, title='x', brand='y',
+                                    price=1)
+
+        self.assertEqual(shoe_indexes.similar(self.user.id, shoe.id, 5), [])
+
+class IndexSignalTests(TransactionTestCase):
+
+    def setUp(self):
+        shoe_indexes.clear()
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'testpass'
+        )
+
+    def tearDown(self):
+        shoe_indexes.clear()
+
+    def test_incremental_updates_match_rebuild(self):
+        """Test a loaded index tracks changes like a fresh build would"""
+        index = shoe_indexes.get(self.user.id)
+        tag = Tag.objects.create(user=self.user, name='running')
+        gone = Tag.objects.create(user=self.user, name='gone')
+        characteristic = Characteristic.objects.create(
+            user=self.user,
+            name='suede'
+        )
+        first = Shoes.objects.create(user=self.user, title='a',
+                                     brand='Nike', price=10)
+        second = Shoes.objects.create(user=self.user, title='b',
+                                      brand='Nike', price=20)
+        deleted = Shoes.objects.create(user=self.user, title='c',
+                                       brand='Nike', price=30)
+
+        first.tags.add(tag, gone)
+        first.characteristics.add(characteristic)
+        tag.shoes_set.add(second, deleted)
+        second.characteristics.add(characteristic)
+        second.characteristics.clear()
+        second.brand = 'Asics'
+        second.save()
+        gone.delete()
+        deleted.delete()
+
+        self.assertIs(shoe_indexes.get(self.user.id), index)
+        self.assertEqual(index_state(index),
+                         index_state(ShoeIndex.build(self.user.id)))
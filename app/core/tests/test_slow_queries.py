@@ -0,0 +1,185 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core import slow_queries
+from core.models import Tag
+from shoes.views import ShoeViewSet
+
+TAGS_URL = reverse('shoes:tag-list')
+
+
+def log_entry(fingerprint, duration_ms, view='ShoeViewSet.list', plan=None):
+    return {
+        'at': '2026-01-01T00:00:00+00:00',
+        'view': view,
+        'duration_ms': duration_ms,
+        'fingerprint': fingerprint,
+        'sql': fingerprint,
+        'plan': plan,
+    }
+
+
+class FingerprintTests(TestCase):
+
+    def test_literals_normalized(self):
+        """Test queries differing only in values share a fingerprint"""
+        self.assertEqual(
+            slow_queries.fingerprint(
+                "SELECT * FROM core_tag WHERE id = 12 AND name = 'it''s'"
+            ),
+            'SELECT * FROM core_tag WHERE id = %s AND name = %s'
+        )
+
+    def test_in_lists_collapsed(self):
+        """Test IN lists of any length share a fingerprint"""
+        one = slow_queries.fingerprint('SELECT 1 FROM t WHERE id IN (%s)')
+        three = slow_queries.fingerprint(
+            'SELECT 1 FROM t WHERE id IN (%s, %s,\n %s)'
+        )
+
+        self.assertEqual(one, three)
+        self.assertTrue(one.endswith('IN (...)'))
+
+    def test_identifiers_kept(self):
+        """Test digits inside identifiers are not treated as values"""
+        self.assertEqual(slow_queries.fingerprint('SELECT "col1" FROM t2'),
+                         'SELECT "col1" FROM t2')
+
+    def test_view_label(self):
+        """Test viewset views are named after their class and action"""
+        view = ShoeViewSet.as_view({'get': 'list', 'post': 'create'})
+
+        self.assertEqual(slow_queries.view_label(view, 'GET'),
+                         'ShoeViewSet.list')
+        self.assertEqual(slow_queries.view_label(view, 'POST'),
+                         'ShoeViewSet.create')
+
+
+class SlowQueryLogTests(TestCase):
+
+    def setUp(self):
+        log_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, log_dir)
+        self.log_path = os.path.join(log_dir, 'logs', 'slow.jsonl')
+        #every query counts as slow
+        settings_override = override_settings(
+            SLOW_QUERY_MS=1e-9,
+            SLOW_QUERY_LOG=self.log_path,
+            SLOW_QUERY_EXPLAIN_RATE=1
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = get_user_model().objects.create_user(
+            'test@testdomain.com',
+            'testpass'
+        )
+
+        slow_queries.install(connection)
+        self.addCleanup(connection.execute_wrappers.remove,
+                        slow_queries.log_slow_queries)
+
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def entries(self):
+        return list(slow_queries.read_log(self.log_path))
+
+    def test_logs_view_and_plan(self):
+        """Test slow queries are logged with their view and a plan"""
+        with self.assertLogs('core.slow_queries', 'WARNING'):
+            Tag.objects.create(user=self.user, name='Vegan')
+        open(self.log_path, 'w').close()
+
+        with self.assertLogs('core.slow_queries', 'WARNING') as logs:
+            res = self.client.get(TAGS_URL)
+
+        self.assertEqual(len(res.data), 1)
+        entries = self.entries()
+        self.assertEqual(len(entries), 1)
+        self.assertEqual(entries[0]['view'], 'TagViewSet.list')
+        self.assertIn('core_tag', entries[0]['fingerprint'])
+        self.assertIn('actual time', entries[0]['plan'])
+        self.assertIn('TagViewSet.list', logs.output[0])
+
+    def test_writes_not_explained(self):
+        """Test only SELECTs are run again under EXPLAIN ANALYZE"""
+        with self.assertLogs('core.slow_queries', 'WARNING'):
+            Tag.objects.create(user=self.user, name='Vegan')
+
+        entry = self.entries()[-1]
+        self.assertTrue(entry['sql'].startswith('INSERT'))
+        self.assertIsNone(entry['view'])
+        self.assertIsNone(entry['plan'])
+        with self.assertLogs('core.slow_queries', 'WARNING'):
+            self.assertEqual(Tag.objects.count(), 1)
+
+    def test_failed_explain_keeps_transaction_usable(self):
+        """Test an EXPLAIN error does not abort the surrounding transaction"""
+        self.assertTrue(connection.in_atomic_block)
+
+        with self.assertRaises(Exception):
+            slow_queries.explain(connection, 'SELECT 1 / 0', None)
+
+        with self.assertLogs('core.slow_queries', 'WARNING'):
+            self.assertEqual(Tag.objects.count(), 0)
+
+    def test_fast_queries_not_logged(self):
+        """Test queries under the threshold are not logged"""
+        open(self.log_path, 'w').close()
+
+        with self.settings(SLOW_QUERY_MS=60 * 1000):
+            Tag.objects.count()
+
+        self.assertEqual(self.entries(), [])
+
+
+class SlowQueriesCommandTests(TestCase):
+
+    def setUp(self):
+        fd, self.log_path = tempfile.mkstemp(suffix='.jsonl')
+        self.addCleanup(os.remove, self.log_path)
+        with os.fdopen(fd, 'w') as log_file:
+            for duration in range(1, 21):
+                log_file.write(json.dumps(log_entry('SELECT a', duration)))
+                log_file.write('\n')
+            log_file.write(json.dumps(log_entry(
+                'SELECT b', 500, view='TagViewSet.list', plan='Seq Scan'
+            )) + '\n')
+            log_file.write('{"truncated\n')
+
+    def test_aggregates_by_fingerprint(self):
+        """Test counts and p95 timings per fingerprint"""
+        out = StringIO()
+
+        call_command('slow_queries', '--json', log=self.log_path, stdout=out)
+
+        summaries = json.loads(out.getvalue())
+        self.assertEqual([s['fingerprint'] for s in summaries],
+                         ['SELECT b', 'SELECT a'])
+        self.assertEqual(summaries[1]['count'], 20)
+        self.assertEqual(summaries[1]['p95_ms'], 20)
+        self.assertEqual(summaries[1]['total_ms'], 210)
+        self.assertEqual(summaries[0]['plan'], 'Seq Scan')
+
+    def test_filter_by_view(self):
+        """Test the summary can be limited to one view"""
+        out = StringIO()
+
+        call_command('slow_queries', '--plans', view='TagViewSet.list',
+                     log=self.log_path, stdout=out)
+
+        self.assertIn('SELECT b', out.getvalue())
+        self.assertIn('Seq Scan', out.getvalue())
+        self.assertNotIn('SELECT a', out.getvalue())
@@ -0,0 +1,149 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from core.models import Shoes
+from core.signals import release_image
+from core.storage import ContentAddressedStorage
+
+CONTENT = b'not really a jpeg'
+DIGEST = hashlib.sha256(CONTENT).hexdigest()
+
+class TempMediaMixin:
+    """Point MEDIA_ROOT at a temporary directory for each test"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+class ContentAddressedStorageTests(TempMediaMixin, TestCase):
+
+    def test_save_names_file_by_hash(self):
+        """Test files are named after their content"""
+        storage = ContentAddressedStorage()
+
+        name = storage.save('uploads/shoe/uuid.JPG', ContentFile(CONTENT))
+
+        self.assertEqual(name, f'uploads/shoe/{DIGEST[:2]}/{DIGEST}.jpg')
+        with storage.open(name) as f:
+            self.assertEqual(f.read(), CONTENT)
+
+    def test_save_deduplicates(self):
+        """Test saving the same bytes twice stores a single file"""
+        storage = ContentAddressedStorage()
+
+        name1 = storage.save('uploads/shoe/one.jpg', ContentFile(CONTENT))
+        name2 = storage.save('uploads/shoe/two.jpg', ContentFile(CONTENT))
+        name3 = storage.save('uploads/shoe/three.jpg', ContentFile(b'other'))
+
+        self.assertEqual(name1, name2)
+        self.assertNotEqual(name1, name3)
+        self.assertEqual(
+            os.listdir(os.path.join(self.media_root, 'uploads/shoe',
+                                    DIGEST[:2])),
+            [f'{DIGEST}.jpg']
+        )
+
+    def test_save_existing_refreshes_mtime(self):
+        """Test saving existing bytes only refreshes the file's mtime"""
+        storage = ContentAddressedStorage()
+        name = storage.save('uploads/shoe/one.jpg', ContentFile(CONTENT))
+        path = storage.path(name)
+        os.utime(path, (0, 0))
+
+        with patch('core.storage.os.replace') as replace:
+            storage.save('uploads/shoe/two.jpg', ContentFile(CONTENT))
+
+        replace.assert_not_called()
+        self.assertGreater(os.path.getmtime(path), 0)
+
+class ImageReleaseTests(TempMediaMixin, TransactionTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = get_user_model().objects.create_user(
+            'test@testdomain.com',
+            'testpass'
+        )
+
+    def sample_shoe(self, content=CONTENT):
+        shoe = Shoes.objects.create(
+            user=self.user,
+            title='Pegasus',
+            brand='Nike',
+            price=120
+        )
+        shoe.image.save('photo.jpg', ContentFile(content))
+        return Shoes.objects.get(pk=shoe.pk)
+
+    def test_replaced_image_released(self):
+        """Test replacing the only reference deletes the old file"""
+        shoe = self.sample_shoe()
+        old_path = shoe.image.path
+
+        shoe.image.save('photo.jpg', ContentFile(b'new photo'))
+
+        self.assertFalse(os.path.exists(old_path))
+        self.assertTrue(os.path.exists(shoe.image.path))
+
+    def test_shared_image_kept(self):
+        """Test files still referenced by another shoe are kept"""
+        shoe1 = self.sample_shoe()
+        shoe2 = self.sample_shoe()
+        self.assertEqual(shoe1.image.name, shoe2.image.name)
+
+        shoe1.delete()
+        self.assertTrue(os.path.exists(shoe2.image.path))
+
+        shoe2.delete()
+        self.assertFalse(os.path.exists(shoe2.image.path))
+
+    def test_release_waits_for_transaction_saving_same_bytes(self):
+        """Test a file reused by an uncommitted shoe is not released"""
+        name = default_storage.save('uploads/shoe/a.jpg', ContentFile(CONTENT))
+        saved = threading.Event()
+        proceed = threading.Event()
+
+        def save_and_attach():
+            try:
+                with transaction.atomic():
+                    default_storage.save('uploads/shoe/b.jpg',
+                                         ContentFile(CONTENT))
+                    saved.set()
+                    proceed.wait(5)
+                    Shoes.objects.create(user=self.user, title='Pegasus',
+                                         brand='Nike', price=120, image=name)
+            finally:
+                connection.close()
+
+        def release():
+            try:
+                release_image(name)
+            finally:
+                connection.close()
+
+        saver = threading.Thread(target=save_and_attach)
+        saver.start()
+        self.assertTrue(saved.wait(5))
+        releaser = threading.Thread(target=release)
+        releaser.start()
+        releaser.join(0.3)
+        self.assertTrue(releaser.is_alive())
+
+        proceed.set()
+        saver.join(5)
+        releaser.join(5)
+
+        self.assertTrue(default_storage.exists(name))
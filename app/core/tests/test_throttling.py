@@ -0,0 +1,134 @@
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import throttling
+
+TOKEN_URL = reverse('user:token')
+SHOES_URL = reverse('shoes:shoes-list')
+
+def rest_framework_settings(**rates):
+    """Return REST_FRAMEWORK settings with the given throttle rates"""
+    return {
+        'DEFAULT_THROTTLE_CLASSES': (
+            'core.throttling.TokenBucketThrottle',
+        ),
+        'DEFAULT_THROTTLE_RATES': rates,
+    }
+
+class BucketStoreTests(TestCase):
+
+    def test_parse_rate(self):
+        """Test rates convert to bucket size and refill speed"""
+        self.assertEqual(throttling.parse_rate('120/min'), (120, 2))
+        self.assertEqual(throttling.parse_rate('10/s'), (10, 10))
+
+    def test_memory_store_refills(self):
+        """Test an empty bucket admits again once refilled"""
+        store = throttling.MemoryBucketStore()
+        with patch('time.monotonic', return_value=100):
+            self.assertEqual(store.consume('k', 2, 1), (True, 1))
+            self.assertEqual(store.consume('k', 2, 1), (True, 0))
+            self.assertEqual(store.consume('k', 2, 1), (False, 0))
+
+        with patch('time.monotonic', return_value=101.5):
+            self.assertEqual(store.consume('k', 2, 1), (True, 0.5))
+
+    def test_cache_store(self):
+        """Test the cache store limits like the memory store"""
+        cache.clear()
+        store = throttling.CacheBucketStore()
+        with patch('time.time', return_value=100):
+            self.assertEqual(store.consume('k', 1, 1), (True, 0))
+            self.assertEqual(store.consume('k', 1, 1), (False, 0))
+
+class TokenBucketThrottleTests(TestCase):
+
+    def setUp(self):
+        throttling.STORES['memory'].clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@testdomain.com',
+            'testpass'
+        )
+
+    @override_settings(REST_FRAMEWORK=rest_framework_settings(read='2/min'))
+    def test_read_limit_and_headers(self):
+        """Test reads are limited per user and report their budget"""
+        self.client.force_authenticate(self.user)
+
+        res = self.client.get(SHOES_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['RateLimit-Limit'], '2')
+        self.assertEqual(res['RateLimit-Remaining'], '1')
+        self.assertEqual(res['RateLimit-Reset'], '30')
+
+        self.client.get(SHOES_URL)
+        res = self.client.get(SHOES_URL)
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(res['RateLimit-Remaining'], '0')
+        self.assertIn('Retry-After', res)
+
+        other = get_user_model().objects.create_user(
+            'other@testdomain.com',
+            'testpass'
+        )
+        self.client.force_authenticate(other)
+        res = self.client.get(SHOES_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    @override_settings(REST_FRAMEWORK=rest_framework_settings(login='1/min'))
+    def test_login_limited(self):
+        """Test token requests use the login scope"""
+        payload = {'email' : 'test@testdomain.com', 'password' : 'testpass'}
+
+        res = self.client.post(TOKEN_URL, payload)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        res = self.client.post(TOKEN_URL, payload)
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    @override_settings(REST_FRAMEWORK=rest_framework_settings(login='1/min'))
+    def test_forwarded_for_does_not_reset_bucket(self):
+        """Test a forged X-Forwarded-For does not get a fresh bucket"""
+        payload = {'email' : 'test@testdomain.com', 'password' : 'wrong'}
+
+        self.client.post(TOKEN_URL, payload, HTTP_X_FORWARDED_FOR='10.0.0.1')
+        res = self.client.post(TOKEN_URL, payload,
+                               HTTP_X_FORWARDED_FOR='10.0.0.2')
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_forwarded_for_trusted_behind_proxies(self):
+        """Test the proxy appended address is used with NUM_PROXIES set"""
+        rest_framework = dict(rest_framework_settings(login='1/min'),
+                              NUM_PROXIES=1)
+        payload = {'email' : 'test@testdomain.com', 'password' : 'wrong'}
+
+        with self.settings(REST_FRAMEWORK=rest_framework):
+            self.client.post(TOKEN_URL, payload,
+                             HTTP_X_FORWARDED_FOR='1.1.1.1, 10.0.0.1')
+            res = self.client.post(TOKEN_URL, payload,
+                                   HTTP_X_FORWARDED_FOR='2.2.2.2, 10.0.0.1')
+            self.assertEqual(res.status_code,
+                             status.HTTP_429_TOO_MANY_REQUESTS)
+
+            res = self.client.post(TOKEN_URL, payload,
+                                   HTTP_X_FORWARDED_FOR='10.0.0.2')
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(REST_FRAMEWORK=rest_framework_settings(write='1/min'))
+    def test_unconfigured_scope_unlimited(self):
+        """Test scopes without a rate are not limited"""
+        self.client.force_authenticate(self.user)
+
+        for _ in range(3):
+            res = self.client.get(SHOES_URL)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertNotIn('RateLimit-Limit', res)
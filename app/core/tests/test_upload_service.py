@@ -0,0 +1,112 @@
+import io
+import os
+from unittest.mock import patch
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+from django.core import signing
+from django.core.files.storage import default_storage
+from django.test import SimpleTestCase, override_settings
+
+from core import upload_service
+from core.tests.test_storage import TempMediaMixin
+
+NAME = 'uploads/shoe/image.jpg'
+
+
+def put(path, token=None, body=b'image', method='PUT', length=None):
+    """Call the upload service and return (status, body)"""
+    environ = {
+        'REQUEST_METHOD': method,
+        'PATH_INFO': '/' + path,
+        'QUERY_STRING': urlencode({'token': token}) if token else '',
+        'CONTENT_LENGTH': str(len(body) if length is None else length),
+        'wsgi.input': io.BytesIO(body),
+    }
+    statuses = []
+    chunks = upload_service.application(
+        environ,
+        lambda status, headers: statuses.append(status)
+    )
+    return statuses[0], b''.join(chunks)
+
+
+def token_for(url):
+    return parse_qs(urlsplit(url).query)['token'][0]
+
+
+@override_settings(UPLOAD_SERVICE_URL='http://uploads.test/',
+                   UPLOAD_MAX_BYTES=1024)
+class UploadServiceTests(TempMediaMixin, SimpleTestCase):
+
+    def test_signed_url_points_at_service(self):
+        """Test the signed URL names the file on the upload service"""
+        url = upload_service.signed_upload_url(NAME, 60)
+
+        self.assertTrue(url.startswith('http://uploads.test/' + NAME + '?'))
+        self.assertEqual(upload_service.verified_name(token_for(url)), NAME)
+
+    def test_upload_with_valid_token(self):
+        """Test a PUT with a valid token stores the body under the name"""
+        token = token_for(upload_service.signed_upload_url(NAME, 60))
+
+        status, _ = put(NAME, token, b'image bytes')
+
+        self.assertEqual(status, '201 Created')
+        with default_storage.open(NAME) as stored:
+            self.assertEqual(stored.read(), b'image bytes')
+
+    def test_only_put_allowed(self):
+        """Test other methods are rejected"""
+        token = token_for(upload_service.signed_upload_url(NAME, 60))
+
+        status, _ = put(NAME, token, method='POST')
+
+        self.assertEqual(status, '405 Method Not Allowed')
+
+    def test_token_for_other_name_rejected(self):
+        """Test a token only allows uploading the name it was issued for"""
+        token = token_for(upload_service.signed_upload_url(NAME, 60))
+
+        status, _ = put('uploads/shoe/other.jpg', token)
+
+        self.assertEqual(status, '403 Forbidden')
+        self.assertFalse(default_storage.exists('uploads/shoe/other.jpg'))
+
+    def test_tampered_token_rejected(self):
+        """Test a token that was not signed by us is rejected"""
+        token = signing.dumps({'name': NAME, 'exp': 2 ** 40}, salt='other')
+
+        status, _ = put(NAME, token)
+
+        self.assertEqual(status, '403 Forbidden')
+
+    def test_expired_token_rejected(self):
+        """Test a token cannot be used after it expires"""
+        token = token_for(upload_service.signed_upload_url(NAME, 60))
+
+        with patch('core.upload_service.time.time',
+                   return_value=upload_service.time.time() + 61):
+            status, _ = put(NAME, token)
+
+        self.assertEqual(status, '403 Forbidden')
+
+    def test_oversized_upload_rejected(self):
+        """Test bodies over UPLOAD_MAX_BYTES are refused before reading"""
+        token = token_for(upload_service.signed_upload_url(NAME, 60))
+
+        status, _ = put(NAME, token, b'x' * 1025)
+
+        self.assertEqual(status, '413 Payload Too Large')
+        self.assertFalse(default_storage.exists(NAME))
+
+    def test_incomplete_upload_not_stored(self):
+        """Test a body shorter than its Content-Length leaves no file"""
+        token = token_for(upload_service.signed_upload_url(NAME, 60))
+
+        status, _ = put(NAME, token, b'short', length=100)
+
+        self.assertEqual(status, '400 Bad Request')
+        self.assertFalse(default_storage.exists(NAME))
+        self.assertEqual(
+            os.listdir(os.path.dirname(default_storage.path(NAME))), []
+        )
@@ -0,0 +1,150 @@
+import math
+import threading
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+PERIODS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 24 * 60 * 60}
+
+
+@lru_cache(maxsize=None)
+def parse_rate(rate):
+    """Convert '100/min' into (capacity, tokens refilled per second)"""
+    num, period = rate.split('/')
+    capacity = int(num)
+    return capacity, capacity / PERIODS[period[0]]
+
+
+class MemoryBucketStore:
+    """Token buckets kept in this process"""
+
+    #drop idle, fully refilled buckets every this many calls
+    SWEEP_INTERVAL = 10000
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._calls = 0
+
+    def consume(self, key, capacity, refill_rate):
+        """Take a token; return (allowed, tokens left)"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - last) * refill_rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+
+            self._calls += 1
+            if self._calls >= self.SWEEP_INTERVAL:
+                self._sweep(now)
+
+        return allowed, tokens
+
+    def _sweep(self, now):
+        self._calls = 0
+        #a bucket idle for an hour is assumed refilled; rates are per minute
+        #or faster in practice, and a refilled bucket equals a missing one
+        stale = [key for key, (_, last) in self._buckets.items()
+                 if now - last > 60 * 60]
+        for key in stale:
+            del self._buckets[key]
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class CacheBucketStore:
+    """Token buckets kept in the default cache, shared between nodes
+
+    Updates are read-modify-write, so concurrent requests on different
+    nodes can occasionally be admitted past the limit.
+    """
+
+    def consume(self, key, capacity, refill_rate):
+        """Take a token; return (allowed, tokens left)"""
+        now = time.time()
+        key = f'throttle:{key}'
+        tokens, last = cache.get(key, (capacity, now))
+        tokens = min(capacity, tokens + max(now - last, 0) * refill_rate)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+
+        #once refilled the bucket is indistinguishable from a missing one
+        timeout = math.ceil((capacity - tokens) / refill_rate) + 1
+        cache.set(key, (tokens, now), timeout)
+
+        return allowed, tokens
+
+
+STORES = {
+    'memory': MemoryBucketStore(),
+    'cache': CacheBucketStore(),
+}
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Throttle requests per user (or address) and scope with token buckets
+
+    The scope is the view's `throttle_scope`, otherwise `read` for safe
+    methods and `write` for the rest. Scopes without a configured rate are
+    not limited.
+    """
+
+    def get_scope(self, view, request):
+        scope = getattr(view, 'throttle_scope', None)
+        if scope:
+            return scope
+
+        return 'read' if request.method in SAFE_METHODS else 'write'
+
+    def get_ident(self, request):
+        """Return the client address, trusting only NUM_PROXIES proxies
+
+        DRF reads the whole, client supplied X-Forwarded-For when
+        NUM_PROXIES is unset, which would hand out a fresh bucket per
+        forged header.
+        """
+        if api_settings.NUM_PROXIES is None:
+            return request.META.get('REMOTE_ADDR')
+
+        return super().get_ident(request)
+
+    def allow_request(self, request, view):
+        scope = self.get_scope(view, request)
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(scope)
+        if rate is None:
+            return True
+
+        if request.user and request.user.is_authenticated:
+            ident = f'user:{request.user.pk}'
+        else:
+            ident = f'addr:{self.get_ident(request)}'
+
+        capacity, refill_rate = parse_rate(rate)
+        store = STORES[settings.TOKEN_BUCKET_STORE]
+        allowed, tokens = store.consume(f'{scope}:{ident}', capacity,
+                                        refill_rate)
+
+        self.wait_seconds = 0 if allowed else (1 - tokens) / refill_rate
+        #picked up by RateLimitHeadersMiddleware
+        request._request.ratelimit = (
+            capacity,
+            int(tokens),
+            math.ceil((capacity - tokens) / refill_rate),
+        )
+
+        return allowed
+
+    def wait(self):
+        return self.wait_seconds
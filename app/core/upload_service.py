@@ -0,0 +1,99 @@
+"""Standalone WSGI service that accepts direct uploads into MEDIA_ROOT
+
+It plays the part a bucket's presigned PUT URLs play for object storage,
+so API workers never receive image bytes. Run it beside the API with the
+same settings, e.g.:
+
+    DJANGO_SETTINGS_MODULE=app.settings gunicorn core.upload_service:application
+"""
+import os
+import tempfile
+import time
+from urllib.parse import parse_qs, quote, urlencode
+
+from django.conf import settings
+from django.core import signing
+from django.core.files.storage import default_storage
+
+UPLOAD_SALT = 'core.upload_service'
+CHUNK_SIZE = 64 * 1024
+
+
+def signed_upload_url(name, expires):
+    """Return a URL that accepts one PUT of `name` for `expires` seconds"""
+    token = signing.dumps(
+        {'name': name, 'exp': int(time.time()) + expires},
+        salt=UPLOAD_SALT
+    )
+    return '%s%s?%s' % (
+        settings.UPLOAD_SERVICE_URL,
+        quote(name),
+        urlencode({'token': token})
+    )
+
+
+def verified_name(token):
+    """Return the name a token allows uploading, or None"""
+    try:
+        payload = signing.loads(token, salt=UPLOAD_SALT)
+    except signing.BadSignature:
+        return None
+
+    if payload['exp'] < time.time():
+        return None
+
+    return payload['name']
+
+
+def respond(start_response, status, body=b''):
+    start_response(status, [
+        ('Content-Type', 'text/plain'),
+        ('Content-Length', str(len(body))),
+    ])
+    return [body]
+
+
+def application(environ, start_response):
+    if environ['REQUEST_METHOD'] != 'PUT':
+        return respond(start_response, '405 Method Not Allowed')
+
+    token = parse_qs(environ.get('QUERY_STRING', '')).get('token', [''])[0]
+    name = environ.get('PATH_INFO', '').lstrip('/')
+    if not name or verified_name(token) != name:
+        return respond(start_response, '403 Forbidden')
+
+    try:
+        length = int(environ.get('CONTENT_LENGTH') or '')
+    except ValueError:
+        return respond(start_response, '411 Length Required')
+    if length > settings.UPLOAD_MAX_BYTES:
+        return respond(start_response, '413 Payload Too Large')
+
+    full_path = default_storage.path(name)
+    directory = os.path.dirname(full_path)
+    os.makedirs(directory, exist_ok=True)
+
+    #stream into a temporary file so a partial upload is never visible
+    stream = environ['wsgi.input']
+    with tempfile.NamedTemporaryFile(dir=directory, delete=False) as tmp:
+        try:
+            remaining = length
+            while remaining:
+                chunk = stream.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                tmp.write(chunk)
+                remaining -= len(chunk)
+        except BaseException:
+            os.unlink(tmp.name)
+            raise
+
+    if remaining:
+        os.unlink(tmp.name)
+        return respond(start_response, '400 Bad Request', b'Incomplete body')
+
+    os.replace(tmp.name, full_path)
+    if default_storage.file_permissions_mode is not None:
+        os.chmod(full_path, default_storage.file_permissions_mode)
+
+    return respond(start_response, '201 Created')
@@ -0,0 +1,146 @@
+import random
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from core.models import Tag, Characteristic, Shoes
+from shoes import views
+
+
+class Rollback(Exception):
+    """Raised to throw away the seeded rows"""
+
+
+class Command(BaseCommand):
+    """Django command to check endpoint queries for sequential scans"""
+
+    help = ('Seed data inside a rolled back transaction and fail if any '
+            'endpoint query plan contains a sequential scan')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--shoes', type=int, default=100,
+                            help='shoes per user')
+        parser.add_argument('--attrs', type=int, default=30,
+                            help='tags and characteristics per user')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('check_query_plans needs PostgreSQL')
+
+        failures = []
+        try:
+            with transaction.atomic():
+                user = self.seed(options['users'], options['shoes'],
+                                 options['attrs'])
+                for name, queryset in self.endpoint_queries(user):
+                    plan = queryset.explain()
+                    if 'Seq Scan' in plan:
+                        failures.append(name)
+                        self.stdout.write(self.style.ERROR(f'{name}: seq scan'))
+                        self.stdout.write(plan)
+                    else:
+                        self.stdout.write(f'{name}: ok')
+                raise Rollback
+        except Rollback:
+            pass
+
+        if failures:
+            raise CommandError(
+                f'sequential scans in: {", ".join(failures)}'
+            )
+
+        self.stdout.write(self.style.SUCCESS('all endpoint plans use indexes'))
+
+    def seed(self, user_count, shoe_count, attr_count):
+        """Create a realistic catalog and return one of its users"""
+        User = get_user_model()
+        users = User.objects.bulk_create(
+            User(email=f'plan-check-{i}@example.com', password='!')
+            for i in range(user_count)
+        )
+
+        tags, characteristics, shoes = [], [], []
+        for user in users:
+            tags += [Tag(user=user, name=f'tag {i}') for i in range(attr_count)]
+            characteristics += [
+                Characteristic(user=user, name=f'characteristic {i}')
+                for i in range(attr_count)
+            ]
+            shoes += [
+                Shoes(user=user, title=f'shoe {i}', brand=f'brand {i % 20}',
+                      price=random.randint(20, 500))
+                for i in range(shoe_count)
+            ]
+        tags = Tag.objects.bulk_create(tags)
+        characteristics = Characteristic.objects.bulk_create(characteristics)
+        shoes = Shoes.objects.bulk_create(shoes)
+
+        tag_links, characteristic_links = [], []
+        for i, shoe in enumerate(shoes):
+            offset = (i // shoe_count) * attr_count
+            for pk in random.sample(range(attr_count), min(3, attr_count)):
+                tag_links.append(Shoes.tags.through(
+                    shoes_id=shoe.pk, tag_id=tags[offset + pk].pk
+                ))
+                characteristic_links.append(Shoes.characteristics.through(
+                    shoes_id=shoe.pk,
+                    characteristic_id=characteristics[offset + pk].pk
+                ))
+        Shoes.tags.through.objects.bulk_create(tag_links)
+        Shoes.characteristics.through.objects.bulk_create(characteristic_links)
+
+        with connection.cursor() as cursor:
+            for model in (Tag, Characteristic, Shoes, Shoes.tags.through,
+                          Shoes.characteristics.through):
+                cursor.execute(f'ANALYZE {model._meta.db_table}')
+
+        return users[len(users) // 2]
+
+    def endpoint_queries(self, user):
+        """Yield (name, queryset) for the queries each endpoint runs"""
+        factory = APIRequestFactory()
+        tag_ids = list(Tag.objects.filter(user=user)
+                                  .values_list('id', flat=True)[:2])
+        characteristic_ids = list(Characteristic.objects.filter(user=user)
+                                  .values_list('id', flat=True)[:2])
+        shoe_ids = list(Shoes.objects.filter(user=user)
+                                     .values_list('id', flat=True)[:10])
+
+        def queryset(viewset, action, **params):
+            view = viewset()
+            view.action = action
+            view.format_kwarg = None
+            view.request = Request(factory.get('/', params))
+            view.request.user = user
+            return view.get_queryset()
+
+        yield 'tags list', queryset(views.TagViewSet, 'list')
+        yield 'tags assigned_only', queryset(
+            views.TagViewSet, 'list', assigned_only=1
+        )
+        yield 'characteristics list', queryset(
+            views.CharacteristicViewSet, 'list'
+        )
+        yield 'characteristics with_counts', queryset(
+            views.CharacteristicViewSet, 'list', with_counts=1
+        )
+        yield 'shoes list', queryset(views.ShoeViewSet, 'list')
+        yield 'shoes detail', queryset(
+            views.ShoeViewSet, 'retrieve'
+        ).filter(pk=shoe_ids[0])
+        yield 'shoes filtered by tags', queryset(
+            views.ShoeViewSet, 'list', tags=','.join(map(str, tag_ids))
+        )
+        yield 'shoes filtered by characteristics', queryset(
+            views.ShoeViewSet, 'list',
+            characteristics=','.join(map(str, characteristic_ids))
+        )
+        yield 'shoe tags', Tag.objects.filter(shoes__id__in=shoe_ids)
+        yield 'shoe characteristics', Characteristic.objects.filter(
+            shoes__id__in=shoe_ids
+        )
@@ -1,8 +1,79 @@
+from django.db import IntegrityError, transaction
+from django.db.models.functions import Lower
+from django.utils.translation import gettext_lazy as _
+
 from rest_framework import serializers
 
-from core.models import Tag, Characteristic, Shoes
+from core.models import Tag, Characteristic, Shoes, BrandSummary
+
+class UniqueNameMixin:
+    """Reject names the user already has, ignoring case
+
+    validate_name catches the common case; the (user, lower(name)) unique
+    index catches a concurrent request saving the same name in between.
+    """
+    unique_name_message = _('An item with this name already exists.')
+
+    def validate_name(self, value):
+        request = self.context.get('request')
+        if request is None:
+            return value
+
+        exists = self.Meta.model.objects.annotate(lower_name=Lower('name')) \
+                                        .filter(user=request.user,
+                                                lower_name=value.lower()) \
+                                        .exists()
+        if exists:
+            raise serializers.ValidationError(
+                self.unique_name_message,
+                code='unique'
+            )
+
+        return value
+
+    def _save_unique(self, save, *args):
+        try:
+            with transaction.atomic():
+                return save(*args)
+        except IntegrityError:
+            raise serializers.ValidationError(
+                {'name': [self.unique_name_message]},
+                code='unique'
+            )
+
+    def create(self, validated_data):
+        return self._save_unique(super().create, validated_data)
 
-class TagSerializer(serializers.ModelSerializer):
+    def update(self, instance, validated_data):
+        return self._save_unique(super().update, instance, validated_data)
+
+class NameListSerializer(serializers.Serializer):
+    """Serializer for resolving a batch of names"""
+
+    names = serializers.ListField(
+        child=serializers.CharField(),
+        allow_empty=False,
+        max_length=500
+    )
+
+    def validate_names(self, value):
+        """Strip, length check and drop case-insensitive duplicates"""
+        max_length = self.context['model']._meta.get_field('name').max_length
+        names = {}
+        for name in value:
+            name = name.strip()
+            if not name:
+                raise serializers.ValidationError(_('Names may not be blank.'))
+            if len(name) > max_length:
+                raise serializers.ValidationError(
+                    _('Ensure names have no more than %d characters.')
+                    % max_length
+                )
+            names.setdefault(name.lower(), name)
+
+        return list(names.values())
+
+class TagSerializer(UniqueNameMixin, serializers.ModelSerializer):
     """Serializer for tag objects"""
 
     class Meta:
@@ -10,7 +81,7 @@ class TagSerializer(serializers.ModelSerializer):
         fields = ('id', 'name')
         read_only_fields = ('id',)
 
-class CharacteristicsSerializer(serializers.ModelSerializer):
+class CharacteristicsSerializer(UniqueNameMixin, serializers.ModelSerializer):
     """Serializer for characteristics object"""
 
     class Meta:
@@ -19,6 +90,23 @@ class CharacteristicsSerializer(serializers.ModelSerializer):
         read_only_fields = ('id',)
 
 
+class TagCountSerializer(TagSerializer):
+    """Serializer for tag objects with their shoe count"""
+
+    shoe_count = serializers.IntegerField(source='usage_count', read_only=True)
+
+    class Meta(TagSerializer.Meta):
+        fields = TagSerializer.Meta.fields + ('shoe_count',)
+
+class CharacteristicsCountSerializer(CharacteristicsSerializer):
+    """Serializer for characteristic objects with their shoe count"""
+
+    shoe_count = serializers.IntegerField(source='usage_count', read_only=True)
+
+    class Meta(CharacteristicsSerializer.Meta):
+        fields = CharacteristicsSerializer.Meta.fields + ('shoe_count',)
+
+
 class ShoeSerializer(serializers.ModelSerializer):
     """Serialize a shoe"""
 
@@ -39,6 +127,26 @@ class ShoeSerializer(serializers.ModelSerializer):
                   'price', 'link')
         read_only_fields = ('id',)
 
+    #related fields that can be inlined with ?expand=
+    expandable_fields = {
+        'characteristics': CharacteristicsSerializer,
+        'tags': TagSerializer,
+    }
+
+    def __init__(self, *args, fields=None, expand=(), **kwargs):
+        """Optionally limit the output fields and inline related objects"""
+        super().__init__(*args, **kwargs)
+
+        for name in expand:
+            self.fields[name] = self.expandable_fields[name](
+                many=True,
+                read_only=True
+            )
+
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
 class ShoeDetailSerializer(ShoeSerializer):
     """Serialize a shoe detail"""
     
@@ -54,3 +162,18 @@ class ShoeImageSerializer(serializers.ModelSerializer):
         read_only_fields = ('id',)
 
     
+
+class BrandSummarySerializer(serializers.ModelSerializer):
+    """Serializer for a brand's shoe count and prices"""
+
+    average_price = serializers.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        read_only=True
+    )
+
+    class Meta:
+        model = BrandSummary
+        fields = ('brand', 'shoe_count', 'total_price', 'average_price')
+        read_only_fields = fields
+
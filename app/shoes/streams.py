@@ -0,0 +1,108 @@
+import asyncio
+import json
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from rest_framework.authtoken.models import Token
+
+from core.events import broker
+
+EVENTS_PATH = '/api/shoes/events/'
+
+
+@sync_to_async
+def authenticate(scope):
+    """Return the user for the token in the headers or query string"""
+    headers = dict(scope.get('headers', ()))
+    key = None
+    authorization = headers.get(b'authorization', b'').decode('latin-1')
+    if authorization.startswith('Token '):
+        key = authorization[len('Token '):].strip()
+    else:
+        #EventSource cannot set headers, so also accept ?token=
+        query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+        key = query.get('token', [None])[0]
+
+    if not key:
+        return None
+
+    try:
+        token = Token.objects.select_related('user').get(key=key)
+    except Token.DoesNotExist:
+        return None
+
+    return token.user if token.user.is_active else None
+
+
+async def send_status(send, status, body):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json')],
+    })
+    await send({
+        'type': 'http.response.body',
+        'body': json.dumps({'detail': body}).encode(),
+    })
+
+
+async def wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def sse_application(scope, receive, send):
+    """Stream the authenticated user's catalog changes as server-sent events"""
+    if scope['method'] != 'GET':
+        await send_status(send, 405, 'Method not allowed.')
+        return
+
+    user = await authenticate(scope)
+    if user is None:
+        await send_status(send, 401, 'Invalid or missing token.')
+        return
+
+    subscription = broker.subscribe(user.pk)
+    disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+    try:
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+            ],
+        })
+        await send({
+            'type': 'http.response.body',
+            'body': b': connected\n\n',
+            'more_body': True,
+        })
+
+        while not disconnected.done():
+            event = asyncio.ensure_future(subscription.get())
+            done, _ = await asyncio.wait(
+                {event, disconnected},
+                timeout=settings.EVENTS_HEARTBEAT_SECONDS,
+                return_when=asyncio.FIRST_COMPLETED
+            )
+            if event in done:
+                data = event.result()
+                body = f'event: {data["type"]}\ndata: {json.dumps(data)}\n\n'
+            else:
+                event.cancel()
+                if disconnected.done():
+                    break
+                body = ': ping\n\n'
+
+            await send({
+                'type': 'http.response.body',
+                'body': body.encode(),
+                'more_body': True,
+            })
+    finally:
+        broker.unsubscribe(subscription)
+        disconnected.cancel()
@@ -10,6 +10,7 @@ from core.models import Characteristic, Shoes
 from shoes.serializers import CharacteristicsSerializer
 
 CHARACTERISTICS_URL = reverse('shoes:characteristic-list')
+RESOLVE_CHARACTERISTICS_URL = reverse('shoes:characteristic-resolve')
 
 class PublicCharacteristicsApiTests(TestCase):
     """Test the publically available characteristics API"""
@@ -141,4 +142,24 @@ class PrivateCharacteristicsApiTests(TestCase):
 
         res = self.client.get(CHARACTERISTICS_URL, {'assigned_only' : 1})
 
-        self.assertEqual(len(res.data), 1)
\ No newline at end of file
+        self.assertEqual(len(res.data), 1)
+
+    def test_resolve_characteristics(self):
+        """Test resolving characteristic names in a single request"""
+        existing = Characteristic.objects.create(user=self.user, name='Suede')
+
+        payload = {'names' : ['suede', 'mesh']}
+        res = self.client.post(
+            RESOLVE_CHARACTERISTICS_URL,
+            payload,
+            format='json'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        names = {item['name'] : item['id'] for item in res.data}
+        self.assertEqual(names['Suede'], existing.id)
+        self.assertIn('mesh', names)
+        self.assertEqual(
+            Characteristic.objects.filter(user=self.user).count(),
+            2
+        )
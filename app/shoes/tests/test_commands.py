@@ -0,0 +1,30 @@
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from core.models import Shoes
+
+EXPLAIN = 'django.db.models.query.QuerySet.explain'
+
+class CheckQueryPlansTests(TestCase):
+
+    def test_check_query_plans_index_scans(self):
+        """Test the plan check passes when every query uses an index"""
+        with patch(EXPLAIN) as explain:
+            explain.return_value = 'Index Scan using core_shoes_user_id_idx'
+            call_command('check_query_plans', users=2, shoes=2, attrs=2,
+                         stdout=StringIO())
+
+        self.assertEqual(explain.call_count, 10)
+        self.assertFalse(Shoes.objects.exists())
+
+    def test_check_query_plans_seq_scan(self):
+        """Test the plan check fails on a sequential scan"""
+        with patch(EXPLAIN) as explain:
+            explain.return_value = 'Seq Scan on core_shoes'
+            with self.assertRaises(CommandError):
+                call_command('check_query_plans', users=2, shoes=2, attrs=2,
+                             stdout=StringIO())
@@ -0,0 +1,180 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core.models import Shoes, Tag, Characteristic
+from core.signals import rebuild_brand_summaries, update_shoe_counts
+from core.tests.perf import ScalingTestMixin, volumes
+
+SHOES_URL = reverse('shoes:shoes-list')
+TAGS_URL = reverse('shoes:tag-list')
+CHARACTERISTICS_URL = reverse('shoes:characteristic-list')
+SYNC_URL = reverse('shoes:sync')
+STATS_URL = reverse('shoes:stats')
+
+BRANDS = ('Nike', 'Adidas', 'New Balance', 'Asics', 'Vans')
+
+
+def seed_shoes(user, count, tags_per_shoe=3, characteristics_per_shoe=2):
+    """Bring the user's catalog up to `count` shoes with tags and features"""
+    tags = list(Tag.objects.filter(user=user))
+    characteristics = list(Characteristic.objects.filter(user=user))
+    if not tags:
+        tags = Tag.objects.bulk_create(
+            Tag(user=user, name=f'tag {number}') for number in range(20)
+        )
+        characteristics = Characteristic.objects.bulk_create(
+            Characteristic(user=user, name=f'characteristic {number}')
+            for number in range(10)
+        )
+
+    existing = Shoes.objects.filter(user=user).count()
+    shoes = Shoes.objects.bulk_create(
+        Shoes(
+            user=user,
+            title=f'Shoe {number}',
+            brand=BRANDS[number % len(BRANDS)],
+            price=Decimal(50 + number % 150)
+        )
+        for number in range(existing, count)
+    )
+
+    Shoes.tags.through.objects.bulk_create(
+        Shoes.tags.through(
+            shoes_id=shoe.id,
+            tag_id=tags[(shoe.id + offset) % len(tags)].id
+        )
+        for shoe in shoes for offset in range(tags_per_shoe)
+    )
+    Shoes.characteristics.through.objects.bulk_create(
+        Shoes.characteristics.through(
+            shoes_id=shoe.id,
+            characteristic_id=characteristics[
+                (shoe.id + offset) % len(characteristics)
+            ].id
+        )
+        for shoe in shoes for offset in range(characteristics_per_shoe)
+    )
+    #bulk_create sends no signals, so maintain what their receivers would
+    rebuild_brand_summaries([user.id])
+    update_shoe_counts(Tag, [tag.id for tag in tags])
+
+
+def seed_tags(user, count):
+    """Bring the user's tags up to `count`, each used by one of 20 shoes"""
+    shoes = list(Shoes.objects.filter(user=user).values_list('id', flat=True))
+    if not shoes:
+        shoes = [shoe.id for shoe in Shoes.objects.bulk_create(
+            Shoes(user=user, title=f'Shoe {number}', brand=BRANDS[0],
+                  price=Decimal(100))
+            for number in range(20)
+        )]
+
+    existing = Tag.objects.filter(user=user).count()
+    tags = Tag.objects.bulk_create(
+        Tag(user=user, name=f'tag {number}')
+        for number in range(existing, count)
+    )
+    Shoes.tags.through.objects.bulk_create(
+        Shoes.tags.through(shoes_id=shoes[tag.id % len(shoes)], tag_id=tag.id)
+        for tag in tags
+    )
+    update_shoe_counts(Tag, [tag.id for tag in tags])
+
+
+class ShoesApiScalingTests(ScalingTestMixin, TestCase):
+    """Test the shoe endpoints do a fixed amount of work per request"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'user@testdomain.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+
+    def seed(self, count):
+        seed_shoes(self.user, count)
+
+    def test_list_shoes(self):
+        """Test listing shoes loads tags and characteristics in bulk"""
+        res = self.assertScalesFlat(SHOES_URL, self.seed, max_queries=3)
+
+        self.assertEqual(len(res.data), self.perf_volumes[1])
+
+    def test_list_shoes_expanded(self):
+        """Test inlining related objects does not query per shoe"""
+        res = self.assertScalesFlat(SHOES_URL, self.seed, max_queries=3,
+                                    expand='tags,characteristics')
+
+        self.assertEqual(len(res.data[0]['tags']), 3)
+
+    def test_list_shoes_selected_fields(self):
+        """Test a field selection without relations needs one query"""
+        self.assertScalesFlat(SHOES_URL, self.seed, max_queries=1,
+                              fields='id,title,price')
+
+    def test_list_shoes_filtered(self):
+        """Test filtering by tag does not query per shoe"""
+        seed_shoes(self.user, 1)
+        tag = Shoes.objects.get(user=self.user).tags.first()
+
+        self.assertScalesFlat(SHOES_URL, self.seed, max_queries=3,
+                              tags=str(tag.id))
+
+    @volumes(5, 100)
+    def test_sync(self):
+        """Test a full sync loads every collection in bulk"""
+        self.assertScalesFlat(SYNC_URL, self.seed, max_queries=5)
+
+    def test_stats(self):
+        """Test the statistics do not depend on the catalog size"""
+        res = self.assertScalesFlat(STATS_URL, self.seed, max_queries=2)
+
+        self.assertEqual(res.data['shoe_count'], self.perf_volumes[1])
+        self.assertEqual(len(res.data['brands']), len(BRANDS))
+        self.assertEqual(len(res.data['top_tags']), 10)
+
+
+class TagsApiScalingTests(ScalingTestMixin, TestCase):
+    """Test the tag and characteristic endpoints scale with their rows"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'user@testdomain.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+
+    def seed(self, count):
+        seed_tags(self.user, count)
+
+    def test_list_tags(self):
+        """Test listing tags is a single query"""
+        res = self.assertScalesFlat(TAGS_URL, self.seed, max_queries=1)
+
+        self.assertEqual(len(res.data), self.perf_volumes[1])
+
+    def test_list_tags_with_counts(self):
+        """Test usage counts are computed in the listing query"""
+        self.assertScalesFlat(TAGS_URL, self.seed, max_queries=1,
+                              with_counts=1)
+
+    def test_list_assigned_tags(self):
+        """Test filtering to assigned tags is a single query"""
+        self.assertScalesFlat(TAGS_URL, self.seed, max_queries=1,
+                              assigned_only=1)
+
+    def test_list_characteristics(self):
+        """Test listing characteristics does not scale with the catalog"""
+        self.assertScalesFlat(
+            CHARACTERISTICS_URL,
+            lambda count: seed_shoes(self.user, count),
+            max_queries=1,
+            with_counts=1
+        )
@@ -1,20 +1,35 @@
+import io
 import tempfile
 import os
+import threading
+from unittest.mock import patch
+from urllib.request import Request, urlopen
+from wsgiref.simple_server import WSGIRequestHandler, make_server
 
 from PIL import Image
 
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.db import DatabaseError, connection
+from django.core import signing
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from rest_framework import status
 from rest_framework.test import APIClient
 
 from core.models import Shoes, Tag, Characteristic
+from core.similarity import shoe_indexes
+from core.tests.test_storage import TempMediaMixin
+from core.upload_service import application as upload_application
 
-from shoes.serializers import ShoeSerializer, ShoeDetailSerializer
+from shoes.serializers import ShoeSerializer, ShoeDetailSerializer, \
+                              TagSerializer, CharacteristicsSerializer
 
 SHOES_URL = reverse('shoes:shoes-list')
+UPLOAD_IMAGES_URL = reverse('shoes:shoes-upload-images')
 
 # api/shoe/shoes
 # api/shoe/shoes/id create this dynamically
@@ -30,6 +45,20 @@ def detail_url(shoe_id):
     #router will create the detail url
     return reverse('shoes:shoes-detail', args=[shoe_id])
 
+def upload_url_url(shoe_id):
+    """Return URL for requesting a direct upload URL"""
+    return reverse('shoes:shoes-upload-url', args=[shoe_id])
+
+
+def confirm_upload_url(shoe_id):
+    """Return URL for attaching a direct upload"""
+    return reverse('shoes:shoes-confirm-upload', args=[shoe_id])
+
+
+def similar_url(shoe_id):
+    """Return URL for similar shoes"""
+    return reverse('shoes:shoes-similar', args=[shoe_id])
+
 def sample_tag(user, name='street wear'):
     """Create and return a sample tag"""
     return Tag.objects.create(user=user, name=name)
@@ -38,6 +67,13 @@ def sample_characteristic(user, name='suede'):
     """Create and return a sample characteristic"""
     return Characteristic.objects.create(user=user, name=name)
 
+def sample_image_file(color='red'):
+    """Return an in-memory JPEG upload"""
+    buffer = io.BytesIO()
+    Image.new('RGB', (10, 10), color).save(buffer, format='JPEG')
+    return SimpleUploadedFile('photo.jpg', buffer.getvalue(),
+                              content_type='image/jpeg')
+
 def sample_shoe(user, **params):
     """Create and return a sample shoe"""
 
@@ -227,6 +263,110 @@ class PrivateShoesApiTests(TestCase):
         self.assertEqual(len(tags), 0)
         self.assertEqual(shoe.brand, payload['brand'])
 
+    def test_retrieve_shoes_sparse_fields(self):
+        """Test limiting the returned and selected fields"""
+        sample_shoe(user=self.user, title='Pegasus', price=120)
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(SHOES_URL, {'fields' : 'id,title,price'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(res.data[0]), ['id', 'title', 'price'])
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('brand', queries[0]['sql'])
+
+    def test_retrieve_shoe_detail_sparse_fields(self):
+        """Test limiting the fields of a shoe detail"""
+        shoe = sample_shoe(user=self.user)
+        shoe.tags.add(sample_tag(user=self.user))
+
+        res = self.client.get(detail_url(shoe.id), {'fields' : 'title,tags'})
+
+        self.assertEqual(res.data, {
+            'title' : shoe.title,
+            'tags' : [{'id' : shoe.tags.get().id, 'name' : 'street wear'}],
+        })
+
+    def test_retrieve_shoes_unknown_field(self):
+        """Test requesting an unknown field fails"""
+        res = self.client.get(SHOES_URL, {'fields' : 'id,user'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_retrieve_shoes_expanded(self):
+        """Test inlining tags and characteristics with constant queries"""
+        tag = sample_tag(user=self.user)
+        characteristic = sample_characteristic(user=self.user)
+        for i in range(3):
+            shoe = sample_shoe(user=self.user, title=f'shoe {i}')
+            shoe.tags.add(tag)
+            shoe.characteristics.add(characteristic)
+
+        with self.assertNumQueries(3):
+            res = self.client.get(
+                SHOES_URL,
+                {'expand' : 'tags,characteristics'}
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 3)
+        self.assertEqual(res.data[0]['tags'], [TagSerializer(tag).data])
+        self.assertEqual(
+            res.data[0]['characteristics'],
+            [CharacteristicsSerializer(characteristic).data]
+        )
+
+    def test_similar_shoes_ranked(self):
+        """Test similar shoes are ranked by shared tags, brand and price"""
+        shoe_indexes.clear()
+        running = sample_tag(self.user, 'running')
+        trail = sample_tag(self.user, 'trail')
+        target = sample_shoe(self.user, brand='Nike', price=100)
+        target.tags.add(running, trail)
+        close = sample_shoe(self.user, brand='Nike', price=110)
+        close.tags.add(running, trail)
+        partial = sample_shoe(self.user, brand='Asics', price=100)
+        partial.tags.add(running)
+        sample_shoe(self.user, brand='Asics', price=100)
+        other_user = get_user_model().objects.create_user(
+            'other@test.com',
+            'testpass'
+        )
+        sample_shoe(other_user, brand='Nike', price=100)
+
+        res = self.client.get(similar_url(target.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([shoe['id'] for shoe in res.data],
+                         [close.id, partial.id])
+        self.assertGreater(res.data[0]['similarity'],
+                           res.data[1]['similarity'])
+
+    def test_similar_shoes_limit(self):
+        """Test the number of similar shoes can be limited"""
+        shoe_indexes.clear()
+        target = sample_shoe(self.user)
+        for _ in range(3):
+            sample_shoe(self.user)
+
+        res = self.client.get(similar_url(target.id), {'limit': 2})
+        self.assertEqual(len(res.data), 2)
+
+        res = self.client.get(similar_url(target.id), {'limit': 'x'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_similar_shoes_other_user(self):
+        """Test similar shoes can't be requested for another user's shoe"""
+        other_user = get_user_model().objects.create_user(
+            'other@test.com',
+            'testpass'
+        )
+        shoe = sample_shoe(other_user)
+
+        res = self.client.get(similar_url(shoe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
 class ShoeImageUploadTests(TestCase):
 
     def setUp(self):
@@ -323,4 +463,280 @@ class ShoeImageUploadTests(TestCase):
 
         self.assertIn(serializer1.data, res.data)
         self.assertIn(serializer2.data, res.data)
-        self.assertNotIn(serializer3.data, res.data)
\ No newline at end of file
+        self.assertNotIn(serializer3.data, res.data)
+
+class BatchImageUploadTests(TempMediaMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'user@testdomain.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_upload_many_images(self):
+        """Test one request stores images for several shoes"""
+        shoe1 = sample_shoe(self.user)
+        shoe2 = sample_shoe(self.user)
+
+        #authorize the batch, then in a savepoint lock each file's content
+        #and update every shoe at once
+        with self.assertNumQueries(6):
+            res = self.client.post(UPLOAD_IMAGES_URL, {
+                str(shoe1.id): sample_image_file('red'),
+                str(shoe2.id): sample_image_file('blue'),
+            }, format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([shoe['id'] for shoe in res.data],
+                         [shoe1.id, shoe2.id])
+        shoe1.refresh_from_db()
+        shoe2.refresh_from_db()
+        self.assertTrue(os.path.exists(shoe1.image.path))
+        self.assertNotEqual(shoe1.image.name, shoe2.image.name)
+        self.assertGreater(shoe1.updated_at, shoe1.created_at)
+
+    def test_failed_update_releases_new_files(self):
+        """Test files stored for a batch that fails to save are deleted"""
+        shoe = sample_shoe(self.user)
+
+        with patch.object(Shoes.objects, 'bulk_update',
+                          side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                self.client.post(UPLOAD_IMAGES_URL, {
+                    str(shoe.id): sample_image_file(),
+                }, format='multipart')
+
+        shoe.refresh_from_db()
+        self.assertFalse(shoe.image)
+        stored = [name for _, _, names in os.walk(self.media_root)
+                  for name in names]
+        self.assertEqual(stored, [])
+
+    def test_other_users_shoe_rejected(self):
+        """Test the whole batch fails if any shoe isn't the user's"""
+        shoe = sample_shoe(self.user)
+        other_user = get_user_model().objects.create_user(
+            'other@testdomain.com',
+            'testpass'
+        )
+        other_shoe = sample_shoe(other_user)
+
+        res = self.client.post(UPLOAD_IMAGES_URL, {
+            str(shoe.id): sample_image_file(),
+            str(other_shoe.id): sample_image_file(),
+        }, format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn(str(other_shoe.id), res.data)
+        shoe.refresh_from_db()
+        self.assertFalse(shoe.image)
+
+    def test_invalid_parts_rejected(self):
+        """Test non-image files and non-id field names are reported"""
+        shoe = sample_shoe(self.user)
+
+        res = self.client.post(UPLOAD_IMAGES_URL, {
+            str(shoe.id): SimpleUploadedFile('a.jpg', b'not an image'),
+            'cover': sample_image_file(),
+        }, format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(set(res.data), {str(shoe.id), 'cover'})
+
+    def test_batch_size_limited(self):
+        """Test batches above SHOES_UPLOAD_BATCH_MAX are rejected"""
+        shoes = [sample_shoe(self.user) for _ in range(2)]
+
+        with self.settings(SHOES_UPLOAD_BATCH_MAX=1):
+            res = self.client.post(UPLOAD_IMAGES_URL, {
+                str(shoe.id): sample_image_file() for shoe in shoes
+            }, format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+class BatchImageUploadCommitTests(TempMediaMixin, TransactionTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'user@testdomain.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+
+    @patch('shoes.views.renditions')
+    def test_replaced_images_released_and_rendered(self, renditions):
+        """Test old files are released and renditions queued on commit"""
+        shoe = sample_shoe(self.user)
+        self.client.post(UPLOAD_IMAGES_URL, {
+            str(shoe.id): sample_image_file('red'),
+        }, format='multipart')
+        shoe.refresh_from_db()
+        old_path = shoe.image.path
+
+        self.client.post(UPLOAD_IMAGES_URL, {
+            str(shoe.id): sample_image_file('blue'),
+        }, format='multipart')
+
+        shoe.refresh_from_db()
+        self.assertFalse(os.path.exists(old_path))
+        renditions.put.assert_called_with([shoe.image.name])
+
+
+class QuietHandler(WSGIRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+
+class DirectUploadTests(TempMediaMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.server = make_server('127.0.0.1', 0, upload_application,
+                                  handler_class=QuietHandler)
+        thread = threading.Thread(target=self.server.serve_forever,
+                                  daemon=True)
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        settings_override = self.settings(
+            UPLOAD_SERVICE_URL='http://127.0.0.1:%d/' % self.server.server_port
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'user@testdomain.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+        self.shoe = sample_shoe(self.user)
+
+    def upload(self, body):
+        """Request an upload URL for the shoe, PUT `body` and return it"""
+        res = self.client.post(upload_url_url(self.shoe.id),
+                               {'filename': 'photo.png'})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['method'], 'PUT')
+        request = Request(res.data['upload_url'], data=body, method='PUT')
+        with urlopen(request) as response:
+            self.assertEqual(response.status, 201)
+
+        return res.data
+
+    def test_upload_and_confirm(self):
+        """Test an image uploaded directly is attached on confirm"""
+        body = sample_image_file().read()
+        data = self.upload(body)
+
+        res = self.client.post(confirm_upload_url(self.shoe.id),
+                               {'token': data['token']})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.shoe.refresh_from_db()
+        self.assertTrue(self.shoe.image.name.endswith('.png'))
+        self.assertIn('image', res.data)
+        with default_storage.open(self.shoe.image.name) as stored:
+            self.assertEqual(stored.read(), body)
+        staged = signing.loads(data['token'], salt='shoes.direct-upload')
+        self.assertNotEqual(self.shoe.image.name, staged['name'])
+        self.assertFalse(default_storage.exists(staged['name']))
+
+    def test_put_after_confirm_leaves_image(self):
+        """Test the upload URL cannot overwrite a confirmed image"""
+        body = sample_image_file().read()
+        data = self.upload(body)
+        self.client.post(confirm_upload_url(self.shoe.id),
+                         {'token': data['token']})
+
+        request = Request(data['upload_url'], data=b'replaced', method='PUT')
+        with urlopen(request) as response:
+            self.assertEqual(response.status, 201)
+
+        self.shoe.refresh_from_db()
+        with default_storage.open(self.shoe.image.name) as stored:
+            self.assertEqual(stored.read(), body)
+
+    def test_unsupported_extension_rejected(self):
+        """Test upload URLs are only issued for image file names"""
+        res = self.client.post(upload_url_url(self.shoe.id),
+                               {'filename': 'script.html'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_upload_url_for_other_users_shoe(self):
+        """Test upload URLs are not issued for another user's shoe"""
+        other = get_user_model().objects.create_user(
+            'other@testdomain.com',
+            'testpass'
+        )
+        shoe = sample_shoe(other)
+
+        res = self.client.post(upload_url_url(shoe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_confirm_with_token_for_other_shoe(self):
+        """Test a token cannot attach an upload to a different shoe"""
+        data = self.upload(b'image')
+        other_shoe = sample_shoe(self.user, title='Other')
+
+        res = self.client.post(confirm_upload_url(other_shoe.id),
+                               {'token': data['token']})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        other_shoe.refresh_from_db()
+        self.assertFalse(other_shoe.image)
+
+    def test_confirm_before_upload(self):
+        """Test confirming fails when nothing was uploaded"""
+        res = self.client.post(upload_url_url(self.shoe.id))
+
+        res = self.client.post(confirm_upload_url(self.shoe.id),
+                               {'token': res.data['token']})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_confirm_with_tampered_token(self):
+        """Test tokens not signed by the API are rejected"""
+        token = signing.dumps({'shoe': self.shoe.id,
+                               'name': 'uploads/shoe/other.jpg'})
+
+        res = self.client.post(confirm_upload_url(self.shoe.id),
+                               {'token': token})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_confirm_oversized_upload(self):
+        """Test an upload over UPLOAD_MAX_BYTES is deleted, not attached"""
+        data = self.upload(b'x' * 100)
+        name = signing.loads(data['token'], salt='shoes.direct-upload')['name']
+
+        with self.settings(UPLOAD_MAX_BYTES=10):
+            res = self.client.post(confirm_upload_url(self.shoe.id),
+                                   {'token': data['token']})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(default_storage.exists(name))
+        self.shoe.refresh_from_db()
+        self.assertFalse(self.shoe.image)
+
+    def test_confirm_non_image_rejected(self):
+        """Test an upload that is not an image is deleted, not attached"""
+        data = self.upload(b'<html>not an image</html>')
+
+        res = self.client.post(confirm_upload_url(self.shoe.id),
+                               {'token': data['token']})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.shoe.refresh_from_db()
+        self.assertFalse(self.shoe.image)
+        self.assertEqual(os.listdir(os.path.join(self.media_root,
+                                                 'uploads/shoe')),
+                         ['incoming'])
@@ -0,0 +1,121 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Shoes, Tag
+
+STATS_URL = reverse('shoes:stats')
+
+def sample_shoe(user, **params):
+    """Create and return a sample shoe"""
+    defaults = {
+        'title': 'Sample shoe',
+        'brand': 'Nike',
+        'price': 100,
+    }
+    defaults.update(params)
+    return Shoes.objects.create(user=user, **defaults)
+
+class PublicStatsApiTests(TestCase):
+    """Test unauthenticated stats API access"""
+
+    def test_auth_required(self):
+        """Test authentication is required for stats"""
+        res = APIClient().get(STATS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+class PrivateStatsApiTests(TestCase):
+    """Test authenticated stats API access"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'testpass'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_empty_catalog(self):
+        """Test stats for a user without shoes"""
+        res = self.client.get(STATS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['shoe_count'], 0)
+        self.assertIsNone(res.data['average_price'])
+        self.assertEqual(res.data['brands'], [])
+
+    def test_totals_by_brand(self):
+        """Test totals and per-brand averages"""
+        sample_shoe(self.user, price=100)
+        sample_shoe(self.user, price=151)
+        sample_shoe(self.user, brand='Asics', price=80)
+        other_user = get_user_model().objects.create_user(
+            'other@test.com',
+            'testpass'
+        )
+        sample_shoe(other_user, price=999)
+
+        res = self.client.get(STATS_URL)
+
+        self.assertEqual(res.data['shoe_count'], 3)
+        self.assertEqual(res.data['total_price'], '331.00')
+        self.assertEqual(res.data['average_price'], '110.33')
+        self.assertEqual(res.data['brands'], [
+            {'brand': 'Nike', 'shoe_count': 2, 'total_price': '251.00',
+             'average_price': '125.50'},
+            {'brand': 'Asics', 'shoe_count': 1, 'total_price': '80.00',
+             'average_price': '80.00'},
+        ])
+
+    def test_top_tags(self):
+        """Test the most used tags are listed first"""
+        popular = Tag.objects.create(user=self.user, name='popular')
+        rare = Tag.objects.create(user=self.user, name='rare')
+        Tag.objects.create(user=self.user, name='unused')
+        for _ in range(2):
+            sample_shoe(self.user).tags.add(popular)
+        sample_shoe(self.user).tags.add(rare)
+
+        res = self.client.get(STATS_URL)
+
+        self.assertEqual(
+            [(tag['name'], tag['shoe_count']) for tag in res.data['top_tags']],
+            [('popular', 2), ('rare', 1)]
+        )
+
+    def test_top_tags_read_maintained_counts(self):
+        """Test top tags are read from shoe_count, not the tag links"""
+        tag = Tag.objects.create(user=self.user, name='popular')
+        sample_shoe(self.user).tags.add(tag)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(STATS_URL)
+
+        tag_query = [query['sql'] for query in queries
+                     if 'FROM "core_tag"' in query['sql']]
+        self.assertEqual(len(tag_query), 1)
+        self.assertNotIn('core_shoes_tags', tag_query[0])
+
+    def test_zero_average_price_is_a_string(self):
+        """Test an average price of zero is serialized like any other"""
+        sample_shoe(self.user, price=0)
+
+        res = self.client.get(STATS_URL)
+
+        self.assertEqual(res.data['average_price'], '0.00')
+
+    def test_query_count_independent_of_catalog(self):
+        """Test stats are read from the summaries, not the shoes"""
+        for i in range(20):
+            sample_shoe(self.user, brand=f'brand {i % 4}')
+
+        with self.assertNumQueries(2):
+            res = self.client.get(STATS_URL)
+
+        self.assertEqual(len(res.data['brands']), 4)
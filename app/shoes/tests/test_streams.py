@@ -0,0 +1,74 @@
+import asyncio
+
+from asgiref.sync import async_to_sync
+from asgiref.testing import ApplicationCommunicator
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from rest_framework.authtoken.models import Token
+
+from core.events import broker
+from shoes.streams import EVENTS_PATH, sse_application
+
+def scope(headers=(), query_string=b''):
+    """Return an ASGI HTTP scope for the events endpoint"""
+    return {
+        'type': 'http',
+        'method': 'GET',
+        'path': EVENTS_PATH,
+        'headers': list(headers),
+        'query_string': query_string,
+    }
+
+class EventStreamTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@testdomain.com',
+            'testpass'
+        )
+        self.token = Token.objects.create(user=self.user)
+
+    @async_to_sync
+    async def test_token_required(self):
+        """Test connecting without a valid token is rejected"""
+        communicator = ApplicationCommunicator(
+            sse_application,
+            scope(query_string=b'token=wrong')
+        )
+        await communicator.send_input({'type': 'http.request'})
+
+        start = await communicator.receive_output(1)
+        self.assertEqual(start['status'], 401)
+
+    @async_to_sync
+    async def test_stream_events(self):
+        """Test published changes are streamed to the client"""
+        communicator = ApplicationCommunicator(
+            sse_application,
+            scope(headers=[(b'authorization', f'Token {self.token.key}'.encode())])
+        )
+        await communicator.send_input({'type': 'http.request'})
+
+        start = await communicator.receive_output(1)
+        self.assertEqual(start['status'], 200)
+        self.assertIn(
+            (b'content-type', b'text/event-stream'),
+            start['headers']
+        )
+        self.assertEqual(
+            (await communicator.receive_output(1))['body'],
+            b': connected\n\n'
+        )
+
+        broker.publish(self.user.pk, {'type': 'shoe.created', 'id': 7})
+        body = (await communicator.receive_output(1))['body']
+        self.assertEqual(
+            body,
+            b'event: shoe.created\ndata: {"type": "shoe.created", "id": 7}\n\n'
+        )
+
+        await communicator.send_input({'type': 'http.disconnect'})
+        await communicator.wait(1)
+        await asyncio.sleep(0)
+        self.assertFalse(broker.has_subscribers(self.user.pk))
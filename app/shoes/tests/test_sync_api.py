@@ -0,0 +1,122 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Shoes, Tag, Characteristic
+
+SYNC_URL = reverse('shoes:sync')
+
+def sample_shoe(user, **params):
+    """Create and return a sample shoe"""
+    defaults = {
+        'title' : 'Sample shoe',
+        'brand' : 'Sample brand',
+        'price' : 1.00
+    }
+    defaults.update(params)
+    return Shoes.objects.create(user=user, **defaults)
+
+class PublicSyncApiTests(TestCase):
+    """Test unauthenticated sync API access"""
+
+    def test_auth_required(self):
+        """Test authentication is required"""
+        res = APIClient().get(SYNC_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+@override_settings(SYNC_CURSOR_LAG_SECONDS=0)
+class PrivateSyncApiTests(TestCase):
+    """Test authenticated sync API access"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@testdomain.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_full_sync(self):
+        """Test syncing without a cursor returns the whole catalog"""
+        shoe = sample_shoe(user=self.user)
+        tag = Tag.objects.create(user=self.user, name='runners')
+        other = get_user_model().objects.create_user(
+            'other@testdomain.com',
+            'testpass'
+        )
+        sample_shoe(user=other)
+
+        res = self.client.get(SYNC_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.data['full'])
+        self.assertEqual(
+            [item['id'] for item in res.data['shoes']['created']],
+            [shoe.id]
+        )
+        self.assertEqual(res.data['tags']['created'][0]['id'], tag.id)
+        self.assertEqual(res.data['characteristics']['created'], [])
+
+    def test_delta_sync(self):
+        """Test syncing from a cursor returns only the changes since"""
+        unchanged = sample_shoe(user=self.user, title='unchanged')
+        updated = sample_shoe(user=self.user, title='updated')
+        retagged = sample_shoe(user=self.user, title='retagged')
+        deleted = Characteristic.objects.create(user=self.user, name='mesh')
+        cursor = self.client.get(SYNC_URL).data['cursor']
+
+        updated.title = 'new title'
+        updated.save()
+        tag = Tag.objects.create(user=self.user, name='runners')
+        retagged.tags.add(tag)
+        deleted_id = deleted.id
+        deleted.delete()
+
+        res = self.client.get(SYNC_URL, {'since' : cursor})
+
+        self.assertFalse(res.data['full'])
+        self.assertEqual(res.data['shoes']['created'], [])
+        self.assertEqual(
+            [item['id'] for item in res.data['shoes']['updated']],
+            [updated.id, retagged.id]
+        )
+        self.assertNotIn(unchanged.id, res.data['shoes']['updated'])
+        self.assertEqual(res.data['tags']['created'][0]['id'], tag.id)
+        self.assertEqual(res.data['characteristics']['deleted'], [deleted_id])
+
+    def test_deleted_shoe_reported(self):
+        """Test a deleted shoe is reported as a tombstone"""
+        shoe = sample_shoe(user=self.user)
+        cursor = self.client.get(SYNC_URL).data['cursor']
+        shoe_id = shoe.id
+        shoe.delete()
+
+        res = self.client.get(SYNC_URL, {'since' : cursor})
+
+        self.assertEqual(res.data['shoes']['deleted'], [shoe_id])
+
+    def test_expired_cursor_full_sync(self):
+        """Test a cursor older than the tombstone retention forces a full sync"""
+        sample_shoe(user=self.user)
+        old = timezone.now() - timedelta(days=365)
+
+        res = self.client.get(
+            SYNC_URL,
+            {'since' : str(int(old.timestamp() * 10 ** 6))}
+        )
+
+        self.assertTrue(res.data['full'])
+        self.assertEqual(len(res.data['shoes']['created']), 1)
+
+    def test_invalid_cursor(self):
+        """Test an invalid cursor is rejected"""
+        res = self.client.get(SYNC_URL, {'since' : 'yesterday'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
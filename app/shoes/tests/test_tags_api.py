@@ -1,6 +1,8 @@
+from unittest.mock import patch
+
 from django.contrib.auth import get_user_model
 from django.urls import reverse
-from django.test import TestCase
+from django.test import TestCase, override_settings
 
 from rest_framework import status
 from rest_framework.test import APIClient
@@ -11,6 +13,7 @@ from core.models import Characteristic
 from shoes.serializers import TagSerializer
 
 TAGS_URL = reverse('shoes:tag-list')
+RESOLVE_TAGS_URL = reverse('shoes:tag-resolve')
 
 class PublicTagsApiTests(TestCase):
     """Test the publically available tags API"""
@@ -106,6 +109,28 @@ class PrivateTagsApiTests(TestCase):
         self.assertIn(serializer1.data, res.data)
         self.assertNotIn(serializer2.data, res.data)
 
+    def test_retrieve_tags_assigned_flag_spellings(self):
+        """Test the assigned_only flag accepts words and blank values"""
+        tag1 = Tag.objects.create(user=self.user, name='Suede')
+        Tag.objects.create(user=self.user, name='Designer')
+        shoe = Shoes.objects.create(
+            title = 'Chuck Taylor All-Star',
+            price = 60,
+            brand = "Converse",
+            user = self.user
+        )
+        shoe.tags.add(tag1)
+
+        for value in ('true', 'Yes'):
+            res = self.client.get(TAGS_URL, {'assigned_only' : value})
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertEqual([tag['name'] for tag in res.data], ['Suede'])
+
+        for value in ('', 'false', 'no'):
+            res = self.client.get(TAGS_URL, {'assigned_only' : value})
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertEqual(len(res.data), 2)
+
     def test_retrieve_assigned_unique(self):
         """Test filtering tags by assigned returns unique items"""
 
@@ -131,4 +156,120 @@ class PrivateTagsApiTests(TestCase):
         shoe2.tags.add(tag)
 
         res = self.client.get(TAGS_URL, {'assigned_only' : 1})
-        self.assertEqual(len(res.data), 1)
\ No newline at end of file
+        self.assertEqual(len(res.data), 1)
+
+    def test_create_tag_duplicate_name(self):
+        """Test creating a tag that exists with different case fails"""
+        Tag.objects.create(user=self.user, name='Runners')
+
+        res = self.client.post(TAGS_URL, {'name' : 'runners'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 1)
+
+    def test_create_tag_duplicate_name_race(self):
+        """Test a duplicate saved after the name check fails cleanly"""
+        Tag.objects.create(user=self.user, name='Runners')
+
+        #as if the other request committed after validate_name ran
+        with patch.object(TagSerializer, 'validate_name',
+                          side_effect=lambda value: value):
+            res = self.client.post(TAGS_URL, {'name' : 'runners'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data['name'][0].code, 'unique')
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 1)
+
+    def test_resolve_tags_deleted_during_resolve(self):
+        """Test a tag deleted after its insert was skipped is recreated"""
+        existing = Tag.objects.create(user=self.user, name='Runners')
+        bulk_create = Tag.objects.bulk_create
+
+        def delete_after_conflict(objs, **kwargs):
+            created = bulk_create(objs, **kwargs)
+            #another request deletes the conflicting row, once
+            Tag.objects.filter(pk=existing.pk).delete()
+            return created
+
+        with patch.object(Tag.objects, 'bulk_create',
+                          side_effect=delete_after_conflict):
+            res = self.client.post(RESOLVE_TAGS_URL, {'names' : ['runners']},
+                                   format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 1)
+        self.assertTrue(Tag.objects.filter(pk=res.data[0]['id']).exists())
+
+    def test_resolve_tags(self):
+        """Test resolving names returns existing tags and creates new ones"""
+        existing = Tag.objects.create(user=self.user, name='Runners')
+        user2 = get_user_model().objects.create_user(
+            'test2@testdomain.com',
+            'testpass'
+        )
+        Tag.objects.create(user=user2, name='slides')
+
+        payload = {'names' : ['runners', 'slides', ' slides ', 'SLIDES']}
+        res = self.client.post(RESOLVE_TAGS_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 2)
+        self.assertEqual(res.data[1]['id'], existing.id)
+        self.assertEqual(res.data[0]['name'], 'slides')
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+
+    def test_resolve_tags_invalid(self):
+        """Test resolving blank or empty names fails"""
+        res = self.client.post(RESOLVE_TAGS_URL, {'names' : []}, format='json')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.client.post(RESOLVE_TAGS_URL, {'names' : [' ']}, format='json')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.client.post(
+            RESOLVE_TAGS_URL,
+            {'names' : ['x' * 61]},
+            format='json'
+        )
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_retrieve_tags_with_counts(self):
+        """Test listing tags with the number of shoes using them"""
+        tag1 = Tag.objects.create(user=self.user, name='streetwear')
+        tag2 = Tag.objects.create(user=self.user, name='basketball')
+
+        for title in ('Air Huarache', 'Roche 1'):
+            shoe = Shoes.objects.create(
+                title = title,
+                brand = 'Nike',
+                price = 150,
+                user = self.user
+            )
+            shoe.tags.add(tag1)
+
+        res = self.client.get(TAGS_URL, {'with_counts' : 1})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, [
+            {'id' : tag1.id, 'name' : tag1.name, 'shoe_count' : 2},
+            {'id' : tag2.id, 'name' : tag2.name, 'shoe_count' : 0},
+        ])
+
+    @override_settings(SHOES_DENORMALIZED_COUNTS=True)
+    def test_retrieve_tags_with_denormalized_counts(self):
+        """Test counts are read from the maintained shoe_count column"""
+        tag1 = Tag.objects.create(user=self.user, name='streetwear')
+        tag2 = Tag.objects.create(user=self.user, name='basketball')
+        shoe = Shoes.objects.create(
+            title = 'Air Huarache',
+            brand = 'Nike',
+            price = 150,
+            user = self.user
+        )
+        shoe.tags.add(tag1)
+
+        res = self.client.get(TAGS_URL, {'with_counts' : 1, 'assigned_only' : 1})
+
+        self.assertEqual(res.data, [
+            {'id' : tag1.id, 'name' : tag1.name, 'shoe_count' : 1},
+        ])
@@ -11,5 +11,7 @@ router.register('shoes', views.ShoeViewSet)
 app_name = 'shoes'
 
 urlpatterns = [
+    path('sync/', views.SyncView.as_view(), name='sync'),
+    path('stats/', views.StatsView.as_view(), name='stats'),
     path('', include(router.urls))
 ]
\ No newline at end of file
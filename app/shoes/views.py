@@ -1,60 +1,190 @@
+import os
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.conf import settings
+from django.core import signing
+from django.core.files.storage import default_storage
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import Lower
+from django.utils import timezone
+
 from rest_framework import viewsets, mixins, status
 from rest_framework.authentication import TokenAuthentication
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.fields import ImageField
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
-from core.models import Tag, Characteristic, Shoes
+from core.models import Tag, Characteristic, Shoes, Tombstone, \
+                        BrandSummary, shoe_image_file_path
+from core.renditions import renditions
+from core.signals import publish_change, release_image
+from core.similarity import shoe_indexes
 
-from shoes import serializers 
+from shoes import serializers
 
-class TagViewSet(viewsets.GenericViewSet, 
-                mixins.ListModelMixin,
-                mixins.CreateModelMixin):
-    """Manage tags in the database"""
+DIRECT_UPLOAD_SALT = 'shoes.direct-upload'
+DIRECT_UPLOAD_EXTENSIONS = ('jpg', 'jpeg', 'png', 'gif', 'webp')
+#below uploads/shoe, so gc_media sweeps uploads that are never confirmed
+DIRECT_UPLOAD_DIR = 'uploads/shoe/incoming'
+
+def is_image(head):
+    """Return whether a file's first 12 bytes start a supported image"""
+    return head.startswith((b'\xff\xd8\xff', b'\x89PNG\r\n\x1a\n',
+                            b'GIF87a', b'GIF89a')) or \
+        (head[:4] == b'RIFF' and head[8:12] == b'WEBP')
+
+def usage_count():
+    """Return an expression for the number of shoes using an object"""
+    if settings.SHOES_DENORMALIZED_COUNTS:
+        return F('shoe_count')
+
+    return Count('shoes')
+
+class BaseShoeAttrViewSet(viewsets.GenericViewSet,
+                          mixins.ListModelMixin,
+                          mixins.CreateModelMixin):
+    """Base viewset for user owned shoe attributes"""
 
     authentication_classes = (TokenAuthentication,)
     permission_classes = (IsAuthenticated,)
 
-    queryset = Tag.objects.all()
-    serializer_class = serializers.TagSerializer
+    def _query_flag(self, name):
+        """Return a boolean query parameter: 1, true or yes are true"""
+        value = self.request.query_params.get(name, '')
+        return value.strip().lower() in ('1', 'true', 'yes')
 
     def get_queryset(self):
         """Return objects for the current authenticated user only"""
-        return self.queryset.filter(user=self.request.user).order_by('-name')
+        assigned_only = self._query_flag('assigned_only')
+        with_counts = self._query_flag('with_counts')
 
-    def perform_create(self, serializer):
-        """Create a new tag"""
-        serializer.save(user = self.request.user)
+        queryset = self.queryset.filter(user=self.request.user)
+        if assigned_only or with_counts:
+            queryset = queryset.annotate(usage_count=usage_count())
 
-class CharacteristicViewSet(viewsets.GenericViewSet, 
-                            mixins.ListModelMixin,
-                            mixins.CreateModelMixin):
-    """Manage ingredients in the database"""
-    authentication_classes = (TokenAuthentication,)
-    permission_classes = (IsAuthenticated,)
-    queryset = Characteristic.objects.all()
-    serializer_class = serializers.CharacteristicsSerializer
+        if assigned_only:
+            queryset = queryset.filter(usage_count__gt=0)
 
-    def get_queryset(self):
-        """Return objects for the current authenticated user"""
-        return self.queryset.filter(user=self.request.user).order_by('-name')
+        return queryset.order_by('-name')
+
+    def get_serializer_class(self):
+        """Return the count serializer when counts were requested"""
+        if self.action == 'list' and self._query_flag('with_counts'):
+            return self.count_serializer_class
+
+        return self.serializer_class
 
     def perform_create(self, serializer):
-        """Create a new characteristic"""
+        """Create a new object"""
         serializer.save(user=self.request.user)
 
+    @action(methods=['POST'], detail=False, url_path='resolve')
+    def resolve(self, request):
+        """Return the objects with the given names, creating missing ones"""
+        model = self.queryset.model
+        serializer = serializers.NameListSerializer(
+            data=request.data,
+            context={'model': model}
+        )
+        serializer.is_valid(raise_exception=True)
+        names = serializer.validated_data['names']
+
+        #conflicts on the (user, lower(name)) index are skipped, so a
+        #select afterwards picks up both new and existing rows. A row that
+        #conflicted but was deleted before the select is inserted again.
+        queryset = self.get_queryset().annotate(lower_name=Lower('name'))
+        found = {}
+        missing = names
+        for attempt in range(3):
+            model.objects.bulk_create(
+                [model(user=request.user, name=name) for name in missing],
+                ignore_conflicts=True
+            )
+            lower_names = [name.lower() for name in missing]
+            found.update(
+                (obj.lower_name, obj)
+                for obj in queryset.filter(lower_name__in=lower_names)
+            )
+            missing = [name for name in missing if name.lower() not in found]
+            if not missing:
+                break
+        else:
+            raise ValidationError({'names': [
+                'Some names were deleted while being resolved, try again.'
+            ]})
+
+        objects = sorted(found.values(), key=lambda obj: obj.name,
+                         reverse=True)
+        return Response(
+            self.get_serializer(objects, many=True).data,
+            status=status.HTTP_200_OK
+        )
+
+class TagViewSet(BaseShoeAttrViewSet):
+    """Manage tags in the database"""
+    queryset = Tag.objects.all()
+    serializer_class = serializers.TagSerializer
+    count_serializer_class = serializers.TagCountSerializer
+
+class CharacteristicViewSet(BaseShoeAttrViewSet):
+    """Manage characteristics in the database"""
+    queryset = Characteristic.objects.all()
+    serializer_class = serializers.CharacteristicsSerializer
+    count_serializer_class = serializers.CharacteristicsCountSerializer
+
 class ShoeViewSet(viewsets.ModelViewSet):
     """Manage shoes in the db"""
     serializer_class = serializers.ShoeSerializer
     queryset = Shoes.objects.all()
     authentication_classes = (TokenAuthentication,)
     permission_classes = (IsAuthenticated,)
+    #read/write by method unless an action overrides it
+    throttle_scope = None
 
     def _params_to_ints(self, qs):
         """Convert a list of string IDs to a list of integers"""
         return [int(str_id) for str_id in qs.split(',')]
 
+    def _params_to_names(self, name, allowed):
+        """Return a comma separated query parameter as a list of names"""
+        param = self.request.query_params.get(name)
+        if param is None:
+            return None
+
+        names = [item.strip() for item in param.split(',') if item.strip()]
+        unknown = set(names) - set(allowed)
+        if unknown:
+            raise ValidationError({
+                name: f'Unknown field(s): {", ".join(sorted(unknown))}'
+            })
+
+        return names
+
+    def _requested_fields(self):
+        """Return the fields selected with ?fields=, or None for all"""
+        return self._params_to_names(
+            'fields',
+            serializers.ShoeSerializer.Meta.fields
+        )
+
+    def _expanded_fields(self):
+        """Return the relations to inline with ?expand= on lists"""
+        if self.action != 'list':
+            return []
+
+        return self._params_to_names(
+            'expand',
+            serializers.ShoeSerializer.expandable_fields
+        ) or []
+
     def get_queryset(self):
         """Retrieve the shoes for the authenticated user"""
         tags = self.request.query_params.get('tags')
@@ -69,13 +199,41 @@ class ShoeViewSet(viewsets.ModelViewSet):
             characteristic_ids = self._params_to_ints(characteristics)
             queryset = queryset.filter(characteristics__id__in=characteristic_ids)
 
-        return self.queryset.filter(user=self.request.user)
-         
+        if tags or characteristics:
+            #joining the through tables repeats shoes matching several ids
+            queryset = queryset.distinct()
+
+        if self.action in ('list', 'retrieve'):
+            queryset = self._select_output(queryset)
+
+        return queryset.filter(user=self.request.user).order_by('id')
+
+    def _select_output(self, queryset):
+        """Load only the columns and relations the response will render"""
+        fields = self._requested_fields()
+        if fields is None:
+            fields = serializers.ShoeSerializer.Meta.fields
+
+        related = [name for name in fields
+                   if name in serializers.ShoeSerializer.expandable_fields]
+        columns = set(fields) - set(related)
+
+        return queryset.only('id', *columns).prefetch_related(*related)
+
+    def get_serializer(self, *args, **kwargs):
+        """Pass the requested fields and expansions to the serializer"""
+        if self.action in ('list', 'retrieve'):
+            kwargs.setdefault('fields', self._requested_fields())
+            kwargs.setdefault('expand', self._expanded_fields())
+
+        return super().get_serializer(*args, **kwargs)
+
     def get_serializer_class(self):
         """Return approrpiate serializer class"""
         if self.action == 'retrieve':
             return serializers.ShoeDetailSerializer
-        elif self.action == 'upload_image':
+        elif self.action in ('upload_image', 'upload_images',
+                             'confirm_upload'):
             return serializers.ShoeImageSerializer
         
         return self.serializer_class
@@ -84,7 +242,8 @@ class ShoeViewSet(viewsets.ModelViewSet):
         """Create a new shoe"""
         serializer.save(user=self.request.user)
 
-    @action(methods=['POST'], detail=True, url_path='upload-image')
+    @action(methods=['POST'], detail=True, url_path='upload-image',
+            throttle_scope='upload-image')
     def upload_image(self, request, pk=None):
         """Upload an image to a shoe"""
         shoe = self.get_object()
@@ -94,7 +253,11 @@ class ShoeViewSet(viewsets.ModelViewSet):
         )
 
         if serializer.is_valid():
-            serializer.save()
+            #the file's content lock is held until the shoe refers to it
+            with transaction.atomic():
+                serializer.save()
+            name = shoe.image.name
+            transaction.on_commit(lambda: renditions.put([name]))
             return Response(
                 serializer.data,
                 status=status.HTTP_200_OK
@@ -104,4 +267,294 @@ class ShoeViewSet(viewsets.ModelViewSet):
             serializer.errors,
             status=status.HTTP_400_BAD_REQUEST
         )
-        
+
+    @action(methods=['POST'], detail=False, url_path='upload-images',
+            throttle_scope='upload-image')
+    def upload_images(self, request):
+        """Upload images to many shoes, one file part per shoe id
+
+        Each part's field name is the id of the shoe the file belongs to.
+        Nothing is stored unless every part is valid.
+        """
+        files = request.FILES
+        if not files:
+            raise ValidationError({'detail': 'No files were submitted.'})
+        if len(files) > settings.SHOES_UPLOAD_BATCH_MAX:
+            raise ValidationError({'detail': (
+                f'At most {settings.SHOES_UPLOAD_BATCH_MAX} files can be '
+                'uploaded at once.'
+            )})
+
+        errors = {}
+        uploads = {}
+        for field_name in files:
+            if not field_name.isdigit():
+                errors[field_name] = ['Field names must be shoe ids.']
+            elif len(files.getlist(field_name)) > 1:
+                errors[field_name] = ['Only one file per shoe is allowed.']
+            else:
+                uploads[int(field_name)] = files[field_name]
+
+        #one query authorizes the whole batch
+        shoes = Shoes.objects.filter(user=request.user, pk__in=uploads) \
+                             .only('id', 'user_id', 'image') \
+                             .in_bulk()
+        for shoe_id, upload in uploads.items():
+            if shoe_id not in shoes:
+                errors[str(shoe_id)] = ['Not found.']
+                continue
+            try:
+                ImageField().run_validation(upload)
+            except ValidationError as exc:
+                errors[str(shoe_id)] = exc.detail
+            except DjangoValidationError as exc:
+                errors[str(shoe_id)] = exc.messages
+
+        if errors:
+            raise ValidationError(errors)
+
+        now = timezone.now()
+        updated = []
+        try:
+            #the files' content locks are held until the shoes refer to them
+            with transaction.atomic():
+                for shoe_id, upload in uploads.items():
+                    shoe = shoes[shoe_id]
+                    shoe.image.save(upload.name, upload, save=False)
+                    shoe.updated_at = now
+                    updated.append(shoe)
+
+                #bulk_update skips post_save, so do what its receivers would
+                Shoes.objects.bulk_update(updated, ['image', 'updated_at'])
+                for shoe in updated:
+                    original = shoe._original_image
+                    if original and original != shoe.image.name:
+                        transaction.on_commit(
+                            lambda original=original: release_image(original)
+                        )
+                    publish_change(request.user.id, Tombstone.KIND_SHOE,
+                                   'updated', shoe.pk)
+
+                names = [shoe.image.name for shoe in updated]
+                transaction.on_commit(lambda: renditions.put(names))
+        except Exception:
+            #files already written are only kept if another shoe uses them
+            for shoe in updated:
+                release_image(shoe.image.name)
+            raise
+
+        serializer = self.get_serializer(updated, many=True)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    @action(methods=['POST'], detail=True, url_path='upload-url',
+            throttle_scope='upload-image')
+    def upload_url(self, request, pk=None):
+        """Return a URL to PUT an image to and a token to confirm it with"""
+        shoe = self.get_object()
+        filename = str(request.data.get('filename') or 'image.jpg')
+        ext = filename.rsplit('.', 1)[-1].lower()
+        if ext not in DIRECT_UPLOAD_EXTENSIONS:
+            raise ValidationError({'filename': 'Unsupported image type.'})
+
+        #the client writes to a staging name; confirm copies it to the
+        #shoe's image, so the presigned URL never reaches an attached file
+        name = os.path.join(DIRECT_UPLOAD_DIR, f'{uuid.uuid4()}.{ext}')
+        expires = settings.UPLOAD_URL_EXPIRES
+        token = signing.dumps({'shoe': shoe.pk, 'name': name},
+                              salt=DIRECT_UPLOAD_SALT)
+
+        return Response({
+            'upload_url': default_storage.upload_url(name, expires),
+            'method': 'PUT',
+            'token': token,
+            'expires_in': expires,
+        })
+
+    @action(methods=['POST'], detail=True, url_path='confirm-upload',
+            throttle_scope='upload-image')
+    def confirm_upload(self, request, pk=None):
+        """Attach an image uploaded with upload-url to the shoe
+
+        The upload is moved to a name of its own inside the storage, never
+        through this worker, so a later PUT to the upload URL changes
+        nothing.
+        """
+        shoe = self.get_object()
+        try:
+            payload = signing.loads(
+                str(request.data.get('token', '')),
+                salt=DIRECT_UPLOAD_SALT,
+                max_age=settings.UPLOAD_CONFIRM_EXPIRES
+            )
+        except signing.BadSignature:
+            raise ValidationError({'token': 'Invalid or expired token.'})
+        if payload['shoe'] != shoe.pk:
+            raise ValidationError({'token': 'Token is for another shoe.'})
+
+        staged = payload['name']
+        try:
+            size = default_storage.size(staged)
+        except FileNotFoundError:
+            raise ValidationError({'token': 'Nothing was uploaded.'})
+        if size > settings.UPLOAD_MAX_BYTES:
+            default_storage.delete(staged)
+            raise ValidationError({'token': 'The upload is too large.'})
+
+        name = shoe_image_file_path(shoe, staged)
+        try:
+            default_storage.move(staged, name)
+        except FileNotFoundError:
+            raise ValidationError({'token': 'Nothing was uploaded.'})
+
+        #the staging file may have been replaced since it was measured
+        if default_storage.size(name) > settings.UPLOAD_MAX_BYTES:
+            default_storage.delete(name)
+            raise ValidationError({'token': 'The upload is too large.'})
+        if not is_image(default_storage.read_start(name, 12)):
+            default_storage.delete(name)
+            raise ValidationError({'token': 'The upload is not an image.'})
+
+        shoe.image = name
+        shoe.save(update_fields=['image', 'updated_at'])
+        transaction.on_commit(lambda: renditions.put([name]))
+
+        serializer = self.get_serializer(shoe)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    @action(methods=['GET'], detail=True)
+    def similar(self, request, pk=None):
+        """Return the user's shoes most like this one, best match first"""
+        shoe = self.get_object()
+        try:
+            limit = int(request.query_params.get('limit', 10))
+        except ValueError:
+            raise ValidationError({'limit': 'A valid integer is required.'})
+        limit = max(1, min(limit, settings.SIMILAR_SHOES_MAX_LIMIT))
+
+        ranked = shoe_indexes.similar(request.user.id, shoe.pk, limit)
+        shoes = Shoes.objects.filter(
+            user=request.user,
+            pk__in=[shoe_id for shoe_id, _ in ranked]
+        ).prefetch_related('tags', 'characteristics').in_bulk()
+
+        results = []
+        for shoe_id, score in ranked:
+            #deleted by another worker since the index was built
+            if shoe_id not in shoes:
+                continue
+            data = serializers.ShoeSerializer(shoes[shoe_id]).data
+            data['similarity'] = score
+            results.append(data)
+
+        return Response(results)
+
+class SyncView(APIView):
+    """Return the changes to the user's catalog since a sync cursor"""
+    authentication_classes = (TokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+
+    #response key -> (model, serializer, tombstone kind)
+    collections = {
+        'shoes': (Shoes, serializers.ShoeSerializer, Tombstone.KIND_SHOE),
+        'tags': (Tag, serializers.TagSerializer, Tombstone.KIND_TAG),
+        'characteristics': (
+            Characteristic,
+            serializers.CharacteristicsSerializer,
+            Tombstone.KIND_CHARACTERISTIC
+        ),
+    }
+
+    def _decode_cursor(self, cursor):
+        """Convert a cursor into the datetime it stands for"""
+        try:
+            micros = int(cursor)
+            return datetime.fromtimestamp(micros / 10 ** 6, tz=dt_timezone.utc)
+        except (ValueError, OverflowError, OSError):
+            raise ValidationError({'since': 'Invalid sync cursor.'})
+
+    def _encode_cursor(self, moment):
+        """Convert a datetime into an opaque cursor"""
+        return str(int(moment.timestamp() * 10 ** 6))
+
+    def get(self, request):
+        now = timezone.now()
+        since = request.query_params.get('since')
+        since = self._decode_cursor(since) if since else None
+
+        #tombstones older than the retention window may have been pruned
+        horizon = now - timedelta(days=settings.SYNC_TOMBSTONE_RETENTION_DAYS)
+        full = since is None or since < horizon
+
+        deleted = defaultdict(list)
+        if not full:
+            tombstones = Tombstone.objects.filter(
+                user=request.user,
+                deleted_at__gt=since
+            ).values_list('kind', 'object_id')
+            for kind, object_id in tombstones:
+                deleted[kind].append(object_id)
+
+        data = {
+            'cursor': self._encode_cursor(
+                now - timedelta(seconds=settings.SYNC_CURSOR_LAG_SECONDS)
+            ),
+            'full': full,
+        }
+        for key, (model, serializer_class, kind) in self.collections.items():
+            queryset = model.objects.filter(user=request.user).order_by('id')
+            if model is Shoes:
+                queryset = queryset.prefetch_related('tags', 'characteristics')
+            if not full:
+                queryset = queryset.filter(updated_at__gt=since)
+
+            created, updated = [], []
+            for obj in queryset:
+                is_new = full or obj.created_at > since
+                (created if is_new else updated).append(obj)
+
+            data[key] = {
+                'created': serializer_class(created, many=True).data,
+                'updated': serializer_class(updated, many=True).data,
+                'deleted': deleted[kind],
+            }
+
+        return Response(data)
+
+class StatsView(APIView):
+    """Return catalog totals, per-brand prices and the most used tags"""
+    authentication_classes = (TokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+
+    top_tags = 10
+
+    def get(self, request):
+        brands = BrandSummary.objects.filter(user=request.user) \
+                                     .order_by('-shoe_count', 'brand')
+        brands = list(brands)
+        shoe_count = sum(summary.shoe_count for summary in brands)
+        total_price = sum((summary.total_price for summary in brands),
+                          Decimal('0.00'))
+        average_price = None
+        if shoe_count:
+            average_price = (total_price / shoe_count).quantize(Decimal('0.01'))
+
+        #Tag.shoe_count is maintained whatever SHOES_DENORMALIZED_COUNTS
+        #says, so this is served by the (user, -shoe_count) index
+        tags = Tag.objects.filter(user=request.user) \
+                          .annotate(usage_count=F('shoe_count')) \
+                          .filter(usage_count__gt=0) \
+                          .order_by('-usage_count', 'name')[:self.top_tags]
+
+        return Response({
+            'shoe_count': shoe_count,
+            'total_price': str(total_price),
+            'average_price': (
+                str(average_price) if average_price is not None else None
+            ),
+            'brands': serializers.BrandSummarySerializer(
+                brands,
+                many=True
+            ).data,
+            'top_tags': serializers.TagCountSerializer(tags, many=True).data,
+        })
+
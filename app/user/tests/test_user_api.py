@@ -2,9 +2,12 @@ from django.test import TestCase
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 
+from rest_framework.authtoken.models import Token
 from rest_framework.test import APIClient
 from rest_framework import status
 
+from core.tests.perf import query_budget
+
 CREATE_USER_URL = reverse('user:create')
 TOKEN_URL = reverse('user:token')
 ME_URL = reverse('user:me')
@@ -141,3 +144,54 @@ class PrivateUserApiTests(TestCase):
         self.assertEqual(self.user.name, payload['name'])
         self.assertTrue(self.user.check_password(payload['password']))
         self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+class UserApiQueryBudgetTests(TestCase):
+    """Test the user endpoints stay within their query budgets"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(
+            email = 'test@testdomain.com',
+            password = 'testpass',
+            name = 'name'
+        )
+        self.token = Token.objects.create(user=self.user)
+        #has no token yet
+        create_user(email = 'new@testdomain.com', password = 'testpass')
+
+    @query_budget(0)
+    def test_retrieve_profile(self):
+        """Test the profile is served from the authenticated user"""
+        self.client.force_authenticate(user = self.user)
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    @query_budget(1)
+    def test_update_profile(self):
+        """Test updating the profile is a single write"""
+        self.client.force_authenticate(user = self.user)
+        res = self.client.patch(ME_URL, {'name' : 'new name'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    @query_budget(2)
+    def test_create_token(self):
+        """Test issuing a token looks up the user and the token once"""
+        res = self.client.post(TOKEN_URL, {
+            'email' : 'test@testdomain.com',
+            'password' : 'testpass'
+        })
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['token'], self.token.key)
+
+    @query_budget(5)
+    def test_create_first_token(self):
+        """Test a first token adds its insert, in a savepoint, to that"""
+        res = self.client.post(TOKEN_URL, {
+            'email' : 'new@testdomain.com',
+            'password' : 'testpass'
+        })
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)